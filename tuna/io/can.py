@@ -2,8 +2,12 @@
 
 The Tuna can is a image and metadata file format. It consists of a serializable object (instantiated from the tuna.io.can.can class), where convenience methods (such as algebraic procedures on its arrays) are defined.
 """
-__version__ = "0.1.6"
+__version__ = "0.1.7"
 __changelog = {
+    "0.1.7": {"Tuna": "0.17.0", "Change": "fliplr, flipud and " \
+              "convert_table_into_ndarray allocate their arrays in the " \
+              "precision set by tuna.tools.set_precision; the flips are done " \
+              "on the whole array at once."},
     "0.1.6": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.5": {"Tuna": "0.14.0", "Change": "improved docstrings."},
     "0.1.4": {"Change": "Updated docstring to new documentation style."},
@@ -185,7 +189,8 @@ class Can(FileReader):
         self.cols = cols
         self.shape = (planes, rows, cols)
 
-        array = numpy.zeros(shape = self.shape)
+        array = numpy.zeros(shape = self.shape,
+                            dtype = tuna.tools.get_precision())
         
         for photon in self.photons:
             array[photon['channel '] - 1][photon['row']][photon['col']] \
@@ -227,21 +232,21 @@ class Can(FileReader):
         """Wrap around numpy.fliplr, which flips a 2D array from left to right 
         (the rightmost column becomes the leftmost one). This is applied to each
         plane of a cube, or the single plane of a planar image.
+
+        The result is in the precision given by tuna.tools.get_precision ( ).
         """
-        result = numpy.ndarray(shape = self.array.shape)
-        for plane in range(self.array.shape[0]):
-            result[plane] = numpy.fliplr(self.array[plane])
-        self.array = result
+        self.array = numpy.array(numpy.flip(self.array, axis = -1),
+                                 dtype = tuna.tools.get_precision())
 
     def flipud(self):
         """Wrap around numpy.flipud, which flips a 2D array from up to down (the
         last line becomes the first). This is applied to each plane of a cube, 
         or the single plane of a planar image.
+
+        The result is in the precision given by tuna.tools.get_precision ( ).
         """
-        result = numpy.ndarray(shape = self.array.shape)
-        for plane in range(self.array.shape[0]):
-            result[plane] = numpy.flipud(self.array[plane])
-        self.array = result
+        self.array = numpy.array(numpy.flip(self.array, axis = -2),
+                                 dtype = tuna.tools.get_precision())
 
     def info(self):
         """Output to the current logging.info handler some metadata about the 
@@ -2,7 +2,12 @@
 """
 
 import astropy
-from .airy     import ( AiryFitter,
+from .airy     import ( AiryCubeFitter,
+                        AiryFitter,
+                        AiryJointFitter,
                         AiryPlane,
-                        fit_airy )
+                        fit_airy,
+                        fit_airy_cube,
+                        fit_airy_cube_jointly,
+                        get_ring_samples )
 from .parabola import ( ParabolicFitter )
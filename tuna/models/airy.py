@@ -1,7 +1,34 @@
 """This module's scope is the modeling and fitting of Airy functions to data.
 """
-__version__ = "0.1.1"
+__version__ = "0.7.4"
 __changelog = {
+    "0.7.4": {"Tuna": "0.17.0", "Change": "AiryCubeFitter fits the planes " \
+              "in the calling process when shared memory is not available " \
+              "(Python < 3.8)."},
+    "0.7.3": {"Tuna": "0.17.0", "Change": "The gap of a plane that follows an " \
+              "extrapolated gap is searched on both sides of its expected " \
+              "value."},
+    "0.7.2": {"Tuna": "0.17.0", "Change": "fit_airy, AiryCubeFitter and " \
+              "fit_airy_cube accept the pyramid_depth of the AiryFitter."},
+    "0.7.1": {"Tuna": "0.17.0", "Change": "The cube fitters accept one " \
+              "sample per plane, and get_ring_samples the union of the rings " \
+              "of several planes."},
+    "0.7.0": {"Tuna": "0.17.0", "Change": "AiryPlane and the fits of the " \
+              "Airy fitters are stored in the precision set by " \
+              "tuna.tools.set_precision; the fits themselves are computed in " \
+              "double precision."},
+    "0.6.0": {"Tuna": "0.17.0", "Change": "Added get_ring_samples; the Airy " \
+              "fitters can fit only a sample of the pixels."},
+    "0.5.0": {"Tuna": "0.17.0", "Change": "AiryFitter has a coarse to fine " \
+              "mode, over a pyramid of binned planes."},
+    "0.4.0": {"Tuna": "0.17.0", "Change": "Added AiryJointFitter, which fits " \
+              "all planes of a cube at once, with shared b_ratio, center and " \
+              "finesse."},
+    "0.3.0": {"Tuna": "0.17.0", "Change": "Added AiryCubeFitter, which fits " \
+              "the planes of a cube in a process pool."},
+    "0.2.0": {"Tuna": "0.17.0", "Change": "Added AiryModel, with cached " \
+              "coordinate grids and the analytic Jacobian; AiryFitter uses it " \
+              "through scipy.optimize.least_squares by default."},
     "0.1.1": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.0": {"Tuna": "0.15.0", "Change": "Added wrapper function fit_airy" }
 }
@@ -9,11 +36,18 @@ __changelog = {
 import copy
 import logging
 import math
+import multiprocessing
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8; AiryCubeFitter then fits the planes in this process.
+    shared_memory = None
 try:
     import mpyfit
 except ImportError as e:
     print ( "Could not import mpyfit. Exception: {}".format ( e ) )
 import numpy
+import scipy.optimize
 import threading
 import time
 import tuna
@@ -27,7 +61,8 @@ def AiryPlane ( b_ratio = 9.e-6,
                 intensity = 100,
                 shape_cols = 512,
                 shape_rows = 512,
-                wavelength = 0.6563 ):
+                wavelength = 0.6563,
+                precision = None ):
     """Model the Airy function as:
 
     .. math::
@@ -84,6 +119,10 @@ def AiryPlane ( b_ratio = 9.e-6,
     * wavelength : float : defaults to 0.6563
         Wavelength in microns ( lambda_c ).
 
+    * precision : dtype : defaults to None
+        The dtype of the result; the model is always computed in double
+        precision. If None, tuna.tools.get_precision ( ) is used.
+
     Returns:
 
     * result : numpy.ndarray
@@ -117,8 +156,10 @@ def AiryPlane ( b_ratio = 9.e-6,
     result = continuum + intensity/(1. + airy_function_I * numpy.sin(phase)**2)
     log.debug("result[0][0] = %s" % str(result[0][0]))
 
+    if precision is None:
+        precision = tuna.tools.get_precision()
     log.debug("/airy_plane")
-    return result
+    return result.astype(precision, copy = False)
 
 def least_mpyfit ( p, args ):
     """Wrap the airy function proper, so that the API for using mpyfit is
@@ -149,7 +190,8 @@ def least_mpyfit ( p, args ):
                           intensity,
                           shape_cols,
                           shape_rows,
-                          wavelength)
+                          wavelength,
+                          numpy.float64)
         #log.debug ( "plane = %s" % str ( plane ) )
         log.debug("plane.shape = {}, data.shape = {}".format(
             plane.shape, data.shape))
@@ -166,6 +208,443 @@ def least_mpyfit ( p, args ):
     log.debug("/least_mpyfit")
     return(residue.flatten())
 
+# The coordinate grids of each frame shape, created by get_airy_grids.
+airy_grids = {}
+
+def get_airy_grids(shape):
+    """Return the column and row coordinates of a frame with the input shape,
+    creating them only once per shape.
+
+    Parameters:
+
+    * shape : tuple of 2 integers
+
+    Returns:
+
+    * cols : numpy.ndarray
+        With shape (shape[0], 1).
+
+    * rows : numpy.ndarray
+        With shape (1, shape[1]).
+    """
+    shape = (int(shape[0]), int(shape[1]))
+    try:
+        return airy_grids[shape]
+    except KeyError:
+        grids = (numpy.arange(shape[0], dtype = numpy.float64)[:, None],
+                 numpy.arange(shape[1], dtype = numpy.float64)[None, :])
+        for grid in grids:
+            grid.flags.writeable = False
+        airy_grids[shape] = grids
+        return grids
+
+def get_ring_samples(shape, find_rings, noise = None, margin = 2,
+                     background_fraction = 0.02, cells = 16, seed = 0):
+    """Select the pixels where an Airy fit is most informative: every pixel in
+    the rings found by find_rings ( ), widened by a margin to include their
+    flanks, and a stratified sample of the remaining pixels, to constrain the
+    continuum. The background is split in cells x cells regions, and the same
+    fraction of the background pixels of each region is drawn at random.
+    Noisy pixels are never selected.
+
+    During a scan the rings move from plane to plane, so the sample of a plane
+    misses the rings of the planes far from it. To fit a cube, either draw one
+    sample per plane, from the find_rings ( ) result of that plane, or draw a
+    single sample from the results of several planes, which contains the union
+    of their rings.
+
+    Parameters:
+
+    * shape : tuple of 2 integers
+        The shape of the plane to be fitted.
+
+    * find_rings : dictionary, or list of dictionaries
+        The result of find_rings ( ), or the results for several planes; only
+        their 'ring_pixel_sets' are used.
+
+    * noise : :ref:`tuna_io_can_label` : None
+        Containing the noise map, where noisy pixels have value 1.
+
+    * margin : integer : 2
+        The number of pixels by which the rings are widened.
+
+    * background_fraction : float : 0.02
+        The fraction of the background pixels drawn in each region.
+
+    * cells : integer : 16
+        The number of regions along each axis.
+
+    * seed : integer : 0
+        The seed of the random draw, so that the sample is reproducible.
+
+    Returns:
+
+    * cols : numpy.ndarray
+        The columns of the selected pixels.
+
+    * rows : numpy.ndarray
+        The rows of the selected pixels.
+    """
+    if isinstance(find_rings, dict):
+        find_rings = [find_rings]
+    rings = numpy.zeros(shape = shape, dtype = bool)
+    for plane_rings in find_rings:
+        for pixel_set in plane_rings['ring_pixel_sets']:
+            rings |= pixel_set[0] == 1
+    for axis in range(2):
+        widened = numpy.copy(rings)
+        for shift in range(1, margin + 1):
+            before = [slice(None), slice(None)]
+            after = [slice(None), slice(None)]
+            before[axis] = slice(None, - shift)
+            after[axis] = slice(shift, None)
+            widened[tuple(before)] |= rings[tuple(after)]
+            widened[tuple(after)] |= rings[tuple(before)]
+        rings = widened
+
+    usable = numpy.ones(shape = shape, dtype = bool)
+    if noise is not None:
+        usable = noise.array != 1
+    ring_cols, ring_rows = numpy.nonzero(rings & usable)
+
+    background_cols, background_rows = numpy.nonzero(usable & ~ rings)
+    regions = (background_cols * cells // shape[0]) * cells \
+              + background_rows * cells // shape[1]
+    counts = numpy.bincount(regions, minlength = cells * cells)
+    quotas = numpy.ceil(counts * background_fraction).astype(numpy.int64)
+    # In a random order within each region, the first quota pixels are drawn.
+    order = numpy.lexsort((numpy.random.RandomState(seed).random_sample(
+        regions.size), regions))
+    first = numpy.concatenate(([0], numpy.cumsum(counts)[: -1]))
+    ranks = numpy.arange(order.size) - first[regions[order]]
+    drawn = order[ranks < quotas[regions[order]]]
+
+    return (numpy.concatenate((ring_cols, background_cols[drawn])),
+            numpy.concatenate((ring_rows, background_rows[drawn])))
+
+def get_plane_samples(samples, plane):
+    """Return the samples to be used when fitting one plane of a cube.
+
+    Parameters:
+
+    * samples : tuple of 2 numpy.ndarray, or dictionary
+        Either the columns and the rows of the pixels fitted on every plane, or
+        a dictionary of such tuples keyed by plane. May be None.
+
+    * plane : integer
+
+    Returns:
+
+    * tuple of 2 numpy.ndarray
+        The columns and rows of the pixels to be fitted on the plane, or None if
+        every pixel should be fitted.
+    """
+    if isinstance(samples, dict):
+        return samples.get(plane)
+    return samples
+
+def get_union_of_samples(samples, planes, shape):
+    """Return the pixels that are in the samples of any of the input planes.
+
+    Parameters:
+
+    * samples : tuple of 2 numpy.ndarray, or dictionary
+        As in get_plane_samples ( ).
+
+    * planes : list of integers
+
+    * shape : tuple of 2 integers
+        The shape of the planes.
+
+    Returns:
+
+    * tuple of 2 numpy.ndarray
+        The columns and rows of the pixels, or None if some plane should have
+        every pixel fitted.
+    """
+    if not isinstance(samples, dict):
+        return samples
+    union = numpy.zeros(shape = shape, dtype = bool)
+    for plane in planes:
+        plane_samples = samples.get(plane)
+        if plane_samples is None:
+            return None
+        union[plane_samples] = True
+    return numpy.nonzero(union)
+
+class AiryModel(object):
+    """This class' responsibility is to evaluate the Airy function of AiryPlane,
+    and its partial derivatives with respect to the 7 parameters, at a fixed
+    set of coordinates, reusing its buffers between evaluations.
+
+    With the notation of AiryPlane, and d the distance to the center:
+
+    .. math::
+      s = \sqrt{1 + b^2 d^2}, \quad \phi = \dfrac{2 \pi e}{\lambda s},
+      \quad D = 1 + \dfrac{4F^2}{\pi^2} \sin^2 \phi, \quad I = C + I_0 / D
+
+    and the derivatives follow from the chain rule through phi.
+
+    Its constructor expects the following parameters:
+
+    * cols : numpy.ndarray
+        The column coordinates where the model is evaluated.
+
+    * rows : numpy.ndarray
+        The row coordinates where the model is evaluated; must broadcast with
+        cols, for instance, the grids from get_airy_grids ( ).
+
+    * wavelength : float
+        Wavelength in microns ( lambda_c ).
+    """
+    parameter_names = ("b_ratio", "center_col", "center_row", "continuum",
+                       "finesse", "gap", "intensity")
+
+    def __init__(self, cols, rows, wavelength):
+        self.cols = cols
+        self.rows = rows
+        self.wavelength = wavelength
+        self.shape = numpy.broadcast(cols, rows).shape
+
+        self.col_distances = numpy.empty(shape = self.shape)
+        self.row_distances = numpy.empty(shape = self.shape)
+        self.squared_distances = numpy.empty(shape = self.shape)
+        self.s = numpy.empty(shape = self.shape)
+        self.phase = numpy.empty(shape = self.shape)
+        self.sin_phase = numpy.empty(shape = self.shape)
+        self.denominator = numpy.empty(shape = self.shape)
+        self.model = numpy.empty(shape = self.shape)
+        self.derivatives = numpy.empty(shape = (7, ) + self.shape)
+        self.last_parameters = None
+
+    def evaluate(self, p):
+        """Compute the model, and the intermediate values used by the
+        derivatives, in the buffers of this object.
+
+        Parameters:
+
+        * p : tuple of 7 floats
+            The b_ratio, center_col, center_row, continuum, finesse, gap and
+            intensity values.
+
+        Returns:
+
+        * numpy.ndarray
+            The model, in a buffer that is overwritten by the next evaluation.
+        """
+        b_ratio, center_col, center_row, continuum, finesse, gap, intensity = p
+        numpy.subtract(self.cols, center_col, out = self.col_distances)
+        numpy.subtract(self.rows, center_row, out = self.row_distances)
+        numpy.multiply(self.col_distances, self.col_distances,
+                       out = self.squared_distances)
+        self.squared_distances += self.row_distances**2
+
+        numpy.multiply(self.squared_distances, b_ratio**2, out = self.s)
+        self.s += 1
+        numpy.sqrt(self.s, out = self.s)
+        numpy.divide(2.0 * numpy.pi * gap / self.wavelength, self.s,
+                     out = self.phase)
+        numpy.sin(self.phase, out = self.sin_phase)
+
+        airy_function_I = 4.0 * finesse**2 / numpy.pi**2
+        numpy.multiply(self.sin_phase, self.sin_phase, out = self.denominator)
+        self.denominator *= airy_function_I
+        self.denominator += 1
+        numpy.divide(intensity, self.denominator, out = self.model)
+        self.model += continuum
+
+        self.last_parameters = tuple(p)
+        return self.model
+
+    def jacobian(self, p):
+        """Compute the partial derivatives of the model with respect to each
+        parameter.
+
+        Parameters:
+
+        * p : tuple of 7 floats
+            The same parameters as in evaluate ( ).
+
+        Returns:
+
+        * numpy.ndarray
+            Where the first axis is the parameter (in the order of
+            parameter_names), in a buffer that is overwritten by the next call.
+        """
+        if self.last_parameters != tuple(p):
+            self.evaluate(p)
+        b_ratio, center_col, center_row, continuum, finesse, gap, intensity = p
+        airy_function_I = 4.0 * finesse**2 / numpy.pi**2
+        derivatives = self.derivatives
+
+        # d / d intensity = 1 / D
+        numpy.divide(1.0, self.denominator, out = derivatives[6])
+        # d / d finesse = - I_0 / D² * 8 F / pi² * sin² phi
+        numpy.multiply(derivatives[6], derivatives[6], out = derivatives[4])
+        derivatives[4] *= - intensity
+        # d / d phi = - I_0 / D² * 4 F² / pi² * sin (2 phi), kept in
+        #derivatives[5] until d / d gap is computed.
+        numpy.multiply(self.phase, 2.0, out = derivatives[5])
+        numpy.sin(derivatives[5], out = derivatives[5])
+        derivatives[5] *= derivatives[4]
+        derivatives[5] *= airy_function_I
+        numpy.multiply(self.sin_phase, self.sin_phase, out = derivatives[3])
+        derivatives[4] *= derivatives[3]
+        derivatives[4] *= 8.0 * finesse / numpy.pi**2
+
+        # Since d phi / d s = - phi / s, with d s / d b = b d² / s and
+        #d s / d center = - b² (coordinate - center) / s, all three derivatives
+        #share the factor (d / d phi) * phi / s², kept in derivatives[0].
+        numpy.multiply(derivatives[5], self.phase, out = derivatives[0])
+        derivatives[0] /= self.s
+        derivatives[0] /= self.s
+        numpy.multiply(derivatives[0], self.col_distances, out = derivatives[1])
+        derivatives[1] *= b_ratio**2
+        numpy.multiply(derivatives[0], self.row_distances, out = derivatives[2])
+        derivatives[2] *= b_ratio**2
+        derivatives[0] *= self.squared_distances
+        derivatives[0] *= - b_ratio
+
+        # d / d gap = (d / d phi) * phi / gap
+        derivatives[5] *= self.phase
+        derivatives[5] /= gap
+        # d / d continuum = 1
+        derivatives[3] = 1
+        return derivatives
+
+def fit_airy_model(model, data, parameters, parinfo, xtol = 1e-7):
+    """Fit an AiryModel to data with scipy.optimize.least_squares, supplying
+    the analytic Jacobian of the model.
+
+    Parameters:
+
+    * model : AiryModel
+        Evaluated at the coordinates of data.
+
+    * data : numpy.ndarray
+        With the same shape as the model.
+
+    * parameters : tuple of 7 floats
+        The initial guesses, in the order of AiryModel.parameter_names.
+
+    * parinfo : list of 7 dictionaries
+        As in mpyfit: each may contain the 'fixed' and 'limits' keys.
+
+    * xtol : float : 1e-7
+        The tolerance for the change in the parameters.
+
+    Returns:
+
+    * fit_parameters : list of 7 floats
+
+    * fit_result : dictionary
+        With the keys 'bestnorm' (the sum of squared residuals), 'nfev', 'njev',
+        'status' and 'message'.
+    """
+    parameters = numpy.array(parameters, dtype = numpy.float64)
+    lower = numpy.full(7, - numpy.inf)
+    upper = numpy.full(7, numpy.inf)
+    free = numpy.ones(shape = 7, dtype = bool)
+    for index, entry in enumerate(parinfo):
+        if entry.get('fixed', False):
+            free[index] = False
+        if 'limits' in entry:
+            lower[index], upper[index] = sorted(entry['limits'])
+            if lower[index] == upper[index]:
+                free[index] = False
+    parameters = numpy.clip(parameters, lower, upper)
+    data = numpy.asarray(data, dtype = numpy.float64)
+
+    def complete(x):
+        p = numpy.copy(parameters)
+        p[free] = x
+        return p
+
+    def residuals(x):
+        return (model.evaluate(complete(x)) - data).ravel()
+
+    def jacobian(x):
+        derivatives = model.jacobian(complete(x))
+        if not numpy.all(free):
+            derivatives = derivatives[free]
+        return derivatives.reshape((derivatives.shape[0], -1)).T
+
+    if not numpy.any(free):
+        residue = residuals(parameters[free])
+        return list(parameters), {'bestnorm': float(numpy.sum(residue**2)),
+                                  'nfev': 1, 'njev': 0, 'status': 0,
+                                  'message': "All parameters are fixed."}
+
+    solution = scipy.optimize.least_squares(residuals,
+                                            parameters[free],
+                                            jac = jacobian,
+                                            bounds = (lower[free], upper[free]),
+                                            x_scale = 'jac',
+                                            xtol = xtol, tr_solver = 'lsmr')
+    fit_result = {'bestnorm': 2 * float(solution.cost),
+                  'nfev': solution.nfev,
+                  'njev': solution.njev,
+                  'status': solution.status,
+                  'message': solution.message}
+    return [float(value) for value in complete(solution.x)], fit_result
+
+def guess_continuum_and_intensity(data, finesse):
+    """Estimate the continuum and the intensity of an Airy plane from the
+    percentiles of its data: the intensity is the difference between the 99
+    percentile and the lowest non-null percentile, corrected for the contrast
+    of the Airy function with the input finesse.
+
+    Parameters:
+
+    * data : numpy.ndarray
+        Contains the data to be fitted.
+
+    * finesse : float
+        (F).
+
+    Returns:
+
+    * continuum : float
+
+    * intensity : float
+    """
+    log = logging.getLogger(__name__)
+    lower_percentile = tuna.tools.find_lowest_nonnull_percentile(data)
+    upper_percentile = 99
+    lower_value, upper_value = numpy.percentile(
+        data, (lower_percentile, upper_percentile))
+    log.debug("%d-percentile = %f, %d-percentile = %f."
+              % (lower_percentile, lower_value, upper_percentile, upper_value))
+
+    finesse_factor = 4.0 * finesse**2 / numpy.pi**2
+    finesse_intensity_factor = (1 + finesse_factor) / finesse_factor
+    intensity = (upper_value - lower_value) * finesse_intensity_factor
+    continuum = abs(upper_value - intensity)
+    return continuum, intensity
+
+def bin_plane(data, factor):
+    """Average the input plane in square bins of factor x factor pixels. The
+    last columns and rows that do not fill a bin are discarded.
+
+    Parameters:
+
+    * data : numpy.ndarray
+        A 2D array.
+
+    * factor : integer
+        The number of columns and rows of each bin.
+
+    Returns:
+
+    * numpy.ndarray
+        With shape (data.shape[0] // factor, data.shape[1] // factor).
+    """
+    cols = data.shape[0] // factor
+    rows = data.shape[1] // factor
+    return numpy.asarray(data[: cols * factor, : rows * factor],
+                         dtype = numpy.float64).reshape(
+                             (cols, factor, rows, factor)).mean(axis = (1, 3))
+
 class AiryFitter(threading.Thread):
     """This class' responsibility is to fit the Airy function. It will use the
     given parameters as initial guesses. The fit will stop when the fitter
@@ -203,6 +682,24 @@ class AiryFitter(threading.Thread):
     * mpyfit_parinfo : list : defaults to []
         List of parameters' boundaries, and whether they are fixed or not. Must
         respect mpyfit's specification.
+
+    * method : string : defaults to "analytic"
+        Either "analytic", to fit an AiryModel with its analytic Jacobian using
+        fit_airy_model ( ); or "mpyfit", to fit AiryPlane with mpyfit, which
+        estimates the derivatives by finite differences.
+
+    * pyramid_depth : integer : defaults to 1
+        The number of levels of the image pyramid. Level n is the data binned
+        in squares of 2^n pixels; the fit starts at the coarsest level, and each
+        level is warm-started from the b_ratio, center and gap fitted at the
+        previous one. If 1, only the full resolution data is fitted. The
+        duration of each level's fit is stored in the level_timings dictionary,
+        keyed by the bin factor.
+
+    * samples : tuple of 2 numpy.ndarray : defaults to None
+        The columns and the rows of the pixels where the full resolution data
+        is fitted, for instance, as returned by get_ring_samples ( ). If None,
+        every pixel is fitted.
     """
 
     def __init__(self,
@@ -213,7 +710,10 @@ class AiryFitter(threading.Thread):
                  finesse,
                  gap,
                  wavelength,
-                 mpyfit_parinfo = []):
+                 mpyfit_parinfo = [],
+                 method = "analytic",
+                 pyramid_depth = 1,
+                 samples = None):
                    
         self.log = logging.getLogger(__name__)
         super(self.__class__, self ).__init__()
@@ -225,12 +725,17 @@ class AiryFitter(threading.Thread):
         self.log.debug("self.data.shape = {}".format(self.data.shape))
         self.finesse = finesse
         self.gap = gap
+        self.method = method
         self.mpyfit_parinfo = mpyfit_parinfo
+        self.precision = tuna.tools.get_precision()
+        self.pyramid_depth = pyramid_depth
+        self.samples = samples
         self.shape_cols = self.data.shape[0]
         self.shape_rows = self.data.shape[1]
         self.wavelength = wavelength
         
         self.fit = None
+        self.level_timings = {}
         self.parameters = None
 
         self.start ( )
@@ -240,28 +745,8 @@ class AiryFitter(threading.Thread):
         """
         start = time.time()
 
-        lower_percentile = tuna.tools.find_lowest_nonnull_percentile (
-            self.data)
-        upper_percentile = 99          
-        self.log.debug("%d-percentile = %f, %d-percentile = %f."
-                       % (lower_percentile,
-                          numpy.percentile(self.data, lower_percentile),
-                          upper_percentile,
-                          numpy.percentile(self.data, upper_percentile)))
-        
-        intensity = numpy.percentile(
-            self.data, upper_percentile) - numpy.percentile(
-                self.data, lower_percentile)
-        self.log.debug("percentile difference = %f" % intensity)
-        finesse_factor = 4.0 * self.finesse**2 / numpy.pi**2
-        finesse_intensity_factor = (1 + finesse_factor) / finesse_factor
-        self.log.debug("finesse_intensity_factor = ( 1 + F ) / F = %f"
-                       % finesse_intensity_factor )
-        intensity *= finesse_intensity_factor
-        self.log.debug("intensity = %f" % intensity)
-
-        continuum = abs(
-            numpy.percentile(self.data, upper_percentile) - intensity)
+        continuum, intensity = guess_continuum_and_intensity(self.data,
+                                                             self.finesse)
 
         self.log.debug("guesses:\n"
                        "\tb_ratio     = {:e},\n"
@@ -329,22 +814,23 @@ class AiryFitter(threading.Thread):
         for entry in parinfo:
             self.log.debug("parinfo = %s" % str(entry))
             
-        flat = 1
-
         self.log.debug("run()")
 
         try:
             self.log.debug("parameters = %s" % str(parameters)) 
-            fit_parameters, fit_result = mpyfit.fit(least_mpyfit,
-                                                    parameters,
-                                                    args = (self.shape_cols,
-                                                            self.shape_rows,
-                                                            self.wavelength,
-                                                            self.data,
-                                                            flat),
-                                                    parinfo = parinfo,
-                                                    xtol = 1e-7)
-                                                    #stepfactor = 10 )
+            self.level_timings = {}
+            for level in range(self.pyramid_depth - 1, 0, -1):
+                factor = 2**level
+                if min(self.data.shape) // factor < 2:
+                    continue
+                level_start = time.time()
+                parameters = self.fit_pyramid_level(factor, parameters,
+                                                    parinfo)
+                self.level_timings[factor] = time.time() - level_start
+            level_start = time.time()
+            fit_parameters, fit_result = self.fit_plane(self.data, parameters,
+                                                        parinfo, self.samples)
+            self.level_timings[1] = time.time() - level_start
         except Exception as e:
             self.log.error(tuna.console.output_exception(e))
             self.log.error("Error was using parameters = {}".format(
@@ -354,7 +840,7 @@ class AiryFitter(threading.Thread):
         self.log.debug("fit_result['bestnorm'] = %s" % str(
             fit_result['bestnorm']))
         non_spammy_results = copy.copy(fit_result)
-        del(non_spammy_results['covariances'])
+        non_spammy_results.pop('covariances', None)
         for key in non_spammy_results.keys():
             self.log.debug("fit_result[{}] = {}".format (
                 key, non_spammy_results[key]))
@@ -373,19 +859,885 @@ class AiryFitter(threading.Thread):
                                                      fit_parameters[5],
                                                      fit_parameters[6]))
 
+        for factor, duration in self.level_timings.items():
+            self.log.debug("Airy fit at bin factor {} took {:.2f}s.".format(
+                factor, duration))
         self.log.debug("Airy fit took %ds." % (time.time() - start))
-        self.fit = tuna.io.Can(airy_plane(fit_parameters[0],
-                                          fit_parameters[1],
-                                          fit_parameters[2],
-                                          fit_parameters[3],
-                                          fit_parameters[4],
-                                          fit_parameters[5],
-                                          fit_parameters[6],
-                                          self.shape_cols,
-                                          self.shape_rows,
-                                          self.wavelength))
+        self.fit = tuna.io.Can(AiryPlane(fit_parameters[0],
+                                         fit_parameters[1],
+                                         fit_parameters[2],
+                                         fit_parameters[3],
+                                         fit_parameters[4],
+                                         fit_parameters[5],
+                                         fit_parameters[6],
+                                         self.shape_cols,
+                                         self.shape_rows,
+                                         self.wavelength,
+                                         self.precision))
         self.parameters = fit_parameters
 
+    def fit_plane(self, data, parameters, parinfo, samples = None):
+        """Fit the Airy function to the input data, with this object's method.
+
+        Parameters:
+
+        * data : numpy.ndarray
+            A 2D array.
+
+        * parameters : tuple of 7 floats
+            The initial guesses, in the order of AiryModel.parameter_names.
+
+        * parinfo : list of 7 dictionaries
+            Respecting mpyfit's specification.
+
+        * samples : tuple of 2 numpy.ndarray : None
+            The columns and the rows of the pixels to be fitted. If None, every
+            pixel is fitted. The "mpyfit" method still evaluates every pixel,
+            but weights the residues of the other pixels with 0.
+
+        Returns:
+
+        * fit_parameters : list of 7 floats
+
+        * fit_result : dictionary
+        """
+        if self.method == "analytic":
+            if samples is None:
+                cols, rows = get_airy_grids(data.shape)
+                return fit_airy_model(AiryModel(cols, rows, self.wavelength),
+                                      data, parameters, parinfo)
+            cols, rows = samples
+            return fit_airy_model(AiryModel(numpy.asarray(cols, dtype = float),
+                                            numpy.asarray(rows, dtype = float),
+                                            self.wavelength),
+                                  data[cols, rows], parameters, parinfo)
+
+        flat = 1
+        if samples is not None:
+            flat = numpy.zeros(shape = data.shape)
+            flat[samples] = 1
+        return mpyfit.fit(least_mpyfit,
+                          parameters,
+                          args = (data.shape[0],
+                                  data.shape[1],
+                                  self.wavelength,
+                                  data,
+                                  flat),
+                          parinfo = parinfo,
+                          xtol = 1e-7)
+
+    def fit_pyramid_level(self, factor, parameters, parinfo):
+        """Fit the Airy function to the data binned by the input factor, and
+        return the parameters warm-started from this fit.
+
+        In the binned plane, the distances are divided by the factor, so the
+        b_ratio is multiplied by it, and the center is moved to the binned
+        coordinates. The continuum and intensity are guessed again from the
+        binned plane, since binning smooths the rings; only the b_ratio, center
+        and gap fitted at this level are kept.
+
+        Parameters:
+
+        * factor : integer
+            The number of columns and rows of each bin.
+
+        * parameters : tuple of 7 floats
+            The initial guesses, in the order of AiryModel.parameter_names.
+
+        * parinfo : list of 7 dictionaries
+            Respecting mpyfit's specification.
+
+        Returns:
+
+        * tuple of 7 floats
+            The input parameters, with the b_ratio, center and gap fitted at
+            this level.
+        """
+        binned = bin_plane(self.data, factor)
+        offset = (factor - 1) / 2
+        scales = [(factor, 0), (1 / factor, - offset / factor),
+                  (1 / factor, - offset / factor)]
+
+        level_parameters = list(parameters)
+        level_parinfo = [dict(entry) for entry in parinfo]
+        for index, (scale, shift) in enumerate(scales):
+            level_parameters[index] = parameters[index] * scale + shift
+            if 'limits' in parinfo[index]:
+                level_parinfo[index]['limits'] = tuple(
+                    limit * scale + shift for limit in parinfo[index]['limits'])
+        continuum, intensity = guess_continuum_and_intensity(binned,
+                                                             parameters[4])
+        for index, guess in ((3, continuum), (6, intensity)):
+            level_parameters[index] = guess
+            if 'limits' in parinfo[index]:
+                level_parinfo[index]['limits'] = (guess * 0.9, guess * 1.1)
+
+        level_fit, level_result = self.fit_plane(binned, level_parameters,
+                                                 level_parinfo)
+        self.log.debug("Airy fit at bin factor {}: bestnorm = {}.".format(
+            factor, level_result['bestnorm']))
+
+        warm = list(parameters)
+        for index, (scale, shift) in enumerate(scales):
+            warm[index] = (level_fit[index] - shift) / scale
+        warm[5] = level_fit[5]
+        return tuple(warm)
+
+class AiryCubeFitter(threading.Thread):
+    """This class' responsibility is to fit the Airy function to several planes
+    of a cube, splitting the planes among several processes.
+
+    The b_ratio, center and finesse are fixed, and each plane has its gap
+    bounded as in the high resolution pipeline: from the gap of the previous
+    plane, until 10 channel gaps away from it, in the direction of the scan.
+    The gap of the previous plane is extrapolated from the gap of the first
+    plane of the cube and the channel gap, so that the planes can be fitted
+    independently. The planes can also be fitted in blocks of consecutive
+    planes, where each plane is warm-started from the gap fitted on the
+    previous plane of its block, which follows the scan more closely at the
+    cost of less parallelism.
+
+    The blocks are mapped to a multiprocessing pool, and each plane is fitted
+    by an AiryFitter. The cube and the resulting fits are placed in shared
+    memory, so the workers read their planes and write their fits in place.
+
+    It inherits from the :ref:`threading_label`.Thread class, and it auto-starts
+    its thread execution. Clients are expected to use its .join ( ) method
+    before using its results.
+
+    Its constructor expects the following parameters:
+
+    * b_ratio : float
+        The ratio between the pixel size and the camera focal length (b).
+
+    * center_col : float
+        The column for the center of the rings, in pixels.
+
+    * center_row : float
+        The row for the center of the rings, in pixels.
+
+    * channel_gap : float
+        The change in the gap from one plane to the next, in microns.
+
+    * data : numpy.ndarray
+        The 3D cube, where each plane is to be fitted.
+
+    * finesse : float
+        (F).
+
+    * gap : float
+        The gap fitted on the first plane (index 0) of the cube, in microns.
+
+    * wavelength : float
+        Wavelength in microns ( lambda_c ).
+
+    * planes : list of integers : None
+        The indices of the planes to be fitted. If None, all planes are fitted.
+
+    * block_size : integer : 1
+        The number of consecutive planes fitted one after the other, each one
+        warm-started from the previous one. If 1, every plane is fitted
+        independently.
+
+    * workers : integer : None
+        The number of worker processes. If None, one per CPU is used; if 1, the
+        planes are fitted in this process, which is also the case when shared
+        memory is not available (Python < 3.8).
+
+    * samples : dictionary, or tuple of 2 numpy.ndarray : None
+        The columns and the rows of the pixels where each plane is fitted,
+        keyed by plane, for instance, as returned by get_ring_samples ( ) for
+        the find_rings ( ) result of each plane; the planes missing from the
+        dictionary have every pixel fitted. A single tuple is used for every
+        plane, which is only valid if it covers the rings of all planes (see
+        get_ring_samples ( )). If None, every pixel is fitted.
+
+    * pyramid_depth : integer : 1
+        The number of levels of the image pyramid on which each plane is
+        fitted, as described in AiryFitter.
+    """
+    def __init__(self, b_ratio, center_col, center_row, channel_gap, data,
+                 finesse, gap, wavelength, planes = None, block_size = 1,
+                 workers = None, samples = None, pyramid_depth = 1):
+        self.log = logging.getLogger(__name__)
+        super(self.__class__, self).__init__()
+
+        self.data = data
+        self.settings = {'b_ratio': b_ratio,
+                         'center_col': center_col,
+                         'center_row': center_row,
+                         'channel_gap': channel_gap,
+                         'finesse': finesse,
+                         'gap': gap,
+                         'pyramid_depth': pyramid_depth,
+                         'samples': samples,
+                         'wavelength': wavelength}
+        self.planes = planes
+        if self.planes == None:
+            self.planes = list(range(self.data.shape[0]))
+        self.block_size = max(1, block_size)
+        self.precision = tuna.tools.get_precision()
+        self.workers = workers
+        if self.workers == None:
+            self.workers = multiprocessing.cpu_count()
+
+        self.fit = None
+        self.parameters = None
+
+        self.start()
+
+    def run(self):
+        """Fit the planes, when called by this object's threading.Thread.start ( )
+        method.
+        """
+        start = time.time()
+
+        planes = sorted(self.planes)
+        blocks = []
+        for first in range(0, len(planes), self.block_size):
+            blocks.append(planes[first : first + self.block_size])
+
+        if self.workers == 1 or len(blocks) < 2 or shared_memory is None:
+            fit = numpy.zeros(shape = self.data.shape, dtype = self.precision)
+            block_parameters = [fit_airy_planes(self.data, fit, block,
+                                                **self.settings)
+                                for block in blocks]
+        else:
+            fit, block_parameters = self.fit_in_workers(blocks)
+
+        self.parameters = {}
+        for block, parameters in zip(blocks, block_parameters):
+            self.parameters.update(zip(block, parameters))
+        self.fit = tuna.io.Can(array = fit)
+
+        self.log.debug("Airy fit of {} planes took {:.1f}s.".format(
+            len(planes), time.time() - start))
+
+    def fit_in_workers(self, blocks):
+        """Copy the cube into shared memory, and map the blocks of planes to the
+        process pool.
+
+        Parameters:
+
+        * blocks : list of lists of integers
+
+        Returns:
+
+        * fit : numpy.ndarray
+            With the same shape as the cube, where the fitted planes contain
+            their fit, and the remaining planes are 0.
+
+        * block_parameters : list of lists
+            With the fitted parameters of each plane of each block.
+        """
+        array = self.data
+        fit_shape = array.shape
+        cube_memory = shared_memory.SharedMemory(create = True,
+                                                 size = array.nbytes)
+        fit_memory = shared_memory.SharedMemory(
+            create = True,
+            size = int(numpy.prod(fit_shape)) * self.precision.itemsize)
+        try:
+            cube = numpy.ndarray(shape = array.shape, dtype = array.dtype,
+                                 buffer = cube_memory.buf)
+            cube[:] = array
+            del(cube)
+            fit = numpy.ndarray(shape = fit_shape, dtype = self.precision,
+                                buffer = fit_memory.buf)
+            fit[:] = 0
+            del(fit)
+            with multiprocessing.Pool(
+                    processes = min(self.workers, len(blocks)),
+                    initializer = attach_shared_airy_cube,
+                    initargs = (cube_memory.name, array.shape, array.dtype.str,
+                                fit_memory.name, self.precision.str,
+                                self.settings)) as pool:
+                block_parameters = pool.map(fit_shared_airy_block, blocks)
+            fit = numpy.copy(numpy.ndarray(shape = fit_shape,
+                                           dtype = self.precision,
+                                           buffer = fit_memory.buf))
+        finally:
+            cube_memory.close()
+            cube_memory.unlink()
+            fit_memory.close()
+            fit_memory.unlink()
+
+        return fit, block_parameters
+
+def get_plane_parinfo(latest_gap, channel_gap, extrapolated = False):
+    """Return the constraints for fitting a plane whose previous plane has the
+    input gap: the b_ratio, center and finesse are fixed, and the gap is
+    bounded from the previous gap until 10 channel gaps away from it.
+
+    When the gap of the previous plane was not fitted, but extrapolated with a
+    channel gap that is itself an estimate, the error of the extrapolation
+    grows with the number of planes, and may have either sign; the gap is then
+    bounded within 10 channel gaps on both sides of its expected value.
+
+    Parameters:
+
+    * latest_gap : float
+        The gap of the previous plane, in microns.
+
+    * channel_gap : float
+        The change in the gap from one plane to the next, in microns.
+
+    * extrapolated : boolean : False
+        Whether latest_gap was extrapolated, instead of fitted.
+
+    Returns:
+
+    * list of 7 dictionaries
+        Respecting mpyfit's specification.
+    """
+    parinfo = [{'fixed': True},
+               {'fixed': True},
+               {'fixed': True},
+               {'fixed': False},
+               {'fixed': True}]
+    if extrapolated:
+        expected_gap = latest_gap + channel_gap
+        parinfo.append({'fixed': False,
+                        'limits': (expected_gap - 10 * abs(channel_gap),
+                                   expected_gap + 10 * abs(channel_gap))})
+    elif channel_gap >= 0:
+        parinfo.append({'fixed': False,
+                        'limits': (latest_gap,
+                                   latest_gap + 10 * abs(channel_gap))})
+    else:
+        parinfo.append({'fixed': False,
+                        'limits': (latest_gap - 10 * abs(channel_gap),
+                                   latest_gap)})
+    parinfo.append({'fixed': False})
+    return parinfo
+
+def fit_airy_planes(cube, fit, planes, b_ratio, center_col, center_row,
+                    channel_gap, finesse, gap, wavelength, samples = None,
+                    pyramid_depth = 1):
+    """Fit the Airy function to the input planes of a cube, one after the
+    other, where each plane is warm-started from the gap fitted on the
+    previous one. The gap before the first plane is extrapolated from the gap
+    of the first plane of the cube, and so the gap of the first plane is
+    searched on both sides of its expected value (see get_plane_parinfo ( )).
+
+    Parameters:
+
+    * cube : numpy.ndarray
+        The 3D cube containing the data.
+
+    * fit : numpy.ndarray
+        With the same shape as the cube, where the fit of each plane is written.
+
+    * planes : list of integers
+        The indices of the planes to be fitted, in increasing order.
+
+    The remaining parameters are described in AiryCubeFitter.
+
+    Returns:
+
+    * list
+        Containing the fitted parameters of each plane.
+    """
+    log = logging.getLogger(__name__)
+    result = []
+    latest_plane = 0
+    latest_gap = gap
+    for plane in planes:
+        extrapolated = plane - latest_plane > 1
+        latest_gap += (plane - latest_plane - 1) * channel_gap
+        log.debug("Fitting Airy plane {}: gap at {:.5f}.".format(
+            plane, latest_gap))
+        fitter = AiryFitter(b_ratio,
+                            center_col,
+                            center_row,
+                            cube[plane],
+                            finesse,
+                            latest_gap + channel_gap,
+                            wavelength,
+                            get_plane_parinfo(latest_gap, channel_gap,
+                                              extrapolated = extrapolated),
+                            pyramid_depth = pyramid_depth,
+                            samples = get_plane_samples(samples, plane))
+        fitter.join()
+        fit[plane] = fitter.fit.array
+        result.append(fitter.parameters)
+        latest_plane = plane
+        latest_gap = fitter.parameters[5]
+        log.debug("Plane {} fitted.".format(plane))
+    return result
+
+# Shared memory blocks, arrays and settings attached by each AiryCubeFitter
+#worker.
+airy_cube_arrays = {}
+
+def attach_shared_airy_cube(cube_name, cube_shape, cube_dtype, fit_name,
+                            fit_dtype, settings):
+    """Attach the current worker process to the shared memory blocks created by
+    AiryCubeFitter, and store views of them in airy_cube_arrays.
+
+    Parameters:
+
+    * cube_name : string
+        The name of the shared memory block containing the cube.
+
+    * cube_shape : tuple of 3 integers
+
+    * cube_dtype : string
+        The numpy dtype string of the cube.
+
+    * fit_name : string
+        The name of the shared memory block where the fits are written.
+
+    * fit_dtype : string
+        The numpy dtype string of the fits.
+
+    * settings : dictionary
+        The parameters of fit_airy_planes ( ) that are common to all blocks.
+    """
+    airy_cube_arrays['cube_memory'] = shared_memory.SharedMemory(
+        name = cube_name)
+    airy_cube_arrays['fit_memory'] = shared_memory.SharedMemory(
+        name = fit_name)
+    airy_cube_arrays['cube'] = numpy.ndarray(
+        shape = cube_shape, dtype = numpy.dtype(cube_dtype),
+        buffer = airy_cube_arrays['cube_memory'].buf)
+    airy_cube_arrays['fit'] = numpy.ndarray(
+        shape = cube_shape, dtype = numpy.dtype(fit_dtype),
+        buffer = airy_cube_arrays['fit_memory'].buf)
+    airy_cube_arrays['settings'] = settings
+
+def fit_shared_airy_block(block):
+    """Fit a block of planes of the shared cube, writing their fits onto the
+    shared fit cube.
+
+    Parameters:
+
+    * block : list of integers
+
+    Returns:
+
+    * list
+        Containing the fitted parameters of each plane.
+    """
+    return fit_airy_planes(airy_cube_arrays['cube'], airy_cube_arrays['fit'],
+                           block, **airy_cube_arrays['settings'])
+
+class AiryCubeModel(object):
+    """This class' responsibility is to evaluate the Airy function on several
+    planes that share the b_ratio, center and finesse, but each have their own
+    continuum, gap and intensity, and the derivatives of the model with respect
+    to all these parameters.
+
+    The parameters are ordered as the b_ratio, center_col, center_row and
+    finesse, followed by the continuum, gap and intensity of each plane. The
+    model of a plane depends only on the shared parameters and on the
+    parameters of that plane, so the Jacobian of the whole cube is sparse,
+    with one block of 7 columns per plane; these blocks are kept in a
+    preallocated buffer, and the normal equations are assembled from them
+    without building the Jacobian itself. The distances to the center are
+    shared by all planes, and are computed once per evaluation.
+
+    Its constructor expects the following parameters:
+
+    * cols : numpy.ndarray
+        The column coordinates where the model is evaluated.
+
+    * rows : numpy.ndarray
+        The row coordinates where the model is evaluated; must broadcast with
+        cols, for instance, the grids from get_airy_grids ( ).
+
+    * planes : integer
+        The number of planes.
+
+    * wavelength : float
+        Wavelength in microns ( lambda_c ).
+    """
+    def __init__(self, cols, rows, planes, wavelength):
+        self.cols = cols
+        self.rows = rows
+        self.planes = planes
+        self.wavelength = wavelength
+        self.shape = numpy.broadcast(cols, rows).shape
+        cube_shape = (planes, ) + self.shape
+
+        self.col_distances = numpy.empty(shape = self.shape)
+        self.row_distances = numpy.empty(shape = self.shape)
+        self.squared_distances = numpy.empty(shape = self.shape)
+        self.s = numpy.empty(shape = self.shape)
+        self.phase = numpy.empty(shape = cube_shape)
+        self.sin_phase = numpy.empty(shape = cube_shape)
+        self.denominator = numpy.empty(shape = cube_shape)
+        self.model = numpy.empty(shape = cube_shape)
+        self.scratch = numpy.empty(shape = cube_shape)
+        self.derivatives = numpy.empty(shape = (planes, 7) + self.shape)
+        self.derivatives[:, 4] = 1
+        self.last_parameters = None
+
+    def split(self, p):
+        """Separate the input parameters in the shared and per plane ones.
+
+        Parameters:
+
+        * p : numpy.ndarray
+            The parameters, in the order described in this class.
+
+        Returns:
+
+        * b_ratio, center_col, center_row, finesse : floats
+
+        * continuum, gap, intensity : numpy.ndarray
+            With one value per plane, shaped to broadcast with the planes.
+        """
+        p = numpy.asarray(p, dtype = numpy.float64)
+        per_plane = p[4 :].reshape((self.planes, 3) + (1, ) * len(self.shape))
+        return (p[0], p[1], p[2], p[3],
+                per_plane[:, 0], per_plane[:, 1], per_plane[:, 2])
+
+    def evaluate(self, p):
+        """Compute the model of all planes, and the intermediate values used by
+        the derivatives, in the buffers of this object.
+
+        Parameters:
+
+        * p : numpy.ndarray
+            The parameters, in the order described in this class.
+
+        Returns:
+
+        * numpy.ndarray
+            With the planes along the first axis, in a buffer that is
+            overwritten by the next evaluation.
+        """
+        b_ratio, center_col, center_row, finesse, continuum, gap, intensity = \
+            self.split(p)
+        numpy.subtract(self.cols, center_col, out = self.col_distances)
+        numpy.subtract(self.rows, center_row, out = self.row_distances)
+        numpy.multiply(self.col_distances, self.col_distances,
+                       out = self.squared_distances)
+        self.squared_distances += self.row_distances**2
+        numpy.multiply(self.squared_distances, b_ratio**2, out = self.s)
+        self.s += 1
+        numpy.sqrt(self.s, out = self.s)
+
+        numpy.divide(2.0 * numpy.pi * gap / self.wavelength, self.s,
+                     out = self.phase)
+        numpy.sin(self.phase, out = self.sin_phase)
+        airy_function_I = 4.0 * finesse**2 / numpy.pi**2
+        numpy.multiply(self.sin_phase, self.sin_phase, out = self.denominator)
+        self.denominator *= airy_function_I
+        self.denominator += 1
+        numpy.divide(intensity, self.denominator, out = self.model)
+        self.model += continuum
+
+        self.last_parameters = tuple(p)
+        return self.model
+
+    def jacobian(self, p):
+        """Compute the partial derivatives of the model of each plane with
+        respect to the parameters it depends on, as in AiryModel.jacobian ( ).
+
+        Parameters:
+
+        * p : numpy.ndarray
+            The parameters, in the order described in this class.
+
+        Returns:
+
+        * numpy.ndarray
+            Where derivatives[plane] contains the derivatives of that plane with
+            respect to the b_ratio, center_col, center_row, finesse, and the
+            continuum, gap and intensity of that plane; in a buffer that is
+            overwritten by the next call.
+        """
+        if self.last_parameters != tuple(p):
+            self.evaluate(p)
+        b_ratio, center_col, center_row, finesse, continuum, gap, intensity = \
+            self.split(p)
+        airy_function_I = 4.0 * finesse**2 / numpy.pi**2
+        derivatives = self.derivatives
+        scratch = self.scratch
+
+        # d / d intensity = 1 / D
+        numpy.divide(1.0, self.denominator, out = derivatives[:, 6])
+        # - I_0 / D², the factor of the derivatives through D.
+        numpy.multiply(derivatives[:, 6], derivatives[:, 6], out = scratch)
+        scratch *= - intensity
+        # d / d finesse = - I_0 / D² * 8 F / pi² * sin² phi
+        numpy.multiply(self.sin_phase, self.sin_phase, out = derivatives[:, 3])
+        derivatives[:, 3] *= scratch
+        derivatives[:, 3] *= 8.0 * finesse / numpy.pi**2
+        # (d / d phi) * phi = - I_0 / D² * 4 F² / pi² * sin (2 phi) * phi
+        numpy.multiply(self.phase, 2.0, out = derivatives[:, 0])
+        numpy.sin(derivatives[:, 0], out = derivatives[:, 0])
+        scratch *= derivatives[:, 0]
+        scratch *= airy_function_I
+        scratch *= self.phase
+
+        # d / d gap = (d / d phi) * phi / gap
+        numpy.divide(scratch, gap, out = derivatives[:, 5])
+        # The derivatives with respect to the b_ratio and the center, as in
+        #AiryModel.jacobian ( ).
+        scratch /= self.s
+        scratch /= self.s
+        numpy.multiply(scratch, self.col_distances, out = derivatives[:, 1])
+        derivatives[:, 1] *= b_ratio**2
+        numpy.multiply(scratch, self.row_distances, out = derivatives[:, 2])
+        derivatives[:, 2] *= b_ratio**2
+        numpy.multiply(scratch, self.squared_distances, out = derivatives[:, 0])
+        derivatives[:, 0] *= - b_ratio
+        return derivatives
+
+    def normal_equations(self, p, residues):
+        """Compute the normal equations of the least squares problem, J^T J and
+        J^T r, where J is the Jacobian of the whole cube and r the residues,
+        from the blocks of each plane.
+
+        Parameters:
+
+        * p : numpy.ndarray
+            The parameters, in the order described in this class.
+
+        * residues : numpy.ndarray
+            The difference between the model and the data, with the same shape
+            as the model.
+
+        Returns:
+
+        * jtj : numpy.ndarray
+            A square matrix, with one row per parameter.
+
+        * jtr : numpy.ndarray
+            With one value per parameter.
+        """
+        blocks = self.jacobian(p).reshape((self.planes, 7, -1))
+        gram = numpy.matmul(blocks, blocks.transpose(0, 2, 1))
+        gradient = numpy.matmul(blocks, residues.reshape(
+            (self.planes, -1, 1)))[:, :, 0]
+
+        parameters = 4 + 3 * self.planes
+        jtj = numpy.zeros(shape = (parameters, parameters))
+        jtr = numpy.zeros(shape = parameters)
+        jtj[: 4, : 4] = numpy.sum(gram[:, : 4, : 4], axis = 0)
+        jtr[: 4] = numpy.sum(gradient[:, : 4], axis = 0)
+        for plane in range(self.planes):
+            own = slice(4 + 3 * plane, 7 + 3 * plane)
+            jtj[: 4, own] = gram[plane, : 4, 4 :]
+            jtj[own, : 4] = gram[plane, 4 :, : 4]
+            jtj[own, own] = gram[plane, 4 :, 4 :]
+            jtr[own] = gradient[plane, 4 :]
+        return jtj, jtr
+
+def fit_airy_cube_model(model, data, parameters, lower, upper, xtol = 1e-7,
+                        ftol = 1e-10, max_iterations = 100):
+    """Fit an AiryCubeModel to data with a bounded Levenberg-Marquardt, where
+    each step solves the normal equations assembled by
+    AiryCubeModel.normal_equations ( ).
+
+    The parameters at a bound, whose gradient points out of the bounds, are
+    held fixed during a step, and the steps of the other parameters are
+    clipped into the bounds.
+
+    Parameters:
+
+    * model : AiryCubeModel
+
+    * data : numpy.ndarray
+        With the planes along the first axis, and the same shape as the model.
+
+    * parameters : numpy.ndarray
+        The initial guesses, in the order described in AiryCubeModel.
+
+    * lower : numpy.ndarray
+        The lower bound of each parameter.
+
+    * upper : numpy.ndarray
+        The upper bound of each parameter.
+
+    * xtol : float : 1e-7
+        The tolerance for the relative change in the parameters.
+
+    * ftol : float : 1e-10
+        The tolerance for the relative change in the sum of squared residuals.
+
+    * max_iterations : integer : 100
+
+    Returns:
+
+    * fit_parameters : numpy.ndarray
+
+    * fit_result : dictionary
+        With the keys 'bestnorm' (the sum of squared residuals), 'nfev', 'njev',
+        'status' and 'message'.
+    """
+    data = numpy.asarray(data, dtype = numpy.float64)
+    x = numpy.clip(numpy.asarray(parameters, dtype = numpy.float64),
+                   lower, upper)
+    residues = model.evaluate(x) - data
+    bestnorm = float(numpy.sum(residues**2))
+    damping = 1e-3
+    nfev = 1
+    njev = 0
+    status = 0
+    message = "The maximum number of iterations was reached."
+
+    for iteration in range(max_iterations):
+        jtj, jtr = model.normal_equations(x, residues)
+        njev += 1
+        active = ((x <= lower) & (jtr > 0)) | ((x >= upper) & (jtr < 0))
+        free = ~ active
+        reduced = jtj[numpy.ix_(free, free)]
+        diagonal = numpy.diag(reduced).copy()
+        diagonal[diagonal == 0] = 1
+
+        improved = False
+        while damping < 1e16:
+            try:
+                step = numpy.linalg.solve(
+                    reduced + damping * numpy.diag(diagonal), - jtr[free])
+            except numpy.linalg.LinAlgError:
+                damping *= 10
+                continue
+            trial = numpy.copy(x)
+            trial[free] += step
+            trial = numpy.clip(trial, lower, upper)
+            trial_residues = model.evaluate(trial) - data
+            trial_norm = float(numpy.sum(trial_residues**2))
+            nfev += 1
+            if trial_norm < bestnorm:
+                improved = True
+                break
+            damping *= 10
+
+        if not improved:
+            status = 2
+            message = "No step decreases the sum of squared residuals."
+            break
+
+        change = numpy.abs(trial - x)
+        decrease = (bestnorm - trial_norm) / bestnorm
+        x = trial
+        residues = trial_residues
+        bestnorm = trial_norm
+        damping = max(damping / 10, 1e-12)
+        if numpy.all(change <= xtol * (xtol + numpy.abs(x))):
+            status = 1
+            message = "The change in the parameters is below xtol."
+            break
+        if decrease <= ftol:
+            status = 1
+            message = "The change in the sum of squares is below ftol."
+            break
+
+    fit_result = {'bestnorm': bestnorm,
+                  'nfev': nfev,
+                  'njev': njev,
+                  'status': status,
+                  'message': message}
+    return x, fit_result
+
+class AiryJointFitter(threading.Thread):
+    """This class' responsibility is to fit the Airy function to several planes
+    of a cube at once, where the b_ratio, center and finesse are shared by all
+    planes, and each plane has its own continuum, gap and intensity.
+
+    Unlike AiryCubeFitter, the shared parameters are refined with the data of
+    all planes, and no plane depends on the fit of another. The initial gap of
+    each plane is extrapolated from the gap of the first plane of the cube and
+    the channel gap, and bounded as in AiryCubeFitter; the shared parameters
+    and the continuum and intensity of each plane are bounded as in
+    AiryFitter. The memory used is about 15 times the size of the fitted
+    planes, in float64.
+
+    It inherits from the :ref:`threading_label`.Thread class, and it auto-starts
+    its thread execution. Clients are expected to use its .join ( ) method
+    before using its results.
+
+    Its constructor expects the same parameters as AiryCubeFitter's, except for
+    block_size and workers. Since the model of all planes is evaluated on the
+    same pixels, the union of the samples of the fitted planes is used when
+    samples is a dictionary.
+    """
+    def __init__(self, b_ratio, center_col, center_row, channel_gap, data,
+                 finesse, gap, wavelength, planes = None, samples = None):
+        self.log = logging.getLogger(__name__)
+        super(self.__class__, self).__init__()
+
+        self.b_ratio = b_ratio
+        self.center_col = center_col
+        self.center_row = center_row
+        self.channel_gap = channel_gap
+        self.data = data
+        self.finesse = finesse
+        self.gap = gap
+        self.wavelength = wavelength
+        self.planes = planes
+        if self.planes == None:
+            self.planes = list(range(self.data.shape[0]))
+        self.planes = sorted(self.planes)
+        self.precision = tuna.tools.get_precision()
+        self.samples = get_union_of_samples(samples, self.planes,
+                                            self.data.shape[1 :])
+
+        self.fit = None
+        self.fit_result = None
+        self.parameters = None
+
+        self.start()
+
+    def run(self):
+        """Fit the planes, when called by this object's threading.Thread.start ( )
+        method.
+        """
+        start = time.time()
+
+        parameters = [self.b_ratio, self.center_col, self.center_row,
+                      self.finesse]
+        lower = [self.b_ratio * 0.9, self.center_col - 5, self.center_row - 5,
+                 self.finesse * 0.95]
+        upper = [self.b_ratio * 1.1, self.center_col + 5, self.center_row + 5,
+                 self.finesse * 1.05]
+        for plane in self.planes:
+            continuum, intensity = guess_continuum_and_intensity(
+                self.data[plane], self.finesse)
+            expected_gap = self.gap + plane * self.channel_gap
+            parinfo = get_plane_parinfo(expected_gap - self.channel_gap,
+                                        self.channel_gap,
+                                        extrapolated = plane > 1)
+            gap_limits = parinfo[5]['limits']
+            parameters += [continuum, expected_gap, intensity]
+            lower += [continuum * 0.9, gap_limits[0], intensity * 0.9]
+            upper += [continuum * 1.1, gap_limits[1], intensity * 1.1]
+
+        if self.samples is None:
+            cols, rows = get_airy_grids(self.data.shape[1 :])
+            data = self.data[self.planes]
+        else:
+            cols = numpy.asarray(self.samples[0], dtype = numpy.float64)
+            rows = numpy.asarray(self.samples[1], dtype = numpy.float64)
+            data = self.data[self.planes][:, self.samples[0], self.samples[1]]
+        model = AiryCubeModel(cols, rows, len(self.planes), self.wavelength)
+        fit_parameters, self.fit_result = fit_airy_cube_model(
+            model, data, parameters, numpy.array(lower), numpy.array(upper))
+        self.log.debug("Joint Airy fit: {} evaluations, bestnorm = {:e}.".format(
+            self.fit_result['nfev'], self.fit_result['bestnorm']))
+
+        fit = numpy.zeros(shape = self.data.shape, dtype = self.precision)
+        self.parameters = {}
+        shared = [float(value) for value in fit_parameters[: 4]]
+        for index, plane in enumerate(self.planes):
+            continuum, gap, intensity = fit_parameters[4 + 3 * index :
+                                                       7 + 3 * index]
+            self.parameters[plane] = shared[: 3] + [float(continuum),
+                                                    shared[3], float(gap),
+                                                    float(intensity)]
+            fit[plane] = AiryPlane(*self.parameters[plane],
+                                   self.data.shape[1], self.data.shape[2],
+                                   self.wavelength, self.precision)
+        self.fit = tuna.io.Can(array = fit)
+
+        self.log.debug("Joint Airy fit of {} planes took {:.1f}s.".format(
+            len(self.planes), time.time() - start))
+
 def fit_airy(b_ratio: float,
              center_col: float,
              center_row: float,
@@ -393,7 +1745,8 @@ def fit_airy(b_ratio: float,
              finesse: float,
              gap: float,
              wavelength: float,
-             mpyfit_parinfo: list = []) -> (dict, tuna.io.Can):
+             mpyfit_parinfo: list = [],
+             pyramid_depth: int = 1) -> (dict, tuna.io.Can):
     """Conveniently fit the Airy function. It will use the given parameters as
     initial guesses. The fit will stop when the fitter converges.
 
@@ -426,6 +1779,10 @@ def fit_airy(b_ratio: float,
 
     * mpyfit_parinfo : list : defaults to [ ]
         List of parameters' boundaries, and whether they are fixed or not. Must respect mpyfit's specification.
+
+    * pyramid_depth : int : defaults to 1
+        The number of levels of the image pyramid, as described in AiryFitter.
+        If 1, only the full resolution data is fitted.
     """
     fitter = AiryFitter(b_ratio,
                         center_col,
@@ -434,6 +1791,118 @@ def fit_airy(b_ratio: float,
                         finesse,
                         gap,
                         wavelength,
-                        mpyfit_parinfo )
+                        mpyfit_parinfo,
+                        pyramid_depth = pyramid_depth)
+    fitter.join()
+    return (fitter.parameters, fitter.fit)
+
+def fit_airy_cube(b_ratio: float,
+                  center_col: float,
+                  center_row: float,
+                  channel_gap: float,
+                  data: numpy.ndarray,
+                  finesse: float,
+                  gap: float,
+                  wavelength: float,
+                  planes: list = None,
+                  block_size: int = 1,
+                  pyramid_depth: int = 1) -> (dict, tuna.io.Can):
+    """Conveniently fit the Airy function to the planes of a cube, using a pool
+    of worker processes. It is the "Airy cube fit" plugin.
+
+    Arguments:
+
+    * b_ratio : float
+        The ratio between the pixel size and the camera focal length (b).
+
+    * center_col : float
+        The column for the center of the rings, in pixels.
+
+    * center_row : float
+        The row for the center of the rings, in pixels.
+
+    * channel_gap : float
+        The change in the gap from one plane to the next, in microns.
+
+    * data : numpy.ndarray
+        The 3D cube, where each plane is to be fitted.
+
+    * finesse : float
+        (F).
+
+    * gap : float
+        The gap fitted on the first plane (index 0) of the cube, in microns.
+
+    * wavelength : float
+        Wavelength in microns ( lambda_c ).
+
+    * planes : list : None
+        The indices of the planes to be fitted. If None, all planes are fitted.
+
+    * block_size : int : 1
+        The number of consecutive planes fitted one after the other, each one
+        warm-started from the previous one.
+
+    * pyramid_depth : int : 1
+        The number of levels of the image pyramid on which each plane is
+        fitted, as described in AiryFitter.
+
+    Returns:
+
+    * parameters : dict
+        Where each key is a fitted plane, and its value is the list of fitted
+        parameters.
+
+    * tuna.io.Can
+        Containing the cube of fits, where the planes not fitted are 0.
+    """
+    fitter = AiryCubeFitter(b_ratio, center_col, center_row, channel_gap, data,
+                            finesse, gap, wavelength, planes = planes,
+                            block_size = block_size,
+                            pyramid_depth = pyramid_depth)
+    fitter.join()
+    return (fitter.parameters, fitter.fit)
+
+def fit_airy_cube_jointly(b_ratio: float,
+                          center_col: float,
+                          center_row: float,
+                          channel_gap: float,
+                          data: numpy.ndarray,
+                          finesse: float,
+                          gap: float,
+                          wavelength: float,
+                          planes: list = None,
+                          block_size: int = 1,
+                          pyramid_depth: int = 1) -> (dict, tuna.io.Can):
+    """Conveniently fit the Airy function to the planes of a cube, all at once,
+    with shared b_ratio, center and finesse. It can be registered as the "Airy
+    cube fit" plugin::
+
+        >>> tuna.plugins.registry("Airy cube fit",
+        ...     tuna.models.airy.fit_airy_cube_jointly)
+
+    Arguments:
+
+    The same as for fit_airy_cube ( ), except for:
+
+    * block_size : int : 1
+        Not used by this method; necessary to obey the signature of the "Airy
+        cube fit" plugin.
+
+    * pyramid_depth : int : 1
+        Not used by this method; necessary to obey the signature of the "Airy
+        cube fit" plugin.
+
+    Returns:
+
+    * parameters : dict
+        Where each key is a fitted plane, and its value is the list of fitted
+        parameters.
+
+    * tuna.io.Can
+        Containing the cube of fits, where the planes not fitted are 0.
+    """
+    fitter = AiryJointFitter(b_ratio, center_col, center_row, channel_gap, data,
+                             finesse, gap, wavelength, planes = planes)
     fitter.join()
     return (fitter.parameters, fitter.fit)
@@ -1,25 +1,37 @@
 """This module's scope is to model and fit a parabolic dsitribution to data.
 """
-__version__ = "0.1.1"
+__version__ = "0.2.1"
 __changelog = {
+    "0.2.1": {"Tuna": "0.17.0", "Change": "Use numpy.dot instead of the " \
+              "matrix multiplication operator, for Python < 3.5."},
+    "0.2.0": {"Tuna": "0.17.0", "Change": "The parabola is fitted by linear " \
+              "least squares, on the normal equations of its 6 " \
+              "coefficients, using only the pixels that are not noise."},
     "0.1.1": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.0": {"Tuna": "0.14.0", "Change": "updated docstrings to new style."}
 }
 
-from astropy.modeling import models
-from astropy.modeling.fitting import LevMarLSQFitter
 import logging
 from math import sqrt
 import numpy
 import threading
 import time
 import tuna
-import warnings
 
 class ParabolicFitter(threading.Thread):
     """This class's responsibility is to generate parabolic models and the
     fitting of models to data.
 
+    The model is a polynomial of degree 2 on the column (x) and line (y)
+    indices, as astropy's Polynomial2D. Since the model is linear in its 6
+    coefficients, they are obtained by solving the normal equations of the least
+    squares problem, in a single step. Only the pixels that are not noise are
+    used, optionally on a subsampled grid. The coordinates are centered and
+    scaled before the normal equations are assembled, so that they are well
+    conditioned, and the coefficients are then converted back to pixel indices.
+
+    Only numpy is used, so this fitter can run concurrently with other fits.
+
     It inherits from the :ref:`threading_label`.Thread class, and it auto-starts
     its thread execution. Clients are expected to use its .join ( ) method
     before using its results.
@@ -32,19 +44,26 @@ class ParabolicFitter(threading.Thread):
         Containing the expected center of the interferograph.
 
     * noise : tuna.io.Can
-        Contains the noise corresponding to the data.
+        Contains the noise corresponding to the data, where noisy pixels have
+        value 1.
 
     * unwrapped : tuna.io.Can
         Contains the data to be fitted.
+
+    * sample_step : integer : 1
+        Only one pixel out of every sample_step, along each axis, is used in
+        the fit. If 1, every pixel that is not noise is used.
     """
-    def __init__(self, noise, unwrapped, center):
+    def __init__(self, noise, unwrapped, center, sample_step = 1):
         super(self.__class__, self).__init__()
-        
+
         self.log = logging.getLogger(__name__)
         self.log.setLevel(logging.INFO)
 
         self.center = center
         self.noise = noise.array
+        self.precision = tuna.tools.get_precision()
+        self.sample_step = max(1, int(sample_step))
         self.unwrapped = unwrapped.array
 
         self.fit = None
@@ -58,40 +77,87 @@ class ParabolicFitter(threading.Thread):
         """
         start = time.time ( )
 
-        self.create_model_map_by_Polynomial2D()
+        self.create_model_map_by_least_squares()
         self.log.debug("parabolic_model.get_center() = %s" % str(
             self.get_center()))
         self.fit = tuna.io.Can(self.model)
-        
+
         self.log.info("Parabolic model fitted.")
-        self.log.debug("fit_parabolic_model_by_Polynomial2D() took %ds."
-                       % (time.time() - start))  
+        self.log.debug("create_model_map_by_least_squares() took %ds."
+                       % (time.time() - start))
+
+    def get_samples(self):
+        """Select the pixels used in the fit: the ones on the sampling grid that
+        are not noise, and whose value is finite.
 
-    def create_model_map_by_Polynomial2D(self):
-        """Generate a numpy array with the current parameters.
+        Returns:
+
+        * y : numpy.ndarray
+            The line indices of the selected pixels.
+
+        * x : numpy.ndarray
+            The column indices of the selected pixels.
+        """
+        valid = numpy.isfinite(self.unwrapped)
+        if self.noise is not None:
+            valid &= self.noise != 1
+        grid = numpy.zeros(shape = valid.shape, dtype = bool)
+        grid[:: self.sample_step, :: self.sample_step] = True
+        sampled = valid & grid
+        if not numpy.any(sampled):
+            self.log.warning("No pixel to fit on the sampling grid outside " \
+                             "the noise; using every finite pixel.")
+            sampled = numpy.isfinite(self.unwrapped)
+        return numpy.nonzero(sampled)
+
+    def create_model_map_by_least_squares(self):
+        """Fit the coefficients by solving the normal equations of the selected
+        pixels, and generate a numpy array with the fitted model.
         """
+        y, x = self.get_samples()
+        values = self.unwrapped[y, x].astype(numpy.float64)
+        self.log.debug("Fitting the parabola on {} pixels.".format(len(values)))
+
+        x_center = numpy.mean(x)
+        y_center = numpy.mean(y)
+        scale = max(self.unwrapped.shape) / 2
+        u = (x - x_center) / scale
+        v = (y - y_center) / scale
+        design = numpy.stack([numpy.ones(shape = u.shape), u, u**2, v, v**2,
+                              u * v], axis = 1)
+        normal = numpy.dot(design.T, design)
+        projection = numpy.dot(design.T, values)
+        # lstsq, instead of solve, still returns the minimal norm solution
+        #if the samples do not constrain every coefficient.
+        a = numpy.linalg.lstsq(normal, projection, rcond = None)[0]
+
+        # Substitute u = (x - x_center) / scale and v = (y - y_center) / scale.
+        a_1 = a[1] / scale
+        a_2 = a[2] / scale**2
+        a_3 = a[3] / scale
+        a_4 = a[4] / scale**2
+        a_5 = a[5] / scale**2
+        self.coefficients = {}
+        self.coefficients['x0y0'] = a[0] - a_1 * x_center - a_3 * y_center \
+                                    + a_2 * x_center**2 + a_4 * y_center**2 \
+                                    + a_5 * x_center * y_center
+        self.coefficients['x1y0'] = a_1 - 2 * a_2 * x_center - a_5 * y_center
+        self.coefficients['x2y0'] = a_2
+        self.coefficients['x0y1'] = a_3 - 2 * a_4 * y_center - a_5 * x_center
+        self.coefficients['x0y2'] = a_4
+        self.coefficients['x1y1'] = a_5
+
         i_max_rows = self.unwrapped.shape[0]
         i_max_cols = self.unwrapped.shape[1]
-        iia_y_dimension, iia_x_dimension = numpy.mgrid[:i_max_rows, :i_max_cols]
-
-        Polynomial2D_model = models.Polynomial2D(degree = 2)
-        LevMarLSQFitter_fit = LevMarLSQFitter()
-        with warnings.catch_warnings():
-            warnings.simplefilter('ignore')
-            polynomial_fit = LevMarLSQFitter_fit(
-                Polynomial2D_model, iia_x_dimension,
-                iia_y_dimension, self.unwrapped)
-        #print ( str ( polynomial_fit ) )
-        #print ( str ( polynomial_fit.parameters ) )
-        self.coefficients = {}
-        self.coefficients['x0y0'] = polynomial_fit.parameters[0]
-        self.coefficients['x1y0'] = polynomial_fit.parameters[1]
-        self.coefficients['x2y0'] = polynomial_fit.parameters[2]
-        self.coefficients['x0y1'] = polynomial_fit.parameters[3]
-        self.coefficients['x0y2'] = polynomial_fit.parameters[4]
-        self.coefficients['x1y1'] = polynomial_fit.parameters[5]
-        #print ( self.coefficients )
-        self.model = polynomial_fit(iia_x_dimension, iia_y_dimension)
+        y_indices = numpy.arange(i_max_rows, dtype = numpy.float64)[:, None]
+        x_indices = numpy.arange(i_max_cols, dtype = numpy.float64)[None, :]
+        model = self.coefficients['x0y0'] \
+                + (self.coefficients['x1y0'] \
+                   + self.coefficients['x2y0'] * x_indices) * x_indices \
+                + (self.coefficients['x0y1'] \
+                   + self.coefficients['x0y2'] * y_indices) * y_indices \
+                + self.coefficients['x1y1'] * x_indices * y_indices
+        self.model = model.astype(self.precision)
 
     def get_center(self):
         """Access the coordinates for the minimum value on each axis, which
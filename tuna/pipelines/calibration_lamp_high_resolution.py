@@ -122,6 +122,11 @@ class reducer ( threading.Thread ):
         Specifies whether to matplotlib plot the partial results (which will be
         always available as ndarrays).
 
+    * precision : string : None
+        Either "single" or "double", the precision in which the cubes and the
+        intermediary products are stored while this pipeline runs. If None, the
+        precision set by tuna.tools.set_precision ( ) is used.
+
     * ring_minimal_percentile : integer : None
         The value for the minimal percentile that contains some data on the
         dataset. If None, will be determined automatically.
@@ -157,6 +162,7 @@ class reducer ( threading.Thread ):
                    parameter_file : str = "",
                    pixel_size : float = 1,
                    plot_log = False,
+                   precision = None,
                    ring_minimal_percentile = None,
                    scanning_wavelength : float = 0,
                    tuna_can : tuna.io.can = None,
@@ -199,6 +205,7 @@ class reducer ( threading.Thread ):
         self.overscan_removal = overscan_removal
         self.pixel_size = pixel_size
         self.plot_log = plot_log
+        self.precision = precision
         self.ring_minimal_percentile = ring_minimal_percentile
         self.scanning_wavelength = scanning_wavelength
         self.tuna_can = tuna_can
@@ -229,19 +236,19 @@ class reducer ( threading.Thread ):
     def run(self):
         """:ref:`threading_label` method for starting execution.
         """
+        if self.precision != None:
+            tuna.tools.set_precision(self.precision, thread = True)
         self.overscanned = tuna.plugins.run("Overscan")(
             data = self.tuna_can,
             elements_to_remove = self.overscan_removal)
         
-        self.continuum = tuna.plugins.run("Continuum detector")(
-            self.overscanned,
-            self.continuum_to_FSR_ratio)
-
-        self.discontinuum = tuna.io.Can(array = numpy.ndarray(
-            shape = self.overscanned.shape))
-        for plane in range(self.overscanned.planes):
-            self.discontinuum.array[plane, :, :] = numpy.abs(
-                self.overscanned.array[plane, :, :] - self.continuum.array)
+        # The overscanned cube is still used after this step, so the
+        #discontinuum is written into a new array instead of in place.
+        continuum_discontinuum = tuna.plugins.run("Continuum and discontinuum")(
+            raw = self.overscanned,
+            continuum_to_FSR_ratio = self.continuum_to_FSR_ratio)
+        self.continuum = continuum_discontinuum["continuum"]
+        self.discontinuum = continuum_discontinuum["discontinuum"]
 
         self.wrapped_phase_map = tuna.plugins.run("Barycenter algorithm")(
             data_can = self.discontinuum )
@@ -324,7 +331,8 @@ class reducer ( threading.Thread ):
                 wavelength = self.calibration_wavelength,
                 mpyfit_parinfo = parinfo_initial)
 
-            airy_fit = numpy.ndarray(shape = self.overscanned.shape)
+            airy_fit = numpy.ndarray(shape = self.overscanned.shape,
+                                     dtype = tuna.tools.get_precision())
             airy_fit[0] = airy_fitter_0[1].array
 
             b_ratio = airy_fitter_0[0][0]
@@ -368,46 +376,17 @@ class reducer ( threading.Thread ):
             channel_gap = (airy_fitter_1[0][5] - airy_fitter_0[0][5]) / mid_plane
             self.log.info ("channel_gap = {} microns.".format(channel_gap))
 
-            latest_gap = airy_fitter_0[0][5] + channel_gap
-            for plane in range(1, self.overscanned.planes):
-                parinfo = []
-                parbase = {'fixed': True}
-                parinfo.append(parbase)
-                parbase = {'fixed': True}
-                parinfo.append(parbase)
-                parbase = {'fixed': True}
-                parinfo.append(parbase)
-                parbase = {'fixed': False}
-                parinfo.append(parbase)
-                parbase = {'fixed': True}
-                parinfo.append(parbase)
-                if channel_gap >= 0:
-                    parbase = {'fixed': False,
-                               'limits': (latest_gap,
-                                          latest_gap + 10*abs(channel_gap))}
-                else:
-                    parbase = {'fixed': False,
-                               'limits': (latest_gap - 10*abs(channel_gap),
-                                          latest_gap)}
-                parinfo.append(parbase)
-                parbase = {'fixed': False}
-                parinfo.append(parbase)
-
-                self.log.debug("Fitting Airy plane {}: gap at {:.5f}.".format (
-                    plane, latest_gap))
-                
-                airy_fitter = tuna.plugins.run("Airy fit")(
-                    b_ratio = b_ratio,
-                    center_col = center_col,
-                    center_row = center_row,
-                    data = self.overscanned.array[plane],
-                    finesse = finesse,
-                    gap = latest_gap + channel_gap,
-                    wavelength = self.calibration_wavelength,
-                    mpyfit_parinfo = parinfo)
-                latest_gap = airy_fitter[0][5]
-                airy_fit[plane] = airy_fitter[1].array
-                self.log.debug("Plane {} fitted.".format(plane)) 
+            airy_cube = tuna.plugins.run("Airy cube fit")(
+                b_ratio = b_ratio,
+                center_col = center_col,
+                center_row = center_row,
+                channel_gap = channel_gap,
+                data = self.overscanned.array,
+                finesse = finesse,
+                gap = airy_fitter_0[0][5],
+                wavelength = self.calibration_wavelength,
+                planes = list(range(1, self.overscanned.planes)))
+            airy_fit[1 :] = airy_cube[1].array[1 :]
 
             self.airy_fit = tuna.io.Can(airy_fit)
             
@@ -437,12 +416,10 @@ class reducer ( threading.Thread ):
             return
 
         if self.dont_fit == False:
-            # It seems Astropy's fitters ain't thread safe, so the airy fit must
-            #be already joined.
-            parabolic_fitter = tuna.models.parabolic_fitter(
-                self.noise,
-                self.unwrapped_phase_map,
-                center)
+            parabolic_fitter = tuna.plugins.run("Parabola fit")(
+                center = center,
+                noise = self.noise,
+                unwrapped = self.unwrapped_phase_map)
 
         wavelength_calibrator = tuna.tools.wavelength.wavelength_calibrator(
             self.unwrapped_phase_map,
@@ -478,29 +455,10 @@ class reducer ( threading.Thread ):
         """
         start = time.time()
 
-        max_x = self.wrapped_phase_map.array.shape[0]
-        max_y = self.wrapped_phase_map.array.shape[1]
-        max_channel = numpy.amax(self.wrapped_phase_map.array)
-        min_channel = numpy.amin(self.wrapped_phase_map.array)
-
-        unwrapped_phase_map = numpy.zeros(shape = self.wrapped_phase_map.shape)
-        self.log.debug("unwrapped_phase_map.ndim == %d" %
-                       unwrapped_phase_map.ndim)
-
-        self.log.debug("Phase map 0% unwrapped.")
-        last_percentage_logged = 0
-        for x in range(max_x):
-            percentage = 10 * int(x / max_x * 10)
-            if percentage > last_percentage_logged:
-                last_percentage_logged = percentage
-                self.log.debug("Phase map %d%% unwrapped." % percentage)
-            for y in range(max_y):
-                unwrapped_phase_map[x][y] = self.wrapped_phase_map.array[x][y] \
-                                            + max_channel \
-                                            * float(self.order_map.array[x][y])
-        self.log.info("Phase map unwrapped.")
-
-        self.unwrapped_phase_map = tuna.io.Can(array = unwrapped_phase_map)
+        self.unwrapped_phase_map = tuna.plugins.run("Phase unwrapper")(
+            wrapped = self.wrapped_phase_map,
+            order = self.order_map,
+            noise = self.noise)
 
         self.log.debug("create_unwrapped_phase_map() took %ds." %
                        (time.time() - start))
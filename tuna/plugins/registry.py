@@ -17,16 +17,19 @@ This is how to list the plugins currently registered in Tuna::
   >>> import tuna
   >>> tuna.plugins.registry()
   The following plugins are registered in Tuna:
+  * "Airy cube fit": tuna.models.airy.fit_airy_cube
   * "Airy fit": tuna.models.airy.fit_airy
   * "Apply wavelength calibration": tuna.tools.wavelength.wavelength_calibration.wavelength_calibrator
   * "B-ratio estimation": tuna.tools.estimate_b_ratio.estimate_b_ratio
   * "Barycenter algorithm": tuna.tools.barycenter.barycenter_geometry
-  * "Continuum detector": tuna.tools.continuum.continuum_detector
+  * "Continuum and discontinuum": tuna.tools.continuum.continuum_discontinuum
+  * "Continuum detector": tuna.tools.continuum.continuum_detector_partition
   * "FSR mapper": tuna.tools.fsr.fsr_mapper
   * "Find the ring borders": tuna.tools.phase_map.ring_borders.ring_border_detector
   * "Noise detector": tuna.tools.noise.detect_noise
   * "Overscan": tuna.tools.overscan.no_overscan
   * "Parabola fit": tuna.models.parabola.parabolic_fitter
+  * "Phase unwrapper": tuna.tools.phase_map.unwrapping.unwrap_phase_map
   * "Ring center finder": tuna.tools.spectral_rings_fitter.find_rings
 
 And how to list the parameters and return types for a given plugin::
@@ -85,16 +88,19 @@ A worked-out example follows::
   Plugin for "Noise detector" set to my_super_complicated_noise_function.
   >>> tuna.plugins.registry()
   The following plugins are registered in Tuna:
+  * "Airy cube fit": tuna.models.airy.fit_airy_cube
   * "Airy fit": tuna.models.airy.fit_airy
   * "Apply wavelength calibration": tuna.tools.wavelength.wavelength_calibration.wavelength_calibrator
   * "B-ratio estimation": tuna.tools.estimate_b_ratio.estimate_b_ratio
   * "Barycenter algorithm": tuna.tools.barycenter.barycenter_geometry
-  * "Continuum detector": tuna.tools.continuum.continuum_detector
+  * "Continuum and discontinuum": tuna.tools.continuum.continuum_discontinuum
+  * "Continuum detector": tuna.tools.continuum.continuum_detector_partition
   * "FSR mapper": tuna.tools.fsr.fsr_mapper
   * "Find the ring borders": tuna.tools.phase_map.ring_borders.ring_border_detector
   * "Noise detector" : my_super_complicated_noise_function
   * "Overscan": tuna.tools.overscan.no_overscan
   * "Parabola fit": tuna.models.parabola.parabolic_fitter
+  * "Phase unwrapper": tuna.tools.phase_map.unwrapping.unwrap_phase_map
   * "Ring center finder": tuna.tools.spectral_rings_fitter.find_rings
   >>> tuna.plugins.registry("Noise detector")
   def my_super_complicated_noise_function(data: tuna.io.can.can, noise_mask_radius: int, noise_threshold: float, wrapped: tuna.io.can.Can) -> tuna.io.can.Can
@@ -118,16 +124,19 @@ identical to the one to modify a plugin:
   Added my_super_complicated_noise_function to the plugin registry.
   >>> tuna.plugins.registry()
   The following plugins are registered in Tuna:
+  * "Airy cube fit": tuna.models.airy.fit_airy_cube
   * "Airy fit": tuna.models.airy.fit_airy
   * "Apply wavelength calibration": tuna.tools.wavelength.wavelength_calibration.wavelength_calibrator
   * "B-ratio estimation": tuna.tools.estimate_b_ratio.estimate_b_ratio
   * "Barycenter algorithm": tuna.tools.barycenter.barycenter_geometry
-  * "Continuum detector": tuna.tools.continuum.continuum_detector
+  * "Continuum and discontinuum": tuna.tools.continuum.continuum_discontinuum
+  * "Continuum detector": tuna.tools.continuum.continuum_detector_partition
   * "FSR mapper": tuna.tools.fsr.fsr_mapper
   * "Find the ring borders": tuna.tools.phase_map.ring_borders.ring_border_detector
   * "Noise detector": my_super_complicated_noise_function
   * "Overscan": tuna.tools.overscan.no_overscan
   * "Parabola fit": tuna.models.parabola.parabolic_fitter
+  * "Phase unwrapper": tuna.tools.phase_map.unwrapping.unwrap_phase_map
   * "Ring center finder": tuna.tools.spectral_rings_fitter.find_rings
   * "Something new": my_super_complicated_noise_function
 """
@@ -135,18 +144,21 @@ identical to the one to modify a plugin:
 import tuna
 
 __registry = {
+    "Airy cube fit": tuna.models.airy.fit_airy_cube,
     "Airy fit": tuna.models.airy.fit_airy,
     "Apply wavelength calibration": tuna.tools.wavelength \
     .wavelength_calibration.WavelengthCalibrator,
     "B-ratio estimation": tuna.tools.estimate_b_ratio,
     "Barycenter algorithm": tuna.tools.barycenter_geometry,
-    "Continuum detector": tuna.tools.continuum_detector,
+    "Continuum and discontinuum": tuna.tools.continuum_discontinuum,
+    "Continuum detector": tuna.tools.continuum_detector_partition,
     "Find the ring borders": tuna.tools.phase_map.ring_borders \
     .RingBorderDetector,
     "FSR mapper": tuna.tools.fsr.fsr_mapper,
     "Noise detector": tuna.tools.noise.detect_noise,
     "Overscan": tuna.tools.overscan.no_overscan,
     "Parabola fit": tuna.models.parabola.ParabolicFitter,
+    "Phase unwrapper": tuna.tools.phase_map.unwrap_phase_map,
     "Ring center finder": tuna.tools.spectral_rings_fitter,
 }
 
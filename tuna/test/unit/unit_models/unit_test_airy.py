@@ -0,0 +1,225 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+class unit_test_airy(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+        self.wavelength = 0.6563
+        self.shape = (96, 112)
+        self.parameters = (2e-3, 45.3, 58.7, 5.0, 8.0, 250.1234, 800.0)
+
+    def get_numerical_jacobian(self, function, parameters):
+        parameters = numpy.asarray(parameters, dtype = numpy.float64)
+        derivatives = []
+        for index in range(parameters.size):
+            step = numpy.zeros(shape = parameters.shape)
+            # The phase of the rings is large, so the steps must be small for the
+            #truncation error to be negligible.
+            step[index] = abs(parameters[index]) * 1e-7 + 1e-9
+            derivatives.append((function(parameters + step)
+                                - function(parameters - step))
+                               / (2 * step[index]))
+        return numpy.array(derivatives)
+
+    def assert_close(self, analytic, numerical):
+        scale = numpy.abs(numerical).max()
+        self.assertLess(numpy.abs(analytic - numerical).max(), 1e-4 * scale)
+
+    def test_model_matches_airy_plane(self):
+        cols, rows = tuna.models.airy.get_airy_grids(self.shape)
+        model = tuna.models.airy.AiryModel(cols, rows, self.wavelength)
+        plane = tuna.models.AiryPlane(*(self.parameters + self.shape
+                                        + (self.wavelength, )),
+                                      precision = numpy.float64)
+        self.assertTrue(numpy.allclose(model.evaluate(self.parameters), plane,
+                                       rtol = 1e-9, atol = 0))
+
+    def test_model_jacobian(self):
+        cols, rows = tuna.models.airy.get_airy_grids(self.shape)
+        model = tuna.models.airy.AiryModel(cols, rows, self.wavelength)
+        analytic = numpy.copy(model.jacobian(self.parameters))
+        numerical = self.get_numerical_jacobian(
+            lambda p: numpy.copy(model.evaluate(p)), self.parameters)
+        for index in range(7):
+            self.assert_close(analytic[index], numerical[index])
+
+    def test_cube_model_jacobian(self):
+        planes = 3
+        cols, rows = tuna.models.airy.get_airy_grids(self.shape)
+        model = tuna.models.airy.AiryCubeModel(cols, rows, planes,
+                                               self.wavelength)
+        b_ratio, center_col, center_row, continuum, finesse, gap, intensity = \
+            self.parameters
+        parameters = [b_ratio, center_col, center_row, finesse]
+        for plane in range(planes):
+            parameters += [continuum + plane, gap + 0.01 * plane,
+                           intensity - 10 * plane]
+        analytic = numpy.copy(model.jacobian(parameters))
+        numerical = self.get_numerical_jacobian(
+            lambda p: numpy.copy(model.evaluate(p)), parameters)
+        for plane in range(planes):
+            for row in range(7):
+                column = row if row < 4 else 4 + 3 * plane + row - 4
+                self.assert_close(analytic[plane, row],
+                                  numerical[column, plane])
+
+    def test_fit_recovers_parameters(self):
+        cols, rows = tuna.models.airy.get_airy_grids(self.shape)
+        model = tuna.models.airy.AiryModel(cols, rows, self.wavelength)
+        data = tuna.models.AiryPlane(*(self.parameters + self.shape
+                                       + (self.wavelength, )),
+                                     precision = numpy.float64)
+        data += numpy.random.RandomState(0).normal(0, 5, self.shape)
+        b_ratio, center_col, center_row, continuum, finesse, gap, intensity = \
+            self.parameters
+        guess = (b_ratio * 1.03, center_col + 1, center_row - 1, continuum,
+                 finesse * 1.03, gap + 0.02, intensity)
+        parinfo = [{'limits': (b_ratio * 0.9, b_ratio * 1.1)},
+                   {'limits': (center_col - 5, center_col + 5)},
+                   {'limits': (center_row - 5, center_row + 5)},
+                   {},
+                   {'limits': (finesse * 0.9, finesse * 1.1)},
+                   {'limits': (gap - self.wavelength / 4,
+                               gap + self.wavelength / 4)},
+                   {}]
+        fitted, result = tuna.models.airy.fit_airy_model(model, data, guess,
+                                                         parinfo)
+        tolerances = (1e-5, 0.05, 0.05, 0.5, 0.05, 1e-4, 5)
+        for value, expected, tolerance in zip(fitted, self.parameters,
+                                              tolerances):
+            self.assertLess(abs(value - expected), tolerance)
+
+    def test_pyramid_converges_to_full_resolution_fit(self):
+        data = tuna.models.AiryPlane(*(self.parameters + self.shape
+                                       + (self.wavelength, )),
+                                     precision = numpy.float64)
+        data += numpy.random.RandomState(0).normal(0, 5, self.shape)
+        b_ratio, center_col, center_row, continuum, finesse, gap, intensity = \
+            self.parameters
+        guess = (b_ratio * 1.03, center_col + 1, center_row - 1, data,
+                 finesse, gap + 0.02, self.wavelength)
+        full, full_fit = tuna.models.airy.fit_airy(*guess)
+        pyramid, pyramid_fit = tuna.models.airy.fit_airy(*guess,
+                                                         pyramid_depth = 3)
+        self.assertLess(abs(full[5] - gap), 1e-4)
+        tolerances = (1e-8, 1e-4, 1e-4, 1e-3, 1e-4, 1e-7, 1e-2)
+        for value, expected, tolerance in zip(pyramid, full, tolerances):
+            self.assertLess(abs(value - expected), tolerance)
+        self.assertTrue(numpy.allclose(pyramid_fit.array, full_fit.array,
+                                       rtol = 0, atol = 1e-2))
+        fitter = tuna.models.airy.AiryFitter(*guess, pyramid_depth = 3)
+        fitter.join()
+        self.assertEqual(sorted(fitter.level_timings.keys()), [1, 2, 4])
+
+    def test_cube_fit_with_misestimated_channel_gap(self):
+        shape = (64, 64)
+        channel_gap = 0.008
+        gaps = 250.1234 + numpy.arange(40) * channel_gap
+        cube = numpy.array([tuna.models.AiryPlane(8e-3, 30.3, 33.1, 5.0, 8.0,
+                                                  gap, 800.0, shape[0],
+                                                  shape[1], self.wavelength)
+                            for gap in gaps])
+        planes = list(range(1, len(gaps)))
+        for factor in (0.9, 1.1):
+            for block_size, workers in ((1, 2), (10, 2), (len(planes), 1)):
+                fitter = tuna.models.airy.AiryCubeFitter(
+                    8e-3, 30.3, 33.1, channel_gap * factor, cube, 8.0, gaps[0],
+                    self.wavelength, planes = planes, block_size = block_size,
+                    workers = workers)
+                fitter.join()
+                for plane in planes:
+                    self.assertLess(abs(fitter.parameters[plane][5]
+                                        - gaps[plane]), 1e-5)
+
+    def test_ring_samples(self):
+        rings = numpy.zeros(shape = self.shape)
+        rings[10 : 12, 20 : 60] = 1
+        other = numpy.zeros(shape = self.shape)
+        other[70, 30 : 40] = 1
+        noise = tuna.io.Can(array = numpy.zeros(shape = self.shape))
+        noise.array[11, 20 : 30] = 1
+        cols, rows = tuna.models.airy.get_ring_samples(
+            self.shape, {'ring_pixel_sets': [(rings, 0)]}, noise = noise,
+            margin = 1)
+        selected = numpy.zeros(shape = self.shape, dtype = bool)
+        selected[cols, rows] = True
+        self.assertEqual(len(cols), numpy.count_nonzero(selected))
+        self.assertTrue(selected[9 : 13, 19 : 61][noise.array[9 : 13, 19 : 61]
+                                                  != 1].all())
+        self.assertFalse(selected[noise.array == 1].any())
+        self.assertFalse(selected[70, 30 : 40].all())
+        background = numpy.count_nonzero(selected) - 4 * 42 + 10
+        self.assertLess(background, 0.05 * self.shape[0] * self.shape[1])
+        again = tuna.models.airy.get_ring_samples(
+            self.shape, {'ring_pixel_sets': [(rings, 0)]}, noise = noise,
+            margin = 1)
+        self.assertTrue(numpy.array_equal(cols, again[0]))
+        self.assertTrue(numpy.array_equal(rows, again[1]))
+        cols, rows = tuna.models.airy.get_ring_samples(
+            self.shape, [{'ring_pixel_sets': [(rings, 0)]},
+                         {'ring_pixel_sets': [(other, 0)]}], margin = 1)
+        selected[:] = False
+        selected[cols, rows] = True
+        self.assertTrue(selected[9 : 13, 19 : 61].all())
+        self.assertTrue(selected[69 : 72, 29 : 41].all())
+
+    def test_plane_and_union_of_samples(self):
+        first = (numpy.array([0, 1]), numpy.array([2, 3]))
+        second = (numpy.array([1, 4]), numpy.array([3, 5]))
+        get_plane_samples = tuna.models.airy.get_plane_samples
+        get_union_of_samples = tuna.models.airy.get_union_of_samples
+        self.assertIsNone(get_plane_samples(None, 3))
+        self.assertIs(get_plane_samples(first, 3), first)
+        self.assertIs(get_plane_samples({3: second}, 3), second)
+        self.assertIsNone(get_plane_samples({3: second}, 4))
+        self.assertIsNone(get_union_of_samples(None, [1, 2], (6, 6)))
+        self.assertIs(get_union_of_samples(first, [1, 2], (6, 6)), first)
+        cols, rows = get_union_of_samples({1: first, 2: second}, [1, 2],
+                                          (6, 6))
+        self.assertEqual(sorted(zip(cols.tolist(), rows.tolist())),
+                         [(0, 2), (1, 3), (4, 5)])
+        self.assertIsNone(get_union_of_samples({1: first}, [1, 2], (6, 6)))
+
+    def test_cube_fit_with_per_plane_samples(self):
+        # The rings move by several pixels between the first and the last
+        #planes, so a sample drawn from the first plane misses the rings of the
+        #last ones.
+        planes = 8
+        channel_gap = 0.04
+        gaps = 250.1234 + numpy.arange(planes) * channel_gap
+        clean = [tuna.models.AiryPlane(2e-3, 45.3, 58.7, 5.0, 15.0, gap, 800.0,
+                                       self.shape[0], self.shape[1],
+                                       self.wavelength,
+                                       precision = numpy.float64)
+                 for gap in gaps]
+        cube = numpy.array(clean) + numpy.random.RandomState(0).normal(
+            0, 5, (planes, ) + self.shape)
+        find_rings = [{'ring_pixel_sets': [(numpy.where(plane > 700, 1, 0), 0)]}
+                      for plane in clean]
+        per_plane = dict((plane, tuna.models.airy.get_ring_samples(
+            self.shape, find_rings[plane], margin = 1))
+                         for plane in range(planes))
+        union = tuna.models.airy.get_ring_samples(self.shape, find_rings,
+                                                  margin = 1)
+        errors = {}
+        for name, samples in (("first plane", per_plane[0]),
+                              ("per plane", per_plane),
+                              ("union", union)):
+            fitter = tuna.models.airy.AiryCubeFitter(
+                2e-3, 45.3, 58.7, channel_gap, cube, 15.0, gaps[0],
+                self.wavelength, planes = list(range(1, planes)),
+                workers = 1, samples = samples)
+            fitter.join()
+            errors[name] = max(abs(fitter.parameters[plane][5] - gaps[plane])
+                               for plane in range(1, planes))
+        self.assertLess(errors["per plane"], 1.5e-5)
+        self.assertLess(errors["union"], 1.5e-5)
+        self.assertGreater(errors["first plane"], 2 * errors["per plane"])
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+class unit_test_parabola(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+        self.shape = (240, 256)
+        self.x_center = 120.3
+        self.y_center = 131.7
+        self.expected = {'x2y0': 3.2e-4, 'x0y2': 3.1e-4, 'x1y1': 1e-6}
+        y, x = numpy.indices(self.shape, dtype = numpy.float64)
+        self.paraboloid = self.expected['x2y0'] * (x - self.x_center)**2 \
+                          + self.expected['x0y2'] * (y - self.y_center)**2 \
+                          + self.expected['x1y1'] * x * y + 12
+        self.expected['x0y0'] = self.paraboloid[0, 0]
+        self.expected['x1y0'] = - 2 * self.expected['x2y0'] * self.x_center
+        self.expected['x0y1'] = - 2 * self.expected['x0y2'] * self.y_center
+
+        random = numpy.random.RandomState(0)
+        noise = numpy.zeros(shape = self.shape)
+        noise[random.rand(*self.shape) < 0.2] = 1
+        noise[: 30, : 40] = 1
+        unwrapped = numpy.copy(self.paraboloid)
+        unwrapped[noise == 1] = random.rand(numpy.sum(noise == 1)) * 1e3
+        self.noise = tuna.io.Can(array = noise)
+        self.unwrapped = tuna.io.Can(array = unwrapped)
+
+    def fit(self, sample_step):
+        fitter = tuna.models.parabola.ParabolicFitter(
+            self.noise, self.unwrapped, (self.x_center, self.y_center),
+            sample_step = sample_step)
+        fitter.join()
+        return fitter
+
+    def assert_recovered(self, fitter):
+        for key, value in self.expected.items():
+            self.assertAlmostEqual(fitter.coefficients[key], value,
+                                   delta = 1e-9 * max(1, abs(value)))
+        self.assertTrue(numpy.allclose(fitter.model, self.paraboloid,
+                                       rtol = 0, atol = 1e-8))
+
+    def test_noise_is_ignored(self):
+        fitter = self.fit(sample_step = 1)
+        self.assert_recovered(fitter)
+        self.assertEqual(fitter.get_center(),
+                         (round(self.y_center), round(self.x_center)))
+
+    def test_sample_step(self):
+        full = self.fit(sample_step = 1)
+        sampled = self.fit(sample_step = 4)
+        self.assert_recovered(sampled)
+        self.assertEqual(sampled.get_center(), full.get_center())
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
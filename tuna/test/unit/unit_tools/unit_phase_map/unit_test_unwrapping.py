@@ -0,0 +1,28 @@
+import logging
+import numpy
+import os
+import tuna
+import unittest
+
+class unit_test_unwrapping(unittest.TestCase):
+    def setUp(self):
+        self.home = os.path.expanduser("~")
+        tuna.log.set_path(self.home + "/nose.log")
+
+    def test_quality_guided_fixes_wrong_orders(self):
+        x, y = numpy.indices((40, 30))
+        phase = ((x - 15.3)**2 + (y - 20.1)**2) / 20
+        order = numpy.floor(phase / 36)
+        wrapped = phase - 36 * order
+        expected = wrapped + numpy.amax(wrapped) * order
+        order[30 : 35, 5 : 10] += 1
+        unwrapped = tuna.tools.phase_map.unwrap_phase_map_quality_guided(
+            wrapped = tuna.io.Can(array = wrapped),
+            order = tuna.io.Can(array = order))
+        self.assertTrue(numpy.allclose(unwrapped.array, expected))
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,102 @@ class unit_test_barycenter_detector(unittest.TestCase):
         #self.assertEqual ( int ( barycenter_detector.result.array [ 0 ] [ 0 ] ), 3 )
         pass
 
+    def test_batched_matches_iterative(self):
+        channels = numpy.arange(40)
+        cube = numpy.zeros(shape = (40, 4, 5))
+        for col in range(cube.shape[1]):
+            for row in range(cube.shape[2]):
+                mean = 17 + 0.3 * col + 0.17 * row
+                stddev = 1.2 + 0.1 * row
+                cube[:, col, row] = 100 * numpy.exp(
+                    - (channels - mean)**2 / (2 * stddev**2))
+        # The neighbours of this narrow peak are negative, so its closed-form
+        #estimate fails, and it is fitted by the iterative fitter.
+        cube[:, 0, 0] = 10 * numpy.exp(- (channels - 12)**2 / 0.32) - 1
+        data = tuna.io.Can(array = cube)
+        iterative = tuna.tools.barycenter.BarycenterDetector(data)
+        iterative.join()
+        with self.assertLogs("tuna.tools.barycenter", level = "DEBUG") as logs:
+            batched = tuna.tools.barycenter.BarycenterDetector(data,
+                                                               batched = True)
+            batched.join()
+        self.assertIn("1 of 20 pixels need the iterative fitter.",
+                      "\n".join(logs.output))
+        self.assertAlmostEqual(batched.result.array[0, 0],
+                               iterative.result.array[0, 0], places = 9)
+        self.assertTrue(numpy.allclose(batched.result.array,
+                                       iterative.result.array,
+                                       rtol = 0, atol = 1e-3))
+
+    def test_vectorized_matches_fast(self):
+        channels = numpy.arange(12)
+        cube = numpy.zeros(shape = (12, 6, 5))
+        for col in range(cube.shape[1]):
+            for row in range(cube.shape[2]):
+                cube[:, col, row] = 10 * numpy.exp(
+                    -(channels - col - row / 2)**2 / 4) + (col * row) % 3
+        data = tuna.io.Can(array = cube)
+        fast = tuna.tools.barycenter.BarycenterFast(data)
+        fast.join()
+        vectorized = tuna.tools.barycenter.BarycenterVectorized(data)
+        vectorized.join()
+        self.assertTrue(numpy.array_equal(fast.result.array,
+                                          vectorized.result.array))
+
+    def test_vectorized_peaks_of_two_lines(self):
+        channels = numpy.arange(40)
+        cube = numpy.zeros(shape = (40, 6, 5))
+        expected = numpy.zeros(shape = (2, 6, 5))
+        for col in range(cube.shape[1]):
+            for row in range(cube.shape[2]):
+                # The stronger line wraps around the spectrum for col % 3 < 2.
+                expected[:, col, row] = (col % 3, 20 + row)
+                for center, amplitude in ((col % 3, 10), (20 + row, 6)):
+                    distance = (channels - center + 20) % 40 - 20
+                    cube[:, col, row] += amplitude * numpy.exp(
+                        - distance**2 / 4.5)
+        data = tuna.io.Can(array = cube)
+        single = tuna.tools.barycenter.BarycenterVectorized(data)
+        single.join()
+        vectorized = tuna.tools.barycenter.BarycenterVectorized(
+            data, block_cols = 4, max_peaks = 2)
+        vectorized.join()
+        self.assertTrue(numpy.array_equal(vectorized.result.array,
+                                          single.result.array))
+        self.assertTrue(numpy.all(vectorized.peaks.array == 2))
+        self.assertTrue(numpy.all(vectorized.regions.array == 2))
+        self.assertTrue(numpy.allclose(vectorized.peak_barycenters.array,
+                                       expected, rtol = 0, atol = 1e-9))
+
+    def test_tiled_matches_vectorized(self):
+        random = numpy.random.RandomState(0)
+        channels = numpy.arange(16)
+        centers = random.uniform(0, 16, size = (37, 29))
+        distances = (channels[:, None, None] - centers + 8) % 16 - 8
+        cube = 50 * numpy.exp(- distances**2 / 3) \
+               + random.uniform(0, 5, size = (16, 37, 29))
+        data = tuna.io.Can(array = cube)
+        vectorized = tuna.tools.barycenter.BarycenterVectorized(data)
+        vectorized.join()
+        for workers, tile_size in ((2, 16), (3, 16), (2, 10)):
+            tiled = tuna.tools.barycenter.BarycenterTiled(
+                data, workers = workers, tile_size = tile_size)
+            tiled.join()
+            self.assertTrue(numpy.array_equal(tiled.result.array,
+                                              vectorized.result.array))
+        # Without shared memory (Python < 3.8), the tiles are computed in
+        #this process.
+        shared_memory = tuna.tools.barycenter.shared_memory
+        tuna.tools.barycenter.shared_memory = None
+        try:
+            tiled = tuna.tools.barycenter.BarycenterTiled(data, workers = 2,
+                                                          tile_size = 10)
+            tiled.join()
+        finally:
+            tuna.tools.barycenter.shared_memory = shared_memory
+        self.assertTrue(numpy.array_equal(tiled.result.array,
+                                          vectorized.result.array))
+
     def tearDown(self):
         pass
 
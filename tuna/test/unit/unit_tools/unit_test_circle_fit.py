@@ -0,0 +1,63 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+from tuna.tools.spectral_rings_fitter import (circle,
+                                              fit_circle,
+                                              fit_circle_ransac,
+                                              radial_jacobian,
+                                              radial_residuals)
+
+class unit_test_circle_fit(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+
+    def test_ransac_arc_with_outliers(self):
+        angles = numpy.linspace(0, 1.2, 60)
+        cols = 30 + 50 * numpy.cos(angles)
+        rows = -10 + 50 * numpy.sin(angles)
+        random = numpy.random.RandomState(0)
+        outliers_cols = random.uniform(-30, 90, size = 40)
+        outliers_rows = random.uniform(-70, 50, size = 40)
+        center_col, center_row, radius = fit_circle_ransac(
+            numpy.concatenate([cols, outliers_cols]),
+            numpy.concatenate([rows, outliers_rows]))
+        self.assertAlmostEqual(center_col, 30, delta = 1e-6)
+        self.assertAlmostEqual(center_row, -10, delta = 1e-6)
+        self.assertAlmostEqual(radius, 50, delta = 1e-6)
+
+    def test_radial_jacobian(self):
+        random = numpy.random.RandomState(0)
+        cols = random.uniform(0, 100, size = 50)
+        rows = random.uniform(0, 100, size = 50)
+        p = numpy.array([43.2, 51.7, 30.5])
+        analytic = radial_jacobian(p, cols, rows)
+        numerical = numpy.zeros(shape = analytic.shape)
+        for index in range(3):
+            step = numpy.zeros(shape = 3)
+            step[index] = 1e-6
+            numerical[:, index] = (radial_residuals(p + step, cols, rows)
+                                   - radial_residuals(p - step, cols, rows)) \
+                                  / 2e-6
+        self.assertTrue(numpy.allclose(analytic, numerical, rtol = 0,
+                                       atol = 1e-7))
+        # A point at the center contributes only to the radius.
+        at_center = radial_jacobian(p, numpy.array([43.2]),
+                                    numpy.array([51.7]))
+        self.assertTrue(numpy.array_equal(at_center, [[0, 0, -1]]))
+
+    def test_fit_circle_recovers_pixelated_ring(self):
+        data = circle((60.3, 55.7), 40.2, 0.5, (128, 120))
+        parameters, fit = fit_circle(57.0, 58.5, 43.0, data, circle,
+                                     ridge_thickness = 0.5)
+        self.assertAlmostEqual(parameters[0], 60.3, delta = 0.05)
+        self.assertAlmostEqual(parameters[1], 55.7, delta = 0.05)
+        self.assertAlmostEqual(parameters[2], 40.2, delta = 0.05)
+        self.assertEqual(fit.shape, data.shape)
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
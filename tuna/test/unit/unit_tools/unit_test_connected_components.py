@@ -0,0 +1,28 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+class unit_test_connected_components(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+
+    def test_diagonal_pixels_are_connected(self):
+        array = numpy.array([[1, 0, 0, 1],
+                             [0, 1, 0, 1],
+                             [0, 0, 0, 0],
+                             [1, 1, 0, 1]])
+        labels, counts, bounding_boxes = \
+            tuna.tools.label_connected_components(array)
+        self.assertTrue(numpy.array_equal(labels, [[1, 0, 0, 2],
+                                                   [0, 1, 0, 2],
+                                                   [0, 0, 0, 0],
+                                                   [3, 3, 0, 4]]))
+        self.assertEqual(list(counts), [0, 2, 2, 2, 1])
+        self.assertEqual(list(bounding_boxes[3]), [3, 3, 0, 1])
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+class unit_test_continuum(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+
+    def test_partition_matches_detector(self):
+        cube = numpy.random.RandomState(0).randint(0, 100, size = (12, 6, 5))
+        data = tuna.io.Can(array = cube)
+        for ratio in [0.125, 0.25, 0.5]:
+            detector = tuna.tools.continuum.Detector(data, ratio)
+            detector.join()
+            partition = tuna.tools.continuum_detector_partition(data, ratio)
+            self.assertTrue(numpy.array_equal(detector.continuum.array,
+                                              partition.array))
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import logging
+import math
+import numpy
+import tuna
+import unittest
+
+def baseline_fsr_map(distances, wrapped, center, target_number):
+    """The threshold loop and per-pixel order map of fsr 0.0.0, kept as the
+    reference for the vectorized version.
+    """
+    distances_list = []
+    for element in numpy.unique(distances):
+        distances_list.append(element)
+    distances_list.remove(0)
+    filtered_distances = []
+    threshold = max(distances_list)
+    while (len(filtered_distances) < target_number):
+        filtered_distances = []
+        threshold -= 1
+        for entry in distances_list:
+            contained = False
+            for filtered in filtered_distances:
+                if filtered - threshold < float(entry) < filtered + threshold:
+                    contained = True
+            if not contained:
+                filtered_distances.append(float(entry))
+    sorted_distances = sorted(filtered_distances)
+
+    fsr = numpy.zeros(shape = distances.shape)
+    for col in range(distances.shape[0]):
+        for row in range(distances.shape[1]):
+            distance = math.sqrt((center[0] - col)**2 + (center[1] - row)**2)
+            for entry in range(len(sorted_distances)):
+                if entry == 0:
+                    low_limit = sorted_distances[entry] * 0.9
+                else:
+                    low_limit = sorted_distances[entry] \
+                                - (sorted_distances[entry] \
+                                   - sorted_distances[entry - 1]) / 4
+                if entry == len(sorted_distances) - 1:
+                    high_limit = sorted_distances[entry] * 1.1
+                else:
+                    high_limit = sorted_distances[entry] \
+                                 + (sorted_distances[entry + 1] \
+                                    - sorted_distances[entry]) / 4
+                if distance >= high_limit:
+                    fsr[col][row] = entry + 1
+                if low_limit < distance < high_limit:
+                    if wrapped[col][row] < numpy.amax(wrapped) / 2:
+                        fsr[col][row] = entry + 1
+                        break
+                    else:
+                        fsr[col][row] = entry
+                        break
+    return fsr
+
+class unit_test_fsr(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+
+    def test_order_map_matches_baseline(self):
+        random = numpy.random.RandomState(0)
+        cols, rows = numpy.indices((30, 40))
+        for case in range(12):
+            center = (random.uniform(5, 25), random.uniform(5, 35))
+            radii = numpy.sort(random.uniform(3, 30, size = random.randint(2,
+                                                                           5)))
+            distance_map = numpy.hypot(cols - center[0], rows - center[1])
+            distances = numpy.zeros(shape = distance_map.shape)
+            for radius in radii:
+                border = numpy.abs(distance_map - radius) < 0.5
+                distances[border] = numpy.round(distance_map[border], 1)
+            if numpy.count_nonzero(numpy.unique(distances)) < len(radii):
+                continue
+            wrapped = random.uniform(0, 10, size = distances.shape)
+            fsr = tuna.tools.fsr.fsr_mapper(
+                distances = tuna.io.Can(array = distances),
+                wrapped = tuna.io.Can(array = wrapped),
+                center = center,
+                concentric_rings = (center, list(radii)))
+            expected = baseline_fsr_map(distances, wrapped, center, len(radii))
+            self.assertTrue(numpy.array_equal(fsr.array, expected))
+
+    def test_fewer_distances_than_rings(self):
+        with self.assertLogs("tuna.tools.fsr", level = "WARNING"):
+            filtered = tuna.tools.fsr.filter_border_distances(
+                numpy.array([10., 20.]), 3)
+        self.assertEqual(filtered, [10., 20.])
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+class unit_test_geometry(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+
+    def test_farthest_pair_matches_all_pairs(self):
+        random = numpy.random.RandomState(0)
+        cols = random.randint(0, 40, size = 200)
+        rows = random.randint(0, 40, size = 200)
+        first, second = tuna.tools.find_farthest_pair(cols, rows)
+        squared_distances = (cols[:, None] - cols[None, :])**2 \
+                            + (rows[:, None] - rows[None, :])**2
+        self.assertEqual((cols[first] - cols[second])**2
+                         + (rows[first] - rows[second])**2,
+                         numpy.amax(squared_distances))
+
+    def test_convex_hull_of_square(self):
+        cols, rows = numpy.nonzero(numpy.ones(shape = (4, 4)))
+        vertices = tuna.tools.convex_hull(cols, rows)
+        self.assertEqual(set(zip(cols[vertices], rows[vertices])),
+                         set([(0, 0), (0, 3), (3, 0), (3, 3)]))
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
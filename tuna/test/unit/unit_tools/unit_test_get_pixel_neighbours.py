@@ -17,6 +17,19 @@ class unit_test_get_pixel_neighbours(unittest.TestCase):
                                                (1, 0), (1, 2),
                                                (2, 0), (2, 1), (2, 2)]))
 
+    def test_count_matches_neighbour_list(self):
+        array = numpy.zeros(shape = (6, 7))
+        array[numpy.random.RandomState(0).rand(6, 7) < 0.5] = 1
+        counts = tuna.tools.count_pixel_neighbours(array = array,
+                                                   distance_threshold = 2)
+        for col in range(array.shape[0]):
+            for row in range(array.shape[1]):
+                neighbours = tuna.tools.get_pixel_neighbours(
+                    position = (col, row), array = array,
+                    distance_threshold = 2)
+                self.assertEqual(counts[col][row], sum(
+                    [array[neighbour] == 1 for neighbour in neighbours]))
+
     def tearDown(self):
         pass
 
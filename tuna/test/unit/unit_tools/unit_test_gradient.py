@@ -0,0 +1,32 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+class unit_test_gradient(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+        self.cube = numpy.random.RandomState(0).rand(4, 5, 6)
+
+    def test_plane_gradient_matches_full_gradient(self):
+        gradients = numpy.gradient(self.cube)
+        for axis in range(3):
+            for plane in range(self.cube.shape[0]):
+                self.assertTrue(numpy.array_equal(
+                    tuna.tools.get_gradient(self.cube, axis = axis,
+                                            plane = plane),
+                    gradients[axis][plane]))
+
+    def test_gradient_is_cached(self):
+        first = tuna.tools.get_gradient(self.cube, axis = 0, plane = 1)
+        second = tuna.tools.get_gradient(self.cube, axis = 0, plane = 1)
+        self.assertIs(first, second)
+        tuna.tools.clear_gradient_cache()
+        third = tuna.tools.get_gradient(self.cube, axis = 0, plane = 1)
+        self.assertIsNot(first, third)
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
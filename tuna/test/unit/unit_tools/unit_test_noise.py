@@ -0,0 +1,29 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+class unit_test_noise(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+
+    def test_dilation_matches_noise_circles(self):
+        signalless = numpy.zeros(shape = (20, 15))
+        signalless[numpy.random.RandomState(0).rand(20, 15) < 0.05] = 1
+        for radius in [0, 1, 3, 8]:
+            noise = numpy.zeros(shape = signalless.shape)
+            for row in range(signalless.shape[0]):
+                for col in range(signalless.shape[1]):
+                    if signalless[row][col] == 1:
+                        tuna.tools.noise.include_noise_circle(
+                            position = (row, col), radius = radius,
+                            array = noise)
+            dilated = tuna.tools.noise.dilate_noise(signalless = signalless,
+                                                    radius = radius)
+            self.assertTrue(numpy.array_equal(noise, dilated))
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
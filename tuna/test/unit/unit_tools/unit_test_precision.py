@@ -0,0 +1,46 @@
+import logging
+import numpy
+import threading
+import tuna
+import unittest
+
+class unit_test_precision(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+        self.cube = numpy.random.RandomState(0).rand(8, 5, 6) * 100
+
+    def test_thread_precision_overrides_default(self):
+        with tuna.tools.working_precision("single"):
+            self.assertEqual(tuna.tools.get_precision(), numpy.float32)
+            precisions = []
+            thread = threading.Thread(
+                target = lambda: precisions.append(tuna.tools.get_precision()))
+            thread.start()
+            thread.join()
+            self.assertEqual(precisions, [numpy.float64])
+        self.assertEqual(tuna.tools.get_precision(), numpy.float64)
+
+    def test_invalid_precision(self):
+        with self.assertRaises(ValueError):
+            tuna.tools.set_precision("half")
+
+    def test_single_precision_products(self):
+        with tuna.tools.working_precision("single"):
+            result = tuna.tools.continuum_discontinuum(
+                raw = tuna.io.Can(array = self.cube))
+            barycenter = tuna.tools.barycenter_vectorized(
+                result["discontinuum"])
+        self.assertEqual(result["continuum"].array.dtype, numpy.float32)
+        self.assertEqual(result["discontinuum"].array.dtype, numpy.float32)
+        self.assertEqual(barycenter.array.dtype, numpy.float32)
+        double = tuna.tools.continuum_discontinuum(
+            raw = tuna.io.Can(array = self.cube))
+        self.assertTrue(numpy.allclose(result["discontinuum"].array,
+                                       double["discontinuum"].array,
+                                       rtol = 1e-6, atol = 1e-4))
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import logging
+import numpy
+import tuna
+import unittest
+
+from tuna.tools.spectral_rings_fitter import (circle,
+                                              find_founders,
+                                              PlaneSearch,
+                                              ring_statistics,
+                                              RingsFinder)
+
+def baseline_column_statistics(pixel_set):
+    """The column loop of remove_lumped_pixel_sets in spectral_rings_fitter
+    0.0.0, kept as the reference for ring_statistics.
+    """
+    num_good_cols = 0
+    num_cols = 0
+    latest_thickness = 0
+    average_thickness = 0
+    for col in range(pixel_set.shape[0]):
+        per_col_pixels = (numpy.sum(pixel_set[col]))
+        if per_col_pixels == 0:
+            continue
+        num_cols += 1
+        if latest_thickness == 0:
+            num_good_cols += 1
+            latest_thickness = per_col_pixels
+            continue
+        ratio = round(latest_thickness / per_col_pixels)
+        latest_thickness = per_col_pixels
+        average_thickness += latest_thickness
+        if ratio == 0.5 or ratio == 1 or ratio == 2:
+            num_good_cols +=1
+            continue
+    good_cols_ratio = num_good_cols / num_cols
+    average_thickness /= num_good_cols * 4
+    return good_cols_ratio, average_thickness
+
+class unit_test_spectral_rings_fitter(unittest.TestCase):
+    def setUp(self):
+        tuna.log.set_path("nose.log")
+        self.cube = numpy.array([tuna.models.AiryPlane(1.2e-3, 47.3, 52.1, 5, 6,
+                                                       250 + plane * 0.03, 500,
+                                                       100, 100, 0.6563)
+                                 for plane in range(8)])
+
+    def search(self, min_rings, workers):
+        search = PlaneSearch(self.cube, min_rings, list(range(8)), None, False,
+                             workers = workers)
+        search.execute()
+        return search
+
+    def test_plane_search_workers_agree(self):
+        serial = self.search(2, workers = 1)
+        parallel = self.search(2, workers = 2)
+        self.assertTrue(serial.accepted)
+        self.assertTrue(parallel.accepted)
+        self.assertEqual(serial.scores, parallel.scores)
+        self.assertEqual(serial.result['concentric_rings'],
+                         parallel.result['concentric_rings'])
+        finder = RingsFinder(self.cube, serial.ranked_planes()[0], None, False)
+        finder.execute()
+        self.assertEqual(serial.result['concentric_rings'],
+                         finder.result['concentric_rings'])
+
+    def test_plane_search_without_accepted_plane(self):
+        serial = self.search(5, workers = 1)
+        parallel = self.search(5, workers = 2)
+        self.assertFalse(serial.accepted)
+        self.assertFalse(parallel.accepted)
+        self.assertEqual(serial.result['concentric_rings'],
+                         parallel.result['concentric_rings'])
+        # The best result has the most rings of all planes.
+        most_rings = 0
+        for plane in range(8):
+            finder = RingsFinder(self.cube, plane, None, False)
+            finder.execute()
+            if 'concentric_rings' in finder.result:
+                most_rings = max(most_rings,
+                                 len(finder.result['concentric_rings'][1]))
+        self.assertEqual(len(serial.result['concentric_rings'][1]),
+                         most_rings)
+
+    def test_better_than(self):
+        search = PlaneSearch(self.cube, 2, [], None, False, workers = 1)
+        one_ring = {'concentric_rings': ((10, 10), [5], [0])}
+        far = {'concentric_rings': ((10, 10), [30, 20], [0, 1])}
+        near = {'concentric_rings': ((10, 10), [12, 9], [0, 1])}
+        self.assertTrue(search.better_than(far, one_ring))
+        self.assertFalse(search.better_than(one_ring, far))
+        self.assertTrue(search.better_than(near, far))
+        self.assertFalse(search.better_than(far, near))
+
+    def test_ring_statistics_match_column_loop(self):
+        random = numpy.random.RandomState(0)
+        for case in range(4):
+            labels = numpy.zeros(shape = (60, 70), dtype = numpy.int64)
+            labels[circle((random.uniform(20, 40), random.uniform(20, 50)),
+                          random.uniform(8, 25), random.uniform(0.5, 2),
+                          labels.shape) == 1] = 1
+            labels[random.randint(0, 50) : 55, 60 : 66] = 2
+            labels[random.rand(*labels.shape) < 0.02] = 3
+            labels[:, 68 :][random.rand(60, 2) < 0.5] = 4
+            statistics = ring_statistics(labels)
+            for label in range(1, 5):
+                good_cols_ratio, thickness = baseline_column_statistics(
+                    numpy.where(labels == label, 1.0, 0.0))
+                self.assertAlmostEqual(statistics['good_cols_ratio'][label],
+                                       good_cols_ratio, places = 12)
+                self.assertAlmostEqual(statistics['thickness'][label],
+                                       thickness, places = 12)
+
+    def test_find_founders(self):
+        # 0 matches 1, 1 matches 2, and 4 matches 2 and 3: 2 is a founder,
+        #since the only earlier item that it matches is 1, which is not; 4 is
+        #aggregated to 2, the first founder that it matches.
+        matches = numpy.eye(5, dtype = bool)
+        for first, second in ((0, 1), (1, 2), (2, 4), (3, 4)):
+            matches[first, second] = matches[second, first] = True
+        founders = find_founders(matches)
+        self.assertEqual(founders.tolist(), [True, False, True, True, False])
+        founder_indices = numpy.nonzero(founders)[0]
+        self.assertEqual(founder_indices[numpy.argmax(
+            matches[4, founder_indices])], 2)
+
+    def tearDown(self):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,19 +8,35 @@ import tuna.tools.phase_map
 import tuna.tools.wavelength
 
 from .barycenter import (barycenter_geometry,
-                         barycenter_polynomial_fit)
-from .continuum import (continuum_detector)
+                         barycenter_multiple_peaks,
+                         barycenter_polynomial_fit,
+                         barycenter_polynomial_fit_batched,
+                         barycenter_tiled,
+                         barycenter_vectorized)
+from .connected_components import label_connected_components
+from .continuum import (continuum_detector,
+                        continuum_discontinuum,
+                        continuum_detector_partition)
 from .estimate_b_ratio import estimate_b_ratio
 from .find_lowest_nonnull_percentile import find_lowest_nonnull_percentile
 from .fsr import (fsr_mapper)
-from .geometry import (calculate_distance)
+from .geometry import (calculate_distance,
+                       convex_hull,
+                       find_farthest_pair)
 from .get_connected_points import get_connected_points
 from .get_connected_region import get_connected_region
-from .get_pixel_neighbours import get_pixel_neighbours
+from .get_pixel_neighbours import (count_pixel_neighbours,
+                                   get_pixel_neighbours)
+from .gradient import (clear_gradient_cache,
+                       get_gradient,
+                       get_neighbour_difference)
 from .hash_functions import get_hash_from_array
 from .noise import NoiseDetector
 from .overscan import (no_overscan,
                        remove_elements)
+from .precision import (get_precision,
+                        set_precision,
+                        working_precision)
 try:
     from .plot import (plot,
                        plot_high_res,
@@ -12,8 +12,29 @@ Example:
     >>> barycenter.shape
     (512, 512)
 """
-__version__ = "0.1.1"
+__version__ = "0.6.3"
 changelog = {
+    "0.6.3": {"Tuna": "0.17.0", "Change": "get_center_of_mass checks for an " \
+              "empty peak by its length, since comparing an array with [] " \
+              "raises on recent numpy versions."},
+    "0.6.2": {"Tuna": "0.17.0", "Change": "BarycenterVectorized obtains the " \
+              "barycenter within the block loop of spectral_peaks, in a " \
+              "single pass over the cube."},
+    "0.6.1": {"Tuna": "0.17.0", "Change": "BarycenterTiled computes its " \
+              "tiles in the calling process when shared memory is not " \
+              "available (Python < 3.8)."},
+    "0.6.0": {"Tuna": "0.17.0", "Change": "The barycenter maps of " \
+              "BarycenterFast, BarycenterVectorized and BarycenterTiled are " \
+              "allocated in the precision set by tuna.tools.set_precision."},
+    "0.5.0": {"Tuna": "0.17.0", "Change": "Added spectral_peaks, which maps " \
+              "the number of spectral peaks and regions of each pixel, and " \
+              "the barycenter of each peak."},
+    "0.4.0": {"Tuna": "0.17.0", "Change": "Added BarycenterTiled, which " \
+              "computes the barycenter in tiles using a process pool."},
+    "0.3.0": {"Tuna": "0.17.0", "Change": "Added batched mode to " \
+              "BarycenterDetector."},
+    "0.2.0": {"Tuna": "0.17.0", "Change": "Added BarycenterVectorized, an " \
+              "array-at-a-time version of BarycenterFast."},
     "0.1.1": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.0": {"Tuna": "0.15.0", "Change": "Updated example to use plugins."}
 }
@@ -21,6 +42,12 @@ changelog = {
 from astropy.modeling import models, fitting
 import logging
 import math
+import multiprocessing
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8; BarycenterTiled then computes its tiles in this process.
+    shared_memory = None
 import numpy
 import threading
 import time
@@ -34,6 +61,11 @@ class BarycenterDetector(threading.Thread):
     Its algorithm utilizes a fitter to fit a parabola to each pixel, and find the
     barycenter from the fit parameters.
 
+    In batched mode, the Gaussian of every pixel is estimated at once, from a
+    parabola fitted to the logarithm of the three channels around the peak. Only
+    the pixels where this estimate fails a quality check are fitted with the
+    iterative fitter.
+
     It inherits from the :ref:`threading_label`.Thread class, and it auto-starts
     its thread execution. Clients are expected to use its .join ( ) method before
     using its results.
@@ -42,13 +74,18 @@ class BarycenterDetector(threading.Thread):
 
     * data : can
         Containing the interferograph data.    
+
+    * batched : bool : False
+        If True, use the batched closed-form estimate instead of fitting each
+        pixel.
     """
-    def __init__(self, data):
+    def __init__(self, data, batched = False):
         super(self.__class__, self).__init__()
         
         self.log = logging.getLogger(__name__)
         self.log.setLevel(logging.DEBUG)
 
+        self.batched = batched
         self.data = data
         self.__array = self.data.array
         self.__number_of_spectral_regions_array = None
@@ -66,7 +103,10 @@ class BarycenterDetector(threading.Thread):
         """
         start = time.time()
 
-        result = self.create_barycenter()
+        if self.batched:
+            result = self.create_barycenter_batched()
+        else:
+            result = self.create_barycenter()
         self.log.debug("result.shape = %s" % str(result.shape))
         self.result = tuna.io.Can(array = result)
         self.log.debug("self.result.array.shape = %s" % str(
@@ -146,6 +186,87 @@ class BarycenterDetector(threading.Thread):
             self.log.debug("barycenter.shape = %s" % str(barycenter.shape))
         return barycenter
 
+    def create_barycenter_batched(self):
+        """Find the barycenter for each pixel from a Gaussian estimated for all
+        pixels at once.
+
+        Each profile is rolled so that its largest signal is at the center
+        channel. The logarithm of the three channels around it is a parabola
+        for a Gaussian profile, so its vertex and curvature give the mean and the
+        standard deviation in closed form. Pixels where these three channels are
+        not all positive, the parabola is not concave, or the mean falls outside
+        of the three channels are fitted with the iterative fitter instead.
+
+        The center of mass is then computed in the same window as in
+        self.create_barycenter ( ), for all pixels at once.
+
+        Returns:
+
+        * barycenter : numpy.ndarray
+            Containing the generated barycenter map.
+        """
+        planes = self.__array.shape[0]
+        profiles = numpy.moveaxis(self.__array, 0, -1)
+        channels = numpy.arange(planes)
+
+        center_channel = round(planes / 2)
+        roll = center_channel - numpy.argmax(profiles, axis = -1)
+        shifted_profiles = numpy.take_along_axis(
+            profiles, (channels - roll[..., numpy.newaxis]) % planes, axis = -1)
+
+        mean = numpy.zeros(shape = roll.shape)
+        stddev = numpy.zeros(shape = roll.shape)
+        good = numpy.zeros(shape = roll.shape, dtype = bool)
+        if 0 < center_channel < planes - 1:
+            neighbourhood = shifted_profiles[
+                ..., center_channel - 1 : center_channel + 2].astype(
+                    numpy.float64)
+            positive = numpy.all(neighbourhood > 0, axis = -1)
+            with numpy.errstate(divide = "ignore", invalid = "ignore"):
+                logarithms = numpy.log(neighbourhood)
+                curvature = logarithms[..., 0] - 2 * logarithms[..., 1] \
+                            + logarithms[..., 2]
+                offset = (logarithms[..., 0] - logarithms[..., 2]) \
+                         / (2 * curvature)
+                mean = center_channel + offset
+                stddev = numpy.sqrt(-1 / curvature)
+            good = positive & (curvature < 0) & (numpy.abs(offset) <= 1) \
+                   & numpy.isfinite(stddev)
+
+        failed = numpy.argwhere(~good)
+        self.log.debug("%d of %d pixels need the iterative fitter." % (
+            failed.shape[0], good.size))
+        gaussian = models.Gaussian1D(
+            amplitude = 1.0, mean = planes / 2, stddev = 1)
+        fitter = fitting.LevMarLSQFitter()
+        for col, row in failed:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                fit = fitter(gaussian, channels, shifted_profiles[col, row])
+            mean[col, row] = fit.parameters[1]
+            stddev[col, row] = fit.parameters[2]
+
+        # From https://en.wikipedia.org/wiki/Gaussian_function:
+        FWHH = 2.35482 * numpy.abs(stddev)
+        left_shoulder = numpy.maximum(
+            0, numpy.floor(mean - FWHH * 4)).astype(int)
+        right_shoulder = numpy.minimum(
+            planes, numpy.ceil(mean + FWHH * 4)).astype(int)
+
+        window = (channels >= left_shoulder[..., numpy.newaxis]) & \
+                 (channels < right_shoulder[..., numpy.newaxis])
+        multipliers = numpy.where(
+            window, channels - left_shoulder[..., numpy.newaxis] + 1, 0)
+        total_mass = numpy.sum(window * shifted_profiles, axis = -1)
+        weighted_mass = numpy.sum(multipliers * shifted_profiles, axis = -1)
+        peak_center_of_mass = numpy.zeros(shape = total_mass.shape)
+        numpy.divide(weighted_mass, total_mass,
+                     out = peak_center_of_mass,
+                     where = total_mass != 0)
+
+        unrolled_center_of_mass = left_shoulder + peak_center_of_mass - roll
+        return unrolled_center_of_mass % planes
+
     def get_center_of_mass ( self, peak ):
         """
         This method's goal is to calculate the center-of-mass of an array,
@@ -165,7 +286,7 @@ class BarycenterDetector(threading.Thread):
         """
         total_mass = numpy.sum(peak)
         if (total_mass == 0 or
-            peak == []):
+            len(peak) == 0):
             return 0
         #mask = numpy.mgrid [ 1 : peak.shape [ 0 ] + 1 ]
         weighted_mass = self.mask[ : peak.shape[0]] * peak
@@ -189,18 +310,33 @@ class BarycenterFast(threading.Thread):
 
     * data : can
         Containing the interferograph data.    
+
+    * max_peaks : integer : 1
+        If larger than 1, the spectral peaks of each pixel are also detected,
+        and the barycenters of up to max_peaks peaks are stored in
+        self.peak_barycenters. See spectral_peaks ( ).
+
+    * peak_threshold : float : 0.5
+        The fraction of each spectrum's maximum above which channels are
+        considered part of a peak.
     """
-    def __init__(self, data):
+    def __init__(self, data, max_peaks = 1, peak_threshold = 0.5):
         self.log = logging.getLogger(__name__)
         self.log.setLevel(logging.INFO)
         super(self.__class__, self).__init__()
 
         self.data = data
+        self.max_peaks = max_peaks
+        self.peak_threshold = peak_threshold
+        self.precision = tuna.tools.get_precision()
         self.__array = self.data.array
         self.__number_of_spectral_regions_array = None
         self.__photon_counts_array = None
         self.__number_spectral_peaks_array = None
 
+        self.peak_barycenters = None
+        self.peaks = None
+        self.regions = None
         self.result = None
         self.start()
 
@@ -215,10 +351,34 @@ class BarycenterFast(threading.Thread):
         self.result = tuna.io.Can(array = result)
         self.log.debug("self.result.array.shape = %s" % str(
             self.result.array.shape))
+        if self.max_peaks > 1:
+            self.detect_spectral_peaks()
 
         self.log.debug("Barycenter detection took %ds." % (
             time.time() - start))
 
+    def detect_spectral_peaks(self):
+        """Fill the maps of the number of spectral peaks and regions of each
+        pixel, and the barycenters of its up to self.max_peaks brightest
+        regions, using spectral_peaks ( ).
+
+        The results are stored, as cans, in self.peaks, self.regions and
+        self.peak_barycenters.
+        """
+        if self.__array.ndim != 3:
+            return
+
+        peaks, regions, barycenters = spectral_peaks(
+            self.__array, max_peaks = self.max_peaks,
+            peak_threshold = self.peak_threshold)
+        self.__number_spectral_peaks_array = peaks
+        self.__number_of_spectral_regions_array = regions
+
+        self.peaks = tuna.io.Can(array = peaks)
+        self.regions = tuna.io.Can(array = regions)
+        self.peak_barycenters = tuna.io.Can(array = barycenters)
+        self.log.info("Spectral peaks done.")
+
     def create_barycenter_using_peak(self):
         """Generate the barycenter map using the peak method. 
         Will find the center of mass of each spectrum, using the shoulder-to-
@@ -256,7 +416,8 @@ class BarycenterFast(threading.Thread):
             return
             
         barycenter_array = numpy.ndarray(shape = (self.__array.shape[1],
-                                                  self.__array.shape[2]))
+                                                  self.__array.shape[2]),
+                                         dtype = self.precision)
 
         # Linear algebra to produce the barycenter:
         # All calculations are made using arrays that are created with index 0
@@ -503,6 +664,494 @@ class BarycenterFast(threading.Thread):
         self.log.debug("il_shoulder_indices = %s" % str(
             fwhh_dict['il_shoulder_indices']))
 
+class BarycenterVectorized(threading.Thread):
+    """This class' responsibility is to generate and store barycenter maps from
+    spectral cubes, using the same geometric algorithm as BarycenterFast.
+
+    Instead of walking each spectrum channel by channel, the FWHH and shoulder
+    channels of every spectrum are found with array operations over whole blocks
+    of the cube, so that the Python interpreter only loops over blocks of
+    columns. The results are the same as the ones from BarycenterFast.
+
+    It inherits from the :ref:`threading_label`.Thread class, and it auto-starts
+    its thread execution. Clients are expected to use its .join ( ) method before
+    using its results.
+
+    Its constructor expects the following parameters:
+
+    * data : can
+        Containing the interferograph data.
+
+    * block_cols : integer : 32
+        The number of columns of the cube processed at once. Larger values
+        use more memory, in exchange for less Python overhead.
+
+    * max_peaks : integer : 1
+        If larger than 1, the spectral peaks of each pixel are also detected,
+        as in BarycenterFast, in the same pass over the cube (see
+        spectral_peaks ( )).
+
+    * peak_threshold : float : 0.5
+        The fraction of each spectrum's maximum above which channels are
+        considered part of a peak.
+    """
+    def __init__(self, data, block_cols = 32, max_peaks = 1,
+                 peak_threshold = 0.5):
+        self.log = logging.getLogger(__name__)
+        self.log.setLevel(logging.INFO)
+        super(self.__class__, self).__init__()
+
+        self.data = data
+        self.block_cols = block_cols
+        self.max_peaks = max_peaks
+        self.peak_threshold = peak_threshold
+        self.precision = tuna.tools.get_precision()
+
+        self.peak_barycenters = None
+        self.peaks = None
+        self.regions = None
+        self.result = None
+        self.start()
+
+    def run(self):
+        """Execute the main algorithm, when called by this object's
+        threading.Thread.start ( ) method.
+        """
+        start = time.time()
+
+        if self.max_peaks > 1 and self.data.array.ndim == 3:
+            # A single pass over the cube obtains the barycenter and the peaks.
+            array = self.data.array
+            result = numpy.ndarray(shape = (array.shape[1], array.shape[2]),
+                                   dtype = self.precision)
+            peaks, regions, barycenters = spectral_peaks(
+                array, max_peaks = self.max_peaks,
+                peak_threshold = self.peak_threshold,
+                block_cols = self.block_cols, barycenter = result)
+            self.log.info("Barycenter done.")
+            self.peaks = tuna.io.Can(array = peaks)
+            self.regions = tuna.io.Can(array = regions)
+            self.peak_barycenters = tuna.io.Can(array = barycenters)
+        else:
+            result = self.create_barycenter_using_peak()
+        self.result = tuna.io.Can(array = result)
+
+        self.log.debug("Barycenter detection took %ds." % (
+            time.time() - start))
+
+    def create_barycenter_using_peak(self):
+        """Generate the barycenter map using the peak method, as described in
+        BarycenterFast.create_barycenter_using_peak ( ), processing the cube in
+        blocks of self.block_cols columns.
+
+        Returns:
+
+        * barycenter_array : numpy.ndarray
+            Containing the barycenter map for each pixel in the input data.
+        """
+        array = self.data.array
+        if array.ndim != 3:
+            return
+
+        barycenter_array = numpy.ndarray(shape = (array.shape[1],
+                                                  array.shape[2]),
+                                         dtype = self.precision)
+        for first_col in range(0, array.shape[1], self.block_cols):
+            last_col = min(first_col + self.block_cols, array.shape[1])
+            barycenter_array[first_col : last_col] = peak_barycenter(
+                array[:, first_col : last_col, :])
+        self.log.info("Barycenter done.")
+
+        return barycenter_array
+
+class BarycenterTiled(threading.Thread):
+    """This class' responsibility is to generate and store barycenter maps from
+    spectral cubes, splitting the work among several processes.
+
+    The (columns, rows) plane is split into square tiles, and each tile is
+    processed by peak_barycenter ( ) in a multiprocessing pool. The cube and the
+    resulting map are placed in shared memory, so the workers read their tiles
+    and write their results in place, without pickling the arrays. The result
+    is the same as the one from BarycenterVectorized. Shared memory requires
+    Python 3.8; in older versions, the tiles are computed in the calling
+    process.
+
+    It inherits from the :ref:`threading_label`.Thread class, and it auto-starts
+    its thread execution. Clients are expected to use its .join ( ) method before
+    using its results.
+
+    Its constructor expects the following parameters:
+
+    * data : can
+        Containing the interferograph data.
+
+    * workers : integer : None
+        The number of worker processes. If None, one per CPU is used.
+
+    * tile_size : integer : 128
+        The number of columns and rows of each tile.
+    """
+    def __init__(self, data, workers = None, tile_size = 128):
+        self.log = logging.getLogger(__name__)
+        self.log.setLevel(logging.INFO)
+        super(self.__class__, self).__init__()
+
+        self.data = data
+        self.precision = tuna.tools.get_precision()
+        self.tile_size = tile_size
+        self.workers = workers
+        if self.workers == None:
+            self.workers = multiprocessing.cpu_count()
+
+        self.result = None
+        self.start()
+
+    def run(self):
+        """Execute the main algorithm, when called by this object's
+        threading.Thread.start ( ) method.
+        """
+        start = time.time()
+
+        result = self.create_barycenter_in_tiles()
+        self.result = tuna.io.Can(array = result)
+
+        self.log.debug("Barycenter detection with %d workers took %.1fs." % (
+            self.workers, time.time() - start))
+
+    def create_barycenter_in_tiles(self):
+        """Copy the cube into shared memory, and map the tiles of the plane to
+        the process pool.
+
+        Returns:
+
+        * barycenter_array : numpy.ndarray
+            Containing the barycenter map for each pixel in the input data.
+        """
+        array = self.data.array
+        if array.ndim != 3:
+            return
+
+        shape = (array.shape[1], array.shape[2])
+        tiles = []
+        for first_col in range(0, shape[0], self.tile_size):
+            for first_row in range(0, shape[1], self.tile_size):
+                tiles.append((first_col,
+                              min(first_col + self.tile_size, shape[0]),
+                              first_row,
+                              min(first_row + self.tile_size, shape[1])))
+
+        if shared_memory is None:
+            self.log.warning("Shared memory is not available; computing the " \
+                             "tiles in this process.")
+            barycenter_array = numpy.zeros(shape = shape,
+                                           dtype = self.precision)
+            for first_col, last_col, first_row, last_row in tiles:
+                barycenter_array[first_col : last_col,
+                                 first_row : last_row] = peak_barycenter(
+                    array[:, first_col : last_col, first_row : last_row])
+            self.log.info("Barycenter done.")
+            return barycenter_array
+
+        cube_memory = shared_memory.SharedMemory(create = True,
+                                                 size = array.nbytes)
+        result_memory = shared_memory.SharedMemory(
+            create = True, size = shape[0] * shape[1] * self.precision.itemsize)
+        try:
+            cube = numpy.ndarray(shape = array.shape, dtype = array.dtype,
+                                 buffer = cube_memory.buf)
+            cube[:] = array
+            del(cube)
+            with multiprocessing.Pool(
+                    processes = self.workers,
+                    initializer = attach_shared_tile_arrays,
+                    initargs = (cube_memory.name, array.shape, array.dtype.str,
+                                result_memory.name, shape,
+                                self.precision.str)) as pool:
+                pool.map(barycenter_tile, tiles)
+            barycenter_array = numpy.copy(numpy.ndarray(
+                shape = shape, dtype = self.precision,
+                buffer = result_memory.buf))
+        finally:
+            cube_memory.close()
+            cube_memory.unlink()
+            result_memory.close()
+            result_memory.unlink()
+        self.log.info("Barycenter done.")
+
+        return barycenter_array
+
+# Shared memory blocks and arrays attached by each BarycenterTiled worker.
+tile_arrays = {}
+
+def attach_shared_tile_arrays(cube_name, cube_shape, cube_dtype,
+                              result_name, result_shape, result_dtype):
+    """Attach the current worker process to the shared memory blocks created by
+    BarycenterTiled, and store views of them in tile_arrays.
+
+    Parameters:
+
+    * cube_name : string
+        The name of the shared memory block containing the cube.
+
+    * cube_shape : tuple of 3 integers
+
+    * cube_dtype : string
+        The numpy dtype string of the cube.
+
+    * result_name : string
+        The name of the shared memory block where the barycenter is written.
+
+    * result_shape : tuple of 2 integers
+
+    * result_dtype : string
+        The numpy dtype string of the barycenter.
+    """
+    tile_arrays['cube_memory'] = shared_memory.SharedMemory(name = cube_name)
+    tile_arrays['result_memory'] = shared_memory.SharedMemory(
+        name = result_name)
+    tile_arrays['cube'] = numpy.ndarray(
+        shape = cube_shape, dtype = numpy.dtype(cube_dtype),
+        buffer = tile_arrays['cube_memory'].buf)
+    tile_arrays['result'] = numpy.ndarray(
+        shape = result_shape, dtype = numpy.dtype(result_dtype),
+        buffer = tile_arrays['result_memory'].buf)
+
+def barycenter_tile(tile):
+    """Compute the barycenter of one tile of the shared cube, and write it onto
+    the shared result.
+
+    Parameters:
+
+    * tile : tuple of 4 integers
+        The first and last (exclusive) columns, and the first and last
+        (exclusive) rows of the tile.
+    """
+    first_col, last_col, first_row, last_row = tile
+    tile_arrays['result'][first_col : last_col, first_row : last_row] = \
+        peak_barycenter(tile_arrays['cube'][:, first_col : last_col,
+                                            first_row : last_row])
+
+def first_true(condition, default):
+    """Find the index of the first True value along the last axis of the input,
+    ignoring the first element of that axis.
+
+    Parameters:
+
+    * condition : numpy.ndarray
+        Array of booleans. Its first element along the last axis is overwritten.
+
+    * default : integer
+        The value returned where no element is True.
+
+    Returns:
+
+    * unnamed variable : numpy.ndarray
+        Containing the indices, with one dimension less than the input.
+    """
+    condition[..., 0] = False
+    return numpy.where(numpy.any(condition, axis = -1),
+                       numpy.argmax(condition, axis = -1),
+                       default)
+
+def peak_barycenter(array):
+    """Compute the barycenter of the shoulder-to-shoulder peak of every spectrum
+    in the input cube, with array operations.
+
+    For each spectrum, the channel with the maximal value is found with argmax,
+    and the spectrum is read "rolled" to the left and to the right of it. The
+    first channels below half height on each side give the FWHH limits; then the
+    first rising channel on each side (never crossing the other limit) gives the
+    shoulders, just like the channel walks in BarycenterFast.get_fwhh ( ). The
+    channels between the shoulders are weighted by 1, 2, 3, ... and the center
+    of mass is mapped back onto the spectrum.
+
+    Parameters:
+
+    * array : numpy.ndarray
+        A cube indexed as [planes, columns, rows].
+
+    Returns:
+
+    * barycenter : numpy.ndarray
+        Containing the barycenter for each (column, row) of the input.
+    """
+    planes = array.shape[0]
+    # Channels are put on the last (contiguous) axis, so that each sum below
+    #adds the spectrum in the same order as numpy.sum does on a single profile.
+    profiles = numpy.ascontiguousarray(numpy.moveaxis(array, 0, -1))
+    steps = numpy.arange(planes)
+
+    max_index = numpy.argmax(profiles, axis = -1)[..., numpy.newaxis]
+    half_height = numpy.take_along_axis(profiles, max_index, axis = -1) / 2
+
+    leftwards = numpy.take_along_axis(profiles, (max_index - steps) % planes,
+                                      axis = -1)
+    left_steps = first_true(leftwards < half_height, planes)
+    leftmost_hh = (max_index[..., 0] - left_steps + 1) % planes
+
+    rightwards = numpy.take_along_axis(profiles, (max_index + steps) % planes,
+                                       axis = -1)
+    right_steps = first_true(rightwards < half_height, planes)
+    rightmost_hh = (max_index[..., 0] + right_steps - 1) % planes
+
+    # The left shoulder walk stops before a rising channel, or before reaching
+    #the rightmost FWHH channel.
+    leftwards = numpy.take_along_axis(
+        profiles, (leftmost_hh[..., numpy.newaxis] - steps) % planes, axis = -1)
+    rising = numpy.zeros(shape = leftwards.shape, dtype = bool)
+    rising[..., 1 :] = ~(leftwards[..., 1 :] - leftwards[..., : -1] <= 0)
+    limit = (leftmost_hh - rightmost_hh) % planes
+    limit = numpy.where(limit == 0, planes, limit)
+    left_shoulder_steps = numpy.minimum(first_true(rising, planes) - 1,
+                                        limit - 1)
+    left_shoulder = (leftmost_hh - left_shoulder_steps) % planes
+
+    # The right shoulder walk stops before a rising channel, or before reaching
+    #the left shoulder.
+    rightwards = numpy.take_along_axis(
+        profiles, (rightmost_hh[..., numpy.newaxis] + steps) % planes, axis = -1)
+    rising = numpy.zeros(shape = rightwards.shape, dtype = bool)
+    rising[..., 1 :] = ~(rightwards[..., 1 :] - rightwards[..., : -1] <= 0)
+    limit = (left_shoulder - rightmost_hh) % planes
+    limit = numpy.where(limit == 0, planes, limit)
+    right_shoulder_steps = numpy.minimum(first_true(rising, planes) - 1,
+                                         limit - 1)
+    right_shoulder = (rightmost_hh + right_shoulder_steps) % planes
+
+    offsets = (steps - left_shoulder[..., numpy.newaxis]) % planes
+    peak_length = (right_shoulder - left_shoulder) % planes + 1
+    shoulder_mask = offsets < peak_length[..., numpy.newaxis]
+    multipliers = numpy.where(shoulder_mask, offsets + 1, 0).astype(
+        numpy.float64)
+
+    weighted_sum = numpy.sum(multipliers * profiles, axis = -1)
+    shoulder_photon_count_sum = numpy.sum(
+        shoulder_mask.astype(numpy.float64) * profiles, axis = -1)
+    center_of_mass = numpy.zeros(shape = weighted_sum.shape)
+    numpy.divide(weighted_sum, shoulder_photon_count_sum,
+                 out = center_of_mass,
+                 where = shoulder_photon_count_sum != 0)
+
+    shifted_center_of_mass = left_shoulder - 1 + center_of_mass
+    return shifted_center_of_mass % planes
+
+def spectral_peaks(array, max_peaks = 2, peak_threshold = 0.5,
+                   block_cols = 32, barycenter = None):
+    """Detect the spectral peaks of every spectrum in the input cube, with array
+    operations, and compute the barycenter of each of them.
+
+    A spectral region is a run of consecutive channels (wrapping around the
+    spectrum, since it covers one FSR) with values at or above peak_threshold
+    times the maximum of that spectrum. A spectral peak is a local maximum at or
+    above the same threshold; two lines blended into a single region are
+    counted as two peaks, but only have one barycenter.
+
+    Each spectrum is rotated so that it starts at a channel below the
+    threshold, so that no region wraps around; the regions are then labeled with
+    a cumulative sum of their starting channels, and the photon count and the
+    channel-weighted sum of every region are accumulated with a single
+    numpy.bincount.
+
+    Parameters:
+
+    * array : numpy.ndarray
+        A cube indexed as [planes, columns, rows].
+
+    * max_peaks : integer : 2
+        The number of barycenter planes returned.
+
+    * peak_threshold : float : 0.5
+        The fraction of each spectrum's maximum above which channels are
+        considered part of a peak.
+
+    * block_cols : integer : 32
+        The number of columns of the cube processed at once.
+
+    * barycenter : numpy.ndarray : None
+        If not None, an array indexed as [columns, rows] where the barycenter of
+        each spectrum, as obtained by peak_barycenter ( ), is written, while
+        each block of the cube is at hand; this spares a second pass over the
+        cube.
+
+    Returns:
+
+    * number_of_peaks : numpy.ndarray
+        Containing the number of local maxima above the threshold, for each
+        (column, row) of the input.
+
+    * number_of_regions : numpy.ndarray
+        Containing the number of spectral regions, for each (column, row) of
+        the input.
+
+    * barycenters : numpy.ndarray
+        Indexed as [peak, columns, rows], containing the barycenter of the
+        regions of each spectrum, sorted by decreasing photon count. Pixels
+        with less than max_peaks regions have numpy.nan in the missing planes.
+    """
+    planes = array.shape[0]
+    steps = numpy.arange(planes)
+
+    number_of_peaks = numpy.zeros(shape = array.shape[1:], dtype = numpy.int64)
+    number_of_regions = numpy.zeros(shape = array.shape[1:],
+                                    dtype = numpy.int64)
+    barycenters = numpy.full((max_peaks,) + array.shape[1:], numpy.nan)
+
+    for first_col in range(0, array.shape[1], block_cols):
+        last_col = min(first_col + block_cols, array.shape[1])
+        block = array[:, first_col : last_col, :]
+        if barycenter is not None:
+            barycenter[first_col : last_col] = peak_barycenter(block)
+        profiles = numpy.moveaxis(block, 0, -1)
+        profiles = profiles.reshape(-1, planes).astype(numpy.float64)
+        pixels = profiles.shape[0]
+
+        threshold = peak_threshold * numpy.max(profiles, axis = -1,
+                                               keepdims = True)
+        above = profiles >= threshold
+        maxima = ((profiles > numpy.roll(profiles, 1, axis = -1)) &
+                  (profiles >= numpy.roll(profiles, -1, axis = -1)) &
+                  above)
+
+        # Spectra where every channel is above the threshold start at channel 0,
+        #and have a single region.
+        first_below = numpy.argmin(above, axis = -1)[:, numpy.newaxis]
+        rotation = (first_below + steps) % planes
+        rotated = numpy.take_along_axis(profiles, rotation, axis = -1)
+        above = numpy.take_along_axis(above, rotation, axis = -1)
+        starts = numpy.copy(above)
+        starts[:, 1 :] &= ~above[:, : -1]
+        labels = numpy.cumsum(starts, axis = -1) * above
+        regions = numpy.sum(starts, axis = -1)
+
+        # Label 0 collects the channels below the threshold.
+        labels_per_pixel = max(int(numpy.max(regions)), max_peaks) + 1
+        index = (numpy.arange(pixels)[:, numpy.newaxis] * labels_per_pixel
+                 + labels).ravel()
+        length = pixels * labels_per_pixel
+        mass = numpy.bincount(index, weights = rotated.ravel(),
+                              minlength = length)
+        mass = mass.reshape(pixels, labels_per_pixel)[:, 1 :]
+        weighted = numpy.bincount(index, weights = (rotated * steps).ravel(),
+                                  minlength = length)
+        weighted = weighted.reshape(pixels, labels_per_pixel)[:, 1 :]
+
+        order = numpy.argsort(-mass, axis = -1, kind = "stable")[:, : max_peaks]
+        mass = numpy.take_along_axis(mass, order, axis = -1)
+        weighted = numpy.take_along_axis(weighted, order, axis = -1)
+        center_of_mass = numpy.full(mass.shape, numpy.nan)
+        numpy.divide(weighted, mass, out = center_of_mass,
+                     where = (mass != 0) & (order < regions[:, numpy.newaxis]))
+        center_of_mass = (first_below + center_of_mass) % planes
+
+        block_shape = (last_col - first_col, array.shape[2])
+        number_of_peaks[first_col : last_col] = numpy.sum(
+            maxima, axis = -1).reshape(block_shape)
+        number_of_regions[first_col : last_col] = regions.reshape(block_shape)
+        barycenters[:, first_col : last_col] = numpy.moveaxis(
+            center_of_mass, -1, 0).reshape((max_peaks,) + block_shape)
+
+    return number_of_peaks, number_of_regions, barycenters
+
 def barycenter_geometry(data_can: tuna.io.can.Can) -> tuna.io.can.Can:
     """Conveniently return an array of the barycenter position for each pixel of
     the input.
@@ -542,3 +1191,143 @@ def barycenter_polynomial_fit(data_can: tuna.io.can.Can) -> tuna.io.can.Can:
     detector = BarycenterDetector(data = data_can)
     detector.join()
     return detector.result
+
+def barycenter_polynomial_fit_batched(
+        data_can: tuna.io.can.Can) -> tuna.io.can.Can:
+    """Conveniently return an array of the barycenter position for each pixel of
+    the input, using the batched mode of the Gaussian fit. It can be registered
+    as the "Barycenter algorithm" plugin.
+
+    Arguments:
+
+    * data_can : tuna.io.Can
+        Should contain a 3D cube of raw Fabry-Pérot data.
+
+    Returns:
+
+    * tuna.io.Can
+        Containing a 2D array of floats, where each point is the barycenter of
+        the respective spectrum on the input data.
+    """
+
+    detector = BarycenterDetector(data = data_can, batched = True)
+    detector.join()
+    return detector.result
+
+def barycenter_vectorized(data_can: tuna.io.can.Can) -> tuna.io.can.Can:
+    """Conveniently return an array of the barycenter position for each pixel of
+    the input, computed with the array-at-a-time version of the geometric
+    algorithm. It can be registered as the "Barycenter algorithm" plugin::
+
+        >>> tuna.plugins.registry("Barycenter algorithm",
+        ...                       tuna.tools.barycenter_vectorized)
+
+    Arguments:
+
+    * data_can : tuna.io.Can
+        Should contain a 3D cube of raw Fabry-Pérot data.
+
+    Returns:
+
+    * tuna.io.Can
+        Containing a 2D array of floats, where each point is the barycenter of
+        the respective spectrum on the input data.
+    """
+
+    detector = BarycenterVectorized(data = data_can)
+    detector.join()
+    return detector.result
+
+def barycenter_multiple_peaks(data_can: tuna.io.can.Can,
+                              max_peaks: int = 2,
+                              peak_threshold: float = 0.5) -> dict:
+    """Conveniently return the barycenter map of the input, together with the
+    maps of its spectral peaks, so that a pipeline can choose which line to use
+    when some spectra have more than one peak inside the FSR.
+
+    Arguments:
+
+    * data_can : tuna.io.Can
+        Should contain a 3D cube of raw Fabry-Pérot data.
+
+    * max_peaks : int : 2
+        The number of per-peak barycenter planes to compute.
+
+    * peak_threshold : float : 0.5
+        The fraction of each spectrum's maximum above which channels are
+        considered part of a peak.
+
+    Returns:
+
+    * dict
+        With the keys "barycenter" (the same map as barycenter_vectorized),
+        "peaks" (the number of peaks of each pixel), "regions" (the number of
+        spectral regions of each pixel) and "peak_barycenters" (a cube with one
+        plane per peak, brightest first, and numpy.nan where a pixel has fewer
+        peaks); all values are tuna.io.Can objects.
+    """
+
+    detector = BarycenterVectorized(data = data_can, max_peaks = max_peaks,
+                                    peak_threshold = peak_threshold)
+    detector.join()
+    return {"barycenter": detector.result,
+            "peak_barycenters": detector.peak_barycenters,
+            "peaks": detector.peaks,
+            "regions": detector.regions}
+
+def barycenter_tiled(data_can: tuna.io.can.Can,
+                     workers: int = None) -> tuna.io.can.Can:
+    """Conveniently return an array of the barycenter position for each pixel of
+    the input, computed in tiles by a pool of worker processes. It can be
+    registered as the "Barycenter algorithm" plugin.
+
+    Arguments:
+
+    * data_can : tuna.io.Can
+        Should contain a 3D cube of raw Fabry-Pérot data.
+
+    * workers : int : None
+        The number of worker processes. If None, one per CPU is used.
+
+    Returns:
+
+    * tuna.io.Can
+        Containing a 2D array of floats, where each point is the barycenter of
+        the respective spectrum on the input data.
+    """
+
+    detector = BarycenterTiled(data = data_can, workers = workers)
+    detector.join()
+    return detector.result
+
+def benchmark_barycenter_tiled(data_can: tuna.io.can.Can,
+                               max_workers: int = None) -> dict:
+    """Time barycenter_tiled on the input, using from 1 to max_workers worker
+    processes, and log the speedup relative to a single worker.
+
+    Arguments:
+
+    * data_can : tuna.io.Can
+        Should contain a 3D cube of raw Fabry-Pérot data.
+
+    * max_workers : int : None
+        The largest number of workers to try. If None, one per CPU is used.
+
+    Returns:
+
+    * dict
+        Where each key is a number of workers, and its value is the duration in
+        seconds of the barycenter computation.
+    """
+    log = logging.getLogger(__name__)
+    if max_workers == None:
+        max_workers = multiprocessing.cpu_count()
+
+    timings = {}
+    for workers in range(1, max_workers + 1):
+        start = time.time()
+        barycenter_tiled(data_can = data_can, workers = workers)
+        timings[workers] = time.time() - start
+        log.info("Barycenter with %d workers took %.2fs (speedup %.2f)." % (
+            workers, timings[workers], timings[1] / timings[workers]))
+    return timings
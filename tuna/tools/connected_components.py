@@ -0,0 +1,111 @@
+"""This module's scope is the labeling of the connected components of a binary
+image.
+
+Example::
+
+    >>> import tuna
+    >>> import numpy
+    >>> z = numpy.array([[1, 1, 0], [0, 0, 0], [0, 1, 1]])
+    >>> labels, counts, boxes = tuna.tools.label_connected_components(z)
+    >>> labels
+    array([[1, 1, 0],
+           [0, 0, 0],
+           [0, 2, 2]])
+    >>> counts
+    array([0, 2, 2])
+"""
+__version__ = "0.1.0"
+__changelog = {
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Initial version."}
+}
+
+import numpy
+
+def label_connected_components(array = numpy.ndarray):
+    """Label the connected sets of pixels that are 1 in the input array, where
+    connected means one pixel is among the get_pixel_neighbours ( ) of the other.
+
+    The labeling is a union-find over the whole image, done with array
+    operations: in a first pass, each pair of neighbouring pixels that are both
+    set is found by comparing the image with shifted versions of itself, and the
+    parent of the larger root is hooked to the smaller root, followed by pointer
+    jumping (path compression), until no pair has distinct roots. In a second
+    pass, the roots are numbered. Every set's root is its first pixel in
+    row-major order, so the labels are numbered in the order a row-major scan of
+    the image would first reach each set.
+
+    Parameters:
+
+    * array : numpy.ndarray
+        A 2D array, where the pixels to be labeled have the value 1.
+
+    Returns:
+
+    * labels : numpy.ndarray
+        Of integers, with the same shape as the input, containing 0 for the
+        background and the label (from 1 onwards) of each set elsewhere.
+
+    * counts : numpy.ndarray
+        Where counts[label] is the number of pixels in that set (counts[0] is
+        always 0).
+
+    * bounding_boxes : numpy.ndarray
+        Where bounding_boxes[label] contains the first and last columns, and the
+        first and last rows, of the pixels in that set (bounding_boxes[0] is
+        meaningless).
+    """
+    mask = numpy.asarray(array) == 1
+    max_cols, max_rows = mask.shape
+    indices = numpy.arange(mask.size).reshape(mask.shape)
+
+    # Pairs of set neighbours, one for each of the 4 "forward" directions.
+    firsts = []
+    seconds = []
+    for d_col, d_row in ((0, 1), (1, -1), (1, 0), (1, 1)):
+        first_rows = slice(max(0, - d_row), max_rows - max(0, d_row))
+        second_rows = slice(max(0, d_row), max_rows - max(0, - d_row))
+        both = mask[: max_cols - d_col, first_rows] \
+               & mask[d_col :, second_rows]
+        firsts.append(indices[: max_cols - d_col, first_rows][both])
+        seconds.append(indices[d_col :, second_rows][both])
+    firsts = numpy.concatenate(firsts)
+    seconds = numpy.concatenate(seconds)
+
+    parent = numpy.arange(mask.size)
+    while True:
+        first_roots = parent[firsts]
+        second_roots = parent[seconds]
+        distinct = first_roots != second_roots
+        if not numpy.any(distinct):
+            break
+        first_roots = first_roots[distinct]
+        second_roots = second_roots[distinct]
+        numpy.minimum.at(parent, numpy.maximum(first_roots, second_roots),
+                         numpy.minimum(first_roots, second_roots))
+        while True:
+            grandparent = parent[parent]
+            if numpy.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    flat_mask = mask.ravel()
+    is_root = flat_mask & (parent == numpy.arange(mask.size))
+    root_labels = numpy.cumsum(is_root)
+    labels = numpy.where(flat_mask, root_labels[parent], 0).reshape(mask.shape)
+
+    number_of_labels = int(root_labels[-1]) if mask.size else 0
+    counts = numpy.bincount(labels.ravel(), minlength = number_of_labels + 1)
+    counts[0] = 0
+
+    bounding_boxes = numpy.zeros(shape = (number_of_labels + 1, 4),
+                                 dtype = numpy.int64)
+    cols, rows = numpy.nonzero(mask)
+    set_labels = labels[cols, rows]
+    bounding_boxes[:, 0] = max_cols
+    bounding_boxes[:, 2] = max_rows
+    numpy.minimum.at(bounding_boxes[:, 0], set_labels, cols)
+    numpy.maximum.at(bounding_boxes[:, 1], set_labels, cols)
+    numpy.minimum.at(bounding_boxes[:, 2], set_labels, rows)
+    numpy.maximum.at(bounding_boxes[:, 3], set_labels, rows)
+
+    return labels, counts, bounding_boxes
@@ -9,8 +9,18 @@ Example::
     >>> continuum_detector.array[100][100]
     3.0
 """
-__version__ = "0.1.1"
+__version__ = "0.4.0"
 __changelog = {
+    "0.4.0": {"Tuna": "0.17.0", "Change": "The continuum and discontinuum " \
+              "arrays are allocated in the precision set by " \
+              "tuna.tools.set_precision."},
+    "0.3.0": {"Tuna": "0.17.0", "Change": "Added continuum_discontinuum, " \
+              "which computes the continuum and writes the discontinuum in " \
+              "place or into a given buffer."},
+    "0.2.0": {"Tuna": "0.17.0", "Change": "Added continuum_detector_partition, " \
+              "which computes the continuum of the whole cube with " \
+              "numpy.partition, and is the default Continuum detector. Fixed " \
+              "continuum_detector calling an undefined function."},
     "0.1.1": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.0": {"Tuna": "0.15.0", "Change": "Added changelog. Moved to " \
             "tuna.tools.continuum. Refactored as a plugin."}
@@ -47,6 +57,7 @@ class Detector(threading.Thread):
         self.log = logging.getLogger(__name__)
         self.can = can
         self.continuum_to_FSR_ratio = continuum_to_FSR_ratio
+        self.precision = tuna.tools.get_precision()
 
         self.continuum = None
         
@@ -60,7 +71,8 @@ class Detector(threading.Thread):
         start = time.time()
 
         continuum_array = numpy.zeros(shape = (self.can.array.shape[1],
-                                               self.can.array.shape[2]))
+                                               self.can.array.shape[2]),
+                                      dtype = self.precision)
 
         self.log.debug("Continuum array 0% created.")
         last_percentage_logged = 0
@@ -110,6 +122,34 @@ def median_of_lowest_channels(continuum_to_FSR_ratio = 0.25,
     else:
         return lowest[math.floor(channels / 2)]
 
+def median_of_lowest_channels_cube(array = numpy.ndarray,
+                                   continuum_to_FSR_ratio = 0.25):
+    """Obtain, for every spectrum of the input cube, the same value as 
+    median_of_lowest_channels ( ), in a single array operation.
+
+    The lowest channels are not sorted: numpy.partition along the spectral axis
+    places the value that median_of_lowest_channels ( ) would pick (the one at
+    index channels // 2 among the sorted lowest channels, for even and odd
+    numbers of channels alike) at its sorted position, which is all that is
+    needed.
+
+    Parameters:
+
+    * array : numpy.ndarray
+        A cube indexed as [planes, columns, rows].
+
+    * continuum_to_FSR_ratio : float : 0.25
+        The ratio of signal that is expected to be part of the continuum.
+
+    Returns:
+
+    * unnamed variable : numpy.ndarray
+        Containing the continuum value of each (column, row) of the input.
+    """
+    channels = max(1, int(continuum_to_FSR_ratio * array.shape[0]))
+    median_index = channels // 2
+    return numpy.partition(array, median_index, axis = 0)[median_index]
+
 def suppress_channel(replacement,
                      array = numpy.ndarray,
                      channels = list):
@@ -146,8 +186,115 @@ def continuum_detector(raw: tuna.io.Can,
         Encoding the ratio below which values are to be ignored.
     """
 
-    continuum_detector_object = detector(
+    continuum_detector_object = Detector(
         can = raw,
         continuum_to_FSR_ratio = continuum_to_FSR_ratio)
     continuum_detector_object.join()
     return continuum_detector_object.continuum
+
+def continuum_detector_partition(
+        raw: tuna.io.Can,
+        continuum_to_FSR_ratio: float = 0.25 ) -> tuna.io.Can:
+    """Conveniently return a Tuna can containing the continuum data for the given
+    input, computed for the whole cube at once by 
+    median_of_lowest_channels_cube ( ). The result is the same as the one from
+    continuum_detector ( ).
+
+    Parameters:
+
+    * raw : :ref:`tuna_io_can_label`
+        Containing data from a spectrograph.
+
+    * continuum_to_FSR_ratio : float
+        Encoding the ratio below which values are to be ignored.
+    """
+    log = logging.getLogger(__name__)
+    start = time.time()
+
+    continuum_array = median_of_lowest_channels_cube(
+        array = raw.array,
+        continuum_to_FSR_ratio = continuum_to_FSR_ratio).astype(
+            tuna.tools.get_precision())
+    log.info("Continuum array created.")
+    log.debug("continuum_detector_partition() took %ds." % (
+        time.time() - start))
+
+    return tuna.io.Can(array = continuum_array)
+
+def continuum_discontinuum(raw: tuna.io.Can,
+                           continuum_to_FSR_ratio: float = 0.25,
+                           in_place: bool = False,
+                           out: numpy.ndarray = None,
+                           block_cols: int = 32) -> dict:
+    """Compute the continuum of the input, and its discontinuum (the absolute
+    value of the data minus its continuum), in a single pass over the cube.
+
+    The cube is processed in blocks of columns: the continuum of each block is
+    obtained as in median_of_lowest_channels_cube ( ), and the residual of the
+    block is written, broadcasting the continuum over the planes, directly into
+    the output array. Therefore no temporary cube is created.
+
+    Parameters:
+
+    * raw : :ref:`tuna_io_can_label`
+        Containing data from a spectrograph.
+
+    * continuum_to_FSR_ratio : float : 0.25
+        Encoding the ratio below which values are to be ignored.
+
+    * in_place : bool : False
+        If True, the discontinuum overwrites the array of the input can, which
+        is then returned as the discontinuum. The input array should have a
+        signed or floating point dtype.
+
+    * out : numpy.ndarray : None
+        If given (and in_place is False), an array with the same shape as the
+        input cube, where the discontinuum is written. Otherwise, a new array is
+        allocated, in the precision given by tuna.tools.get_precision ( ).
+
+    * block_cols : int : 32
+        The number of columns of the cube processed at once.
+
+    Returns:
+
+    * dict
+        With the keys "continuum" and "discontinuum", whose values are 
+        tuna.io.Can objects.
+    """
+    log = logging.getLogger(__name__)
+    start = time.time()
+
+    array = raw.array
+    precision = tuna.tools.get_precision()
+    if in_place:
+        out = array
+    elif out is None:
+        out = numpy.empty(shape = array.shape, dtype = precision)
+    elif out.shape != array.shape:
+        log.error("Output buffer has shape %s, but the input has shape %s." % (
+            str(out.shape), str(array.shape)))
+        return None
+
+    continuum_array = numpy.empty(shape = array.shape[1:], dtype = precision)
+    for first_col in range(0, array.shape[1], block_cols):
+        last_col = min(first_col + block_cols, array.shape[1])
+        block_continuum = median_of_lowest_channels_cube(
+            array = array[:, first_col : last_col],
+            continuum_to_FSR_ratio = continuum_to_FSR_ratio)
+        continuum_array[first_col : last_col] = block_continuum
+        block_out = out[:, first_col : last_col]
+        numpy.subtract(array[:, first_col : last_col],
+                       block_continuum.astype(out.dtype), out = block_out)
+        numpy.abs(block_out, out = block_out)
+    log.info("Continuum and discontinuum arrays created.")
+    log.debug("continuum_discontinuum() took %ds." % (time.time() - start))
+
+    if in_place:
+        raw.digest = None
+        raw.update()
+        discontinuum = raw
+    else:
+        discontinuum = tuna.io.Can(array = out)
+
+    return {"continuum": tuna.io.Can(array = continuum_array),
+            "discontinuum": discontinuum}
@@ -26,6 +26,14 @@ Example usage::
             1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,
             1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.,  1.])
 """
+__version__ = "0.2.0"
+__changelog = {
+    "0.2.0": {"Tuna": "0.17.0", "Change": "The order map is stored in the " \
+              "precision set by tuna.tools.set_precision."},
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Vectorized the order map, and " \
+              "replaced the threshold loop over border distances by a search " \
+              "on the clustering threshold."}
+}
 
 import logging
 from math import sqrt
@@ -68,6 +76,7 @@ class FSR(threading.Thread):
         self.center = center
         self.wrapped = wrapped.array
         self.concentric_rings = concentric_rings
+        self.precision = tuna.tools.get_precision()
 
         self.max_rows = distances.shape[0]
         self.max_cols = distances.shape[1]
@@ -89,62 +98,113 @@ class FSR(threading.Thread):
         """Supposing the borders map and the concentric rings center are
         available, this method will generate a list of typical distances from
         border to center, and create a order map using this list. 
+
+        Each typical distance defines a band of distances around it, limited by
+        a quarter of the gap to its neighbours (or by 10% of its value, for the
+        first and last ones). A pixel's order is the number of bands whose high
+        limit is not beyond its distance to the center; if the pixel falls
+        inside the next band, it belongs to the next order if its wrapped phase
+        is below half the maximal wrapped phase.
         """
         center = self.concentric_rings[0]
         self.log.debug("self.distances.shape == {}".format(
             self.distances.shape))
         cols = self.distances.shape[0]
         rows = self.distances.shape[1]
-        distances_list = []
-        for element in numpy.unique(self.distances):
-            distances_list.append(element)
-        distances_list.remove(0)
+        distances_list = numpy.unique(self.distances)
+        distances_list = distances_list[distances_list != 0]
         self.log.debug("distances_list == {}".format(distances_list))
         target_number = len(self.concentric_rings[1])
-        filtered_distances = []
-        threshold = max(distances_list)
-        while (len(filtered_distances) < target_number):
-            filtered_distances = []
-            threshold -= 1
-            for entry in distances_list:
-                contained = False
-                for filtered in filtered_distances:
-                    if filtered - threshold < float(entry) < filtered +threshold:
-                        contained = True
-                if not contained:
-                    filtered_distances.append(float(entry))
-            self.log.debug("threshold == {}, filtered_distances == {}".format(
-                threshold, filtered_distances))
-            
-        sorted_distances = sorted(filtered_distances)
+        sorted_distances = filter_border_distances(distances_list,
+                                                   target_number)
         self.log.info("sorted_distances == {}".format(sorted_distances))
-        
-        self.fsr = numpy.zeros(shape = self.distances.shape)
-        for col in range(cols):
-            for row in range(rows):
-                distance = tuna.tools.calculate_distance(center, (col, row))
-                for entry in range(len(sorted_distances)):
-                    if entry == 0:
-                        low_limit = sorted_distances[entry] * 0.9
-                    else:
-                        low_limit = sorted_distances[entry] \
-                                    - (sorted_distances[entry] \
-                                       - sorted_distances[entry - 1]) / 4
-                    if entry == len(sorted_distances) - 1:
-                        high_limit = sorted_distances[entry] * 1.1
-                    else:
-                        high_limit = sorted_distances[entry] \
-                                     + (sorted_distances[entry + 1] \
-                                        - sorted_distances[entry]) / 4
-                    if distance >= high_limit:
-                        self.fsr[col][row] = entry + 1
-                    if low_limit < distance < high_limit:
-                        if self.wrapped[col][row] < numpy.amax(self.wrapped) / 2:
-                            self.fsr[col][row] = entry + 1
-                            break
-                        else:
-                            self.fsr[col][row] = entry
-                            break
+
+        low_limits = []
+        high_limits = []
+        for entry in range(len(sorted_distances)):
+            if entry == 0:
+                low_limits.append(sorted_distances[entry] * 0.9)
+            else:
+                low_limits.append(sorted_distances[entry] \
+                                  - (sorted_distances[entry] \
+                                     - sorted_distances[entry - 1]) / 4)
+            if entry == len(sorted_distances) - 1:
+                high_limits.append(sorted_distances[entry] * 1.1)
+            else:
+                high_limits.append(sorted_distances[entry] \
+                                   + (sorted_distances[entry + 1] \
+                                      - sorted_distances[entry]) / 4)
+        # A sentinel band, never reached, for the pixels beyond the last one.
+        low_limits.append(numpy.inf)
+
+        col_indices, row_indices = numpy.indices((cols, rows))
+        radii = numpy.sqrt((center[0] - col_indices)**2 +
+                           (center[1] - row_indices)**2)
+
+        orders = numpy.searchsorted(numpy.array(high_limits), radii,
+                                    side = "right")
+        inside_next_band = radii > numpy.array(low_limits)[orders]
+        below_half_phase = self.wrapped < numpy.amax(self.wrapped) / 2
+        self.fsr = (orders + (inside_next_band & below_half_phase)).astype(
+            self.precision)
+
+def filter_border_distances(distances_list, target_number):
+    """Select, from the input distances, at least target_number distances that
+    are as far apart as possible.
+
+    For a given threshold, a single pass over the sorted distances keeps each
+    distance that is at least threshold away from the last one kept (the next
+    one is found with numpy.searchsorted). The thresholds tried are the maximal
+    distance minus 1, minus 2, and so on; since fewer distances are kept for
+    larger thresholds, the largest of these thresholds which keeps at least
+    target_number distances is found by bisection.
+
+    Parameters:
+
+    * distances_list : numpy.ndarray
+        The sorted, unique and nonzero border distances.
+
+    * target_number : integer
+        The minimal number of distances to be kept.
+
+    Returns:
+
+    * list
+        The sorted list of kept distances.
+    """
+    log = logging.getLogger(__name__)
+    distances_list = numpy.asarray(distances_list, dtype = numpy.float64)
+    if len(distances_list) < target_number:
+        log.warning("Only {} border distances, but {} rings; using all " \
+                    "distances.".format(len(distances_list), target_number))
+        return list(distances_list)
+
+    maximum = float(distances_list[-1])
+
+    def cluster(threshold):
+        if threshold <= 0:
+            return list(distances_list)
+        filtered = []
+        index = 0
+        while index < len(distances_list):
+            filtered.append(float(distances_list[index]))
+            index = numpy.searchsorted(distances_list,
+                                       filtered[-1] + threshold, side = "left")
+        return filtered
+
+    # Find the smallest step such that maximum - step keeps enough distances;
+    #maximum - last_step is not positive, and keeps every distance.
+    first_step = 1
+    last_step = max(1, int(numpy.ceil(maximum)))
+    while first_step < last_step:
+        step = (first_step + last_step) // 2
+        if len(cluster(maximum - step)) >= target_number:
+            last_step = step
+        else:
+            first_step = step + 1
+    log.debug("threshold == {}".format(maximum - first_step))
+
+    return cluster(maximum - first_step)
 
 def fsr_mapper(distances: tuna.io.Can,
                wrapped: tuna.io.Can,
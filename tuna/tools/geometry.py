@@ -6,8 +6,14 @@ Example::
     >>> tuna.tools.geometry.calculate_distance((0, 0), (10, 0))
     10.0
 """
+__version__ = "0.1.0"
+__changelog = {
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Added convex_hull and " \
+              "find_farthest_pair."}
+}
 
 import math
+import numpy
 
 def calculate_distance(origin, destiny):
     """This function's goal is to calculate the euclidean distance between two
@@ -26,3 +32,98 @@ def calculate_distance(origin, destiny):
     """
     return math.sqrt((origin[0] - destiny[0])**2 +
                      (origin[1] - destiny[1])**2 )
+
+def convex_hull(cols, rows):
+    """This function's goal is to find the vertices of the convex hull of a set
+    of points in a plane, using Andrew's monotone chain algorithm.
+
+    Only the points with the minimal and maximal row of each column can be
+    vertices, so the chain is built over those points alone. Points lying on an
+    edge of the hull are not considered vertices.
+
+    Parameters:
+
+    * cols : numpy.ndarray
+        The column coordinates of the points.
+
+    * rows : numpy.ndarray
+        The row coordinates of the points.
+
+    Returns:
+
+    * numpy.ndarray
+        The indices, in the input arrays, of the vertices of the hull, in
+        counterclockwise order (in the column, row plane).
+    """
+    cols = numpy.asarray(cols).ravel()
+    rows = numpy.asarray(rows).ravel()
+    if cols.size == 0:
+        return numpy.zeros(shape = (0, ), dtype = numpy.int64)
+
+    order = numpy.lexsort((rows, cols))
+    sorted_cols = cols[order]
+    first = numpy.ones(shape = order.shape, dtype = bool)
+    first[1 :] = sorted_cols[1 :] != sorted_cols[: -1]
+    last = numpy.ones(shape = order.shape, dtype = bool)
+    last[: -1] = first[1 :]
+    candidates = order[first | last]
+    if candidates.size < 3:
+        return candidates
+
+    def cross(origin, a, b):
+        return (cols[a] - cols[origin]) * (rows[b] - rows[origin]) \
+            - (rows[a] - rows[origin]) * (cols[b] - cols[origin])
+
+    lower = []
+    for point in candidates:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper = []
+    for point in candidates[:: -1]:
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return numpy.array(lower[: -1] + upper[: -1], dtype = numpy.int64)
+
+def find_farthest_pair(cols, rows):
+    """This function's goal is to find the two points, in a set of points in a
+    plane, that are maximally distant to each other (the diameter of the set).
+
+    The points of a diameter are always vertices of the convex hull of the set,
+    so the distances are computed, as a single array expression, only between
+    the vertices of the convex_hull ( ). When several pairs have the maximal
+    distance, the pair is chosen deterministically: its first point is the last,
+    in (column, row) order, among the points of those pairs, and its second
+    point is the last such point that is paired with the first.
+
+    Parameters:
+
+    * cols : numpy.ndarray
+        The column coordinates of the points.
+
+    * rows : numpy.ndarray
+        The row coordinates of the points.
+
+    Returns:
+
+    * tuple of 2 integers
+        The indices, in the input arrays, of the two points; or None, if there
+        are no points.
+    """
+    cols = numpy.asarray(cols).ravel()
+    rows = numpy.asarray(rows).ravel()
+    vertices = convex_hull(cols, rows)
+    if vertices.size == 0:
+        return None
+
+    vertices = vertices[numpy.lexsort((rows[vertices], cols[vertices]))]
+    col_differences = cols[vertices][:, None] - cols[vertices][None, :]
+    row_differences = rows[vertices][:, None] - rows[vertices][None, :]
+    squared_distances = col_differences * col_differences \
+                        + row_differences * row_differences
+    firsts, seconds = numpy.nonzero(
+        squared_distances == numpy.amax(squared_distances))
+    first = numpy.amax(firsts)
+    second = numpy.amax(seconds[firsts == first])
+    return int(vertices[first]), int(vertices[second])
@@ -6,10 +6,17 @@ Example::
     >>> import tuna
     >>> import numpy
     >>> z = numpy.zeros(shape = (2, 2))
-    >>> tuna.tools.get_connected_region((1, 1), z, z)
-    [(1, 1), (1, 0), (0, 1), (0, 0), (0, 0), (0, 1), (0, 0)]
+    >>> tuna.tools.get_connected_region((1, 1), z, numpy.zeros(shape = (2, 2)))
+    [(0, 0), (0, 1), (1, 0), (1, 1)]
 """
-
+__version__ = "0.1.0"
+__changelog = {
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Uses label_connected_components. " \
+              "The region is returned in row-major order, without repeated " \
+              "points."}
+}
+
+import numpy
 import tuna
 
 def get_connected_region(point, array, already):
@@ -18,7 +25,8 @@ def get_connected_region(point, array, already):
 
     Values come from array, and the array already will be updated with the points
     taken in consideration having the value 1, and ignoring all points that have
-    value 1.
+    value 1. The connected points are found by label_connected_components ( ),
+    and are listed in row-major order.
 
     Parameters:
 
@@ -28,22 +36,13 @@ def get_connected_region(point, array, already):
 
     * already : numpy.ndarray
     """
-    region = []
-    to_consider = [point]
     value = array[point[0]][point[1]]
-    
-    while (len(to_consider) != 0):
-        here = to_consider.pop()
-        region.append(here)
-        already[here[0]][here[1]] = 1
-        neighbours = tuna.tools.get_pixel_neighbours(here, array)
-        for neighbour in neighbours:
-            pos_x = neighbour[0]
-            pos_y = neighbour[1]
-            if already[pos_x][pos_y] == 1:
-                continue
-            if array[pos_x][pos_y] != value:
-                continue
-            to_consider.append(neighbour)
-
-    return region
+    candidates = (numpy.asarray(array) == value) & (numpy.asarray(already) != 1)
+    candidates[point[0]][point[1]] = True
+
+    labels, counts, bounding_boxes = tuna.tools.label_connected_components(
+        candidates.astype(numpy.int8))
+    cols, rows = numpy.nonzero(labels == labels[point[0]][point[1]])
+    already[cols, rows] = 1
+
+    return list(zip(cols.tolist(), rows.tolist()))
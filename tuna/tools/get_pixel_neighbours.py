@@ -8,8 +8,9 @@ Example:
     >>> tuna.tools.get_pixel_neighbours(position = (10, 20), array = z)
     [(9, 19), (9, 20), (9, 21), (10, 19), (10, 21), (11, 19), (11, 20), (11, 21)]
 """
-__version__ = "0.1.2"
+__version__ = "0.2.0"
 __changelog = {
+    "0.2.0": {"Tuna": "0.17.0", "Change": "Added count_pixel_neighbours."},
     "0.1.2": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.1": {"Tuna": "0.14.0", "Change": "updated documentation to new style."},
     "0.1.0": {"Change": "Added distance_threshold_parameter, so users can get " \
@@ -59,3 +60,38 @@ def get_pixel_neighbours(position = (int, int),
             result.append(possibility)
                 
     return result
+
+def count_pixel_neighbours(array = numpy.ndarray, distance_threshold = 1):
+    """Count, for every position of the input array, how many of the neighbours
+    that get_pixel_neighbours ( ) would list for that position have value 1.
+
+    The counts are box sums over (2 * distance_threshold + 1)² windows, minus
+    the center, computed from the cumulative sums (the "integral image") of the
+    zero-padded input; therefore, the cost does not depend on the distance.
+
+    Parameters:
+
+    * array : numpy.ndarray
+        A 2D array.
+
+    * distance_threshold : integer : 1
+
+    Returns:
+
+    * unnamed variable : numpy.ndarray
+        Of integers, with the same shape as the input.
+    """
+    ones = (array == 1).astype(numpy.int64)
+    width = 2 * distance_threshold + 1
+    integral = numpy.zeros(shape = (ones.shape[0] + width,
+                                    ones.shape[1] + width),
+                           dtype = numpy.int64)
+    integral[distance_threshold + 1 : distance_threshold + 1 + ones.shape[0],
+             distance_threshold + 1 : distance_threshold + 1 + ones.shape[1]] \
+        = ones
+    integral = numpy.cumsum(numpy.cumsum(integral, axis = 0), axis = 1)
+    box_sums = integral[width :, width :] \
+               - integral[: - width, width :] \
+               - integral[width :, : - width] \
+               + integral[: - width, : - width]
+    return box_sums - ones
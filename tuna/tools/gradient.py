@@ -0,0 +1,185 @@
+"""This module's scope is the computation of the gradients of arrays, which are
+cached so that the tools that need the gradient of the same array compute it
+only once.
+
+Example::
+
+    >>> import tuna
+    >>> import numpy
+    >>> cube = numpy.arange(27.).reshape((3, 3, 3))
+    >>> tuna.tools.get_gradient(cube, axis = 0, plane = 1)
+    array([[9., 9., 9.],
+           [9., 9., 9.],
+           [9., 9., 9.]])
+"""
+__version__ = "0.1.0"
+__changelog = {
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Initial version."}
+}
+
+import collections
+import numpy
+import threading
+import weakref
+
+# The cached results, from the least to the most recently used, keyed by the
+#identity of the input array, the name of the computation and its parameters.
+__cache = collections.OrderedDict()
+# Weak references to the arrays whose results are cached, keyed by their id.
+__references = {}
+__lock = threading.Lock()
+max_cached_results = 32
+
+def get_cached(array, name, parameters, function):
+    """Return the result of function for the input array, computing it only if
+    it is not cached yet.
+
+    The results are cached while the input array exists, and only the
+    max_cached_results most recently used results are kept. The cache is keyed
+    by the identity of the array, so arrays must not be modified in place after
+    being used; if they are, clear_gradient_cache ( ) must be called.
+
+    Parameters:
+
+    * array : numpy.ndarray
+
+    * name : string
+        The name of the computation.
+
+    * parameters : tuple
+        The parameters that, together with the name, identify the result.
+
+    * function : object
+        A callable that receives no arguments and computes the result.
+
+    Returns:
+
+    * numpy.ndarray
+        The result, which must not be modified.
+    """
+    if not isinstance(array, numpy.ndarray):
+        return function()
+
+    key = (id(array), name) + tuple(parameters)
+    with __lock:
+        reference = __references.get(id(array))
+        if reference is not None and reference() is not array:
+            forget(id(array))
+            reference = None
+        if reference is not None and key in __cache:
+            __cache.move_to_end(key)
+            return __cache[key]
+
+    result = function()
+
+    with __lock:
+        if reference is None:
+            identity = id(array)
+            __references[identity] = weakref.ref(
+                array, lambda dead: forget_dead(identity, dead))
+        __cache[key] = result
+        while len(__cache) > max_cached_results:
+            __cache.popitem(last = False)
+    return result
+
+def forget(identity):
+    """Remove the results cached for the array with the input id. Must be called
+    with the lock held.
+
+    Parameters:
+
+    * identity : integer
+    """
+    __references.pop(identity, None)
+    for key in [key for key in __cache.keys() if key[0] == identity]:
+        del(__cache[key])
+
+def forget_dead(identity, dead):
+    """Remove the results cached for an array that no longer exists, unless its
+    id was already reused by another cached array.
+
+    Parameters:
+
+    * identity : integer
+
+    * dead : weakref.ref
+        The reference to the array that no longer exists.
+    """
+    with __lock:
+        if __references.get(identity) is dead:
+            forget(identity)
+
+def clear_gradient_cache():
+    """Remove all cached results.
+    """
+    with __lock:
+        __cache.clear()
+        __references.clear()
+
+def get_gradient(array, axis = 0, plane = None):
+    """Compute, or retrieve from the cache, the gradient of the input array
+    along one of its axes, as numpy.gradient would.
+
+    If a plane is specified, only the gradient on that plane (the index in the
+    first axis) is computed, which requires only that plane and its neighbours;
+    the result is the same as numpy.gradient(array)[axis][plane], but without
+    allocating the gradients of the whole array.
+
+    Parameters:
+
+    * array : numpy.ndarray
+
+    * axis : integer : 0
+        The axis along which the gradient is computed.
+
+    * plane : integer : None
+        The index, along the first axis, of the plane where the gradient is
+        wanted. If None, the gradient of the whole array is computed.
+
+    Returns:
+
+    * numpy.ndarray
+        The gradient, which must not be modified.
+    """
+    def compute():
+        if plane == None:
+            return numpy.gradient(array, axis = axis)
+        if axis != 0:
+            return numpy.gradient(array[plane], axis = axis - 1)
+        first = max(plane - 1, 0)
+        last = min(plane + 2, array.shape[0])
+        return numpy.gradient(array[first : last], axis = 0)[plane - first]
+
+    return get_cached(array, "gradient", (axis, plane), compute)
+
+def get_neighbour_difference(array):
+    """Compute, or retrieve from the cache, the largest absolute difference
+    between each pixel of a 2D array and its neighbours, as listed by
+    get_pixel_neighbours ( ).
+
+    Parameters:
+
+    * array : numpy.ndarray
+
+    Returns:
+
+    * numpy.ndarray
+        With the same shape as the input, which must not be modified.
+    """
+    def compute():
+        values = numpy.asarray(array, dtype = numpy.float64)
+        max_cols, max_rows = values.shape
+        difference = numpy.zeros(shape = values.shape)
+        for d_col, d_row in ((0, 1), (1, -1), (1, 0), (1, 1)):
+            first_rows = slice(max(0, - d_row), max_rows - max(0, d_row))
+            second_rows = slice(max(0, d_row), max_rows - max(0, - d_row))
+            first = (slice(0, max_cols - d_col), first_rows)
+            second = (slice(d_col, max_cols), second_rows)
+            pair_difference = numpy.abs(values[first] - values[second])
+            numpy.maximum(difference[first], pair_difference,
+                          out = difference[first])
+            numpy.maximum(difference[second], pair_difference,
+                          out = difference[second])
+        return difference
+
+    return get_cached(array, "neighbour_difference", (), compute)
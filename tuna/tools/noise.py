@@ -13,8 +13,14 @@ Example::
     >>> noise.array[500 : 511, 500]
     array([ 1.,  0.,  1.,  1.,  0.,  1.,  1.,  1.,  1.,  1.,  1.])
 """
-__version__ = "0.1.1"
+__version__ = "0.3.0"
 __changelog = {
+    "0.3.0": {"Tuna": "0.17.0", "Change": "The noise map is stored in the " \
+              "precision set by tuna.tools.set_precision, and the profiles " \
+              "are summed in double precision."},
+    "0.2.0": {"Tuna": "0.17.0", "Change": "The noise mask is a binary " \
+              "dilation of the signalless pixels, using the disk of " \
+              "include_noise_circle as structuring element."},
     "0.1.1": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.0": {"Tuna": "0.15.0", "Change": "Renamed 'raw' argument of " \
               "detect_noise to 'data'."}
@@ -74,6 +80,7 @@ class NoiseDetector(threading.Thread):
         self.wrapped = wrapped
         self.noise_mask_radius = noise_mask_radius
         self.noise_threshold = noise_threshold
+        self.precision = tuna.tools.get_precision()
         
         self.noise = None
 
@@ -112,7 +119,7 @@ class NoiseDetector(threading.Thread):
         start = time.time ( )
 
         # get an array of the sums of each profile:
-        profile_sums = numpy.sum(self.raw.array, 0)
+        profile_sums = numpy.sum(self.raw.array, 0, dtype = numpy.float64)
 
         if self.noise_threshold != None:
             lower_value = self.noise_threshold
@@ -123,19 +130,12 @@ class NoiseDetector(threading.Thread):
             self.log.debug("lower_percentile = {}, lower_value = {:.2e}".format(
                 lower_percentile, lower_value))
 
-        signalless = numpy.where(profile_sums <= lower_value,
-                                 numpy.ones(shape = self.noise.array.shape),
-                                 numpy.zeros(shape = self.noise.array.shape))
-
-        noise = numpy.zeros(shape = self.noise.array.shape)
-        for row in range(signalless.shape[0]):
-            for col in range(signalless.shape[1]):
-                if signalless[row][col] == 1:
-                    include_noise_circle(position = (row, col),
-                                         radius = self.noise_mask_radius,
-                                         array = noise)
+        signalless = (profile_sums <= lower_value).astype(self.precision)
+
+        noise = dilate_noise(signalless = signalless,
+                             radius = self.noise_mask_radius)
         
-        self.noise.array = noise
+        self.noise.array = noise.astype(self.precision)
 
         self.log.info("Noise map created with lower_value = {}.".format(
             lower_value))
@@ -161,6 +161,73 @@ class NoiseDetector(threading.Thread):
                            'radius': self.noise_mask_radius,
                            'threshold': threshold})
 
+def noise_circle_structuring_element(radius = int):
+    """Return the disk drawn by include_noise_circle ( ), as a boolean array.
+
+    Parameters:
+
+    * radius : integer
+        Containing the length (in pixels) of the circle to be masked.
+
+    Returns:
+
+    * unnamed variable : numpy.ndarray
+        Of shape (2 * radius, 2 * radius), where the element [i, j] is True if
+        include_noise_circle ( ) marks the pixel at the offset 
+        (i - radius, j - radius) from the circle's center.
+    """
+    offsets = numpy.arange(-radius, radius)
+    return numpy.sqrt(offsets[:, numpy.newaxis]**2 \
+                      + offsets[numpy.newaxis, :]**2) <= radius
+
+def dilate_noise(signalless = numpy.ndarray, radius = int):
+    """Return the noise mask obtained by calling include_noise_circle ( ) on each
+    signalless pixel, computed as a single binary dilation.
+
+    Since the disk is convex, each of its lines is an interval of columns. The
+    dilation by one line is a window sum of the prefix sums (along columns) of 
+    the signalless map, shifted by that line's row offset; the mask is the union
+    of these windows. Only integer sums are used, so the result is exactly the
+    same as the one from include_noise_circle ( ).
+
+    Parameters:
+
+    * signalless : numpy.ndarray
+        A 2D array, where the signalless pixels have value 1.
+
+    * radius : integer
+        Containing the length (in pixels) of the circle to be masked.
+
+    Returns:
+
+    * noise : numpy.ndarray
+        A 2D array of floats, with 1 on the masked pixels and 0 elsewhere.
+    """
+    element = noise_circle_structuring_element(radius)
+    rows, cols = signalless.shape
+    prefix_sums = numpy.zeros(shape = (rows, cols + 1), dtype = numpy.int64)
+    numpy.cumsum(signalless == 1, axis = 1, out = prefix_sums[:, 1 :])
+
+    covered = numpy.zeros(shape = (rows, cols), dtype = bool)
+    targets = numpy.arange(cols)
+    for line in range(element.shape[0]):
+        row_offset = line - radius
+        line_cols = numpy.nonzero(element[line])[0] - radius
+        if (line_cols.size == 0 or
+            abs(row_offset) >= rows):
+            continue
+        # Pixel (row, col) is covered by a source in the current line if that
+        #source's column is in [col - max offset, col - min offset].
+        first = numpy.clip(targets - line_cols[-1], 0, cols)
+        after_last = numpy.clip(targets - line_cols[0] + 1, 0, cols)
+        window = prefix_sums[:, after_last] - prefix_sums[:, first] > 0
+        if row_offset >= 0:
+            covered[row_offset :] |= window[: rows - row_offset]
+        else:
+            covered[: rows + row_offset] |= window[- row_offset :]
+
+    return covered.astype(numpy.float64)
+
 def include_noise_circle(position = (int, int),
                          radius = int, array = numpy.array):
     """"Draw" a circle with center position, radius radius in the array array,
@@ -7,3 +7,5 @@ Fabry-Pérot interferographs.
 from .find_image_center_by_symmetry         import find_image_center_by_symmetry
 from .find_image_center_by_arc_segmentation import ArcSegmentationCenterFinder
 from .ring_borders                          import ( RingBorderDetector )
+from .unwrapping                            import ( unwrap_phase_map,
+                                                     unwrap_phase_map_quality_guided )
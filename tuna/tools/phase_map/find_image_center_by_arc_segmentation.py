@@ -2,8 +2,13 @@
 This module's scope are the procedures necessary to find the center in a
 spectrograph using the arc segmentation method.
 """
-__version__ = "0.1.0"
+__version__ = "0.3.0"
 __changelog = {
+    "0.3.0": {"Tuna": "0.17.0", "Change": "The differences between " \
+              "neighbouring pixels are obtained from " \
+              "tuna.tools.get_neighbour_difference."},
+    "0.2.0": {"Tuna": "0.17.0", "Change": "The ring borders are colored by " \
+              "label_connected_components."},
     "0.1.1": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.0": {"Tuna": "0.14.0", "Change": "improved documentation, silenced logs."}
 }
@@ -87,80 +92,29 @@ class ArcSegmentationCenterFinder(threading.Thread):
         """
         start = time.time()
 
-        ring_borders_map = numpy.zeros(
-            shape = self.wrapped.shape, dtype = numpy.int16)
-        max_rows = self.wrapped.shape[0]
-        max_cols = self.wrapped.shape[1]
         max_channel = numpy.amax(self.wrapped.array)
         channel_threshold = max_channel - 1
 
-        for row in range(max_rows):
-            for col in range(max_cols):
-                neighbours = tuna.tools.get_pixel_neighbours(
-                    (row, col), ring_borders_map)
-                distances = []
-                for neighbour in neighbours:
-                    distances.append(int(abs(
-                        self.wrapped.array[row][col] - \
-                        self.wrapped.array[ neighbour[0]][neighbour[1]])))
-                max_distance = max(distances)
-                if (max_distance > channel_threshold and \
-                    int(self.wrapped.array[row][col]) == 0 and \
-                    self.noise.array[row][col] == 0):
-                    ring_borders_map[row][col] = 1
+        # A border pixel is a non-noisy pixel at channel 0, which has a
+        #neighbour more than channel_threshold channels away.
+        max_distance = numpy.trunc(
+            tuna.tools.get_neighbour_difference(self.wrapped.array))
+        ring_borders_map = ((max_distance > channel_threshold) &
+                            (numpy.trunc(self.wrapped.array) == 0) &
+                            (self.noise.array == 0)).astype(numpy.int16)
         if (numpy.sum(ring_borders_map) == 0):
             self.log.warning("No borders detected.")
             self.__ring_borders = numpy.ones(shape = ring_borders_map.shape)
             return
 
-        # color continuous ring borders with different colors
-        next_color = 2
-        for row in range(max_rows):
-            self.log.debug("i_row = %d" % row)
-            for col in range(max_cols):
-                if ring_borders_map[row][col] == 1:
-                    borderhood = [(row, col)]
-                    while (borderhood != []):
-                        self.log.debug("l_borderhood = %s" % str(borderhood))
-                        tocolor_pixel = borderhood.pop()
-                        neighbours = tuna.tools.get_pixel_neighbours(
-                            (tocolor_pixel[0], tocolor_pixel[1]),
-                            ring_borders_map)
-                        for neighbour in neighbours:
-                            if neighbour not in borderhood:
-                                if ring_borders_map[neighbour[0]][neighbour[1]] == 1:
-                                    borderhood.append(neighbour)
-                        ring_borders_map[tocolor_pixel[0]][tocolor_pixel[1]] = \
-                            next_color
-                    next_color += 1
-                
-        # how many pixels are colored in each color?
-        color_counts = {}
-        for row in range(max_rows):
-            for col in range(max_cols):
-                color = ring_borders_map[row][col]
-                if color > 0:
-                    if color in color_counts.keys():
-                        color_counts[color] += 1
-                    else:
-                        color_counts[color] = 1
-
-        # filter out everything but the largest arc
-        if (color_counts == {}):
-            self.log.debug("color_counts == {}")
-        else:
-            max_arc_count = max(color_counts.values())
-            for color, count in color_counts.items():
-                if count == max_arc_count:
-                    max_arc_color = color
-                    break
-            #self.log ( "i_max_arc_color, max_arc_count = %d, %d" % ( max_arc_color, max_arc_count ) )
-            for row in range(max_rows):
-                for col in range(max_cols):
-                    if ring_borders_map[row][col] != max_arc_color:
-                        ring_borders_map[row][col] = 0
-                    else:
-                        ring_borders_map[row][col] = 1
+        # color continuous ring borders with different colors, and keep only
+        #the largest arc
+        colors, color_counts, bounding_boxes = \
+            tuna.tools.label_connected_components(ring_borders_map)
+        max_arc_color = numpy.argmax(color_counts)
+        max_arc_count = color_counts[max_arc_color]
+        ring_borders_map = numpy.where(colors == max_arc_color, 1, 0).astype(
+            numpy.int16)
 
         # if the largest arc is too small, abort
         if max_arc_count < 20:
@@ -22,6 +22,13 @@ Example::
             231.82699114,  231.82699114,  231.82699114,    0.        ,
               0.        ,    0.        ,    0.        ,    0.        ])
 """
+__version__ = "0.2.0"
+__changelog = {
+    "0.2.0": {"Tuna": "0.17.0", "Change": "The gradient is obtained from " \
+              "tuna.tools.get_gradient."},
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Replaced the per-pixel loops of " \
+              "RingBorderDetector by array operations."}
+}
 
 import logging
 from math import sqrt
@@ -100,20 +107,14 @@ class RingBorderDetector(threading.Thread):
         This method will detect that and mark the border pixels with a one, and
         zero everywhere else.
         """
-        gradient = numpy.gradient(self.data.array)
-        wrapped_gradient = gradient[0]
+        wrapped_gradient = tuna.tools.get_gradient(self.data.array, axis = 0)
         average = numpy.average(wrapped_gradient)
         zeroes = numpy.zeros(shape = self.data.shape)
         ones = numpy.ones(shape = self.data.shape)
         half = numpy.where(wrapped_gradient > average - 1, zeroes, ones)
         other_half = numpy.where(wrapped_gradient < average + 1, zeroes, ones)
         complete = half + other_half
-        self.borders = numpy.zeros(shape = self.data.array.shape)
-        for col in range(self.data.array.shape[0]):
-            for row in range(self.data.array.shape[1]):
-                if self.noise[col][row] == 1:
-                    continue
-                self.borders[col][row]  = complete[col][row]
+        self.borders = numpy.where(self.noise == 1, zeroes, complete)
         
     def map_distances_onto_borders(self):
         """Map the pixels belonging to the border with the value of the radius of
@@ -121,9 +122,7 @@ class RingBorderDetector(threading.Thread):
         belongs to a certain "border" to have the same non-zero value, and for
         different ring borders to have different values.
         """
-        for col in range(self.borders.shape[0]):
-            for row in range(self.borders.shape[1]):
-                if self.borders [ col ] [ row ] == 0:
-                    continue
-                distance = tuna.tools.calculate_distance(self.center, (col, row))
-                self.borders[col][row] = distance
+        cols, rows = numpy.indices(self.borders.shape)
+        radii = numpy.sqrt((self.center[0] - cols)**2 +
+                           (self.center[1] - rows)**2)
+        self.borders = numpy.where(self.borders != 0, radii, self.borders)
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""This module's scope is the unwrapping of wrapped phase maps, using an order
+map (such as the one produced by the "FSR mapper" plugin).
+
+Example::
+
+    >>> import tuna
+    >>> unwrapped = tuna.plugins.run("Phase unwrapper")( \
+            wrapped = barycenter, \
+            order = fsr, \
+            noise = noise)
+"""
+__version__ = "0.2.0"
+__changelog = {
+    "0.2.0": {"Tuna": "0.17.0", "Change": "The unwrapped map is stored in " \
+              "the precision set by tuna.tools.set_precision."},
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Initial version, with the direct " \
+              "and the quality-guided unwrapping."}
+}
+
+import heapq
+import logging
+import numpy
+import threading
+import time
+import tuna
+
+class PhaseUnwrapper(threading.Thread):
+    """This class is responsible for unwrapping a phase map, given its order map.
+
+    It inherits from the :ref:`threading_label`.Thread class, and it auto-starts
+    its thread execution. Clients are expected to use its .join ( ) method before
+    using its results.
+
+    The unwrapped value of each pixel is its wrapped value plus its order times
+    the free spectral range, in channels, which is taken as the maximal value of
+    the wrapped map. This is computed for the whole map as a single array
+    expression.
+
+    In the quality-guided mode, the map is also traversed by a flood fill,
+    backed by a heap so that the pixels whose wrapped phase varies the least
+    relative to their neighbours are visited first. A pixel whose direct
+    unwrapping jumps by more than half a FSR relative to the neighbour that
+    reached it is considered to have an ambiguous order, and is unwrapped
+    relative to that neighbour instead. Noisy pixels keep their direct
+    unwrapping, and are never used as references.
+
+    Its constructor has the following signature:
+
+    Parameters:
+
+    * wrapped : :ref:`tuna_io_can_label`
+        Containing the wrapped phase map.
+
+    * order : :ref:`tuna_io_can_label`
+        Containing the order map, with the number of FSRs from the axis until
+        each pixel.
+
+    * noise : :ref:`tuna_io_can_label` : None
+        Containing the noise map, where noisy pixels have value 1.
+
+    * quality_guided : boolean : False
+        Whether the ambiguous pixels should be unwrapped by the quality-guided
+        flood fill.
+    """
+    def __init__(self, wrapped, order, noise = None, quality_guided = False):
+        super(self.__class__, self).__init__()
+        self.log = logging.getLogger(__name__)
+        self.log.setLevel(logging.INFO)
+
+        self.wrapped = wrapped.array
+        self.order = order.array
+        self.noise = None
+        if noise is not None:
+            self.noise = noise.array
+        self.quality_guided = quality_guided
+        self.precision = tuna.tools.get_precision()
+
+        self.unwrapped = None
+
+        self.start()
+
+    def run(self):
+        """Method required by :ref:`threading_label`, which allows parallel
+        execution in a separate thread.
+        """
+        start = time.time()
+
+        free_spectral_range = numpy.amax(self.wrapped)
+        unwrapped = (self.wrapped + free_spectral_range * self.order.astype(
+            numpy.float64)).astype(self.precision)
+        if self.quality_guided:
+            self.flood_fill_ambiguous(unwrapped, free_spectral_range)
+        self.log.info("Phase map unwrapped.")
+
+        self.unwrapped = tuna.io.Can(array = unwrapped)
+
+        self.log.debug("Phase unwrapping took %ds." % (time.time() - start))
+
+    def get_quality(self, free_spectral_range):
+        """Compute the quality of each pixel, as minus the mean absolute
+        difference between its wrapped phase and the ones of its neighbours,
+        where each difference is wrapped into half a FSR.
+
+        Parameters:
+
+        * free_spectral_range : float
+            The length, in channels, of the FSR.
+
+        Returns:
+
+        * quality : numpy.ndarray
+            With the same shape as the wrapped map.
+        """
+        variation = numpy.zeros(shape = self.wrapped.shape)
+        neighbours = numpy.zeros(shape = self.wrapped.shape)
+        for axis in range(2):
+            difference = numpy.diff(self.wrapped, axis = axis)
+            difference = numpy.abs(
+                (difference + free_spectral_range / 2) % free_spectral_range
+                - free_spectral_range / 2)
+            before = [slice(None), slice(None)]
+            after = [slice(None), slice(None)]
+            before[axis] = slice(None, -1)
+            after[axis] = slice(1, None)
+            variation[tuple(before)] += difference
+            variation[tuple(after)] += difference
+            neighbours[tuple(before)] += 1
+            neighbours[tuple(after)] += 1
+        return - variation / numpy.maximum(neighbours, 1)
+
+    def flood_fill_ambiguous(self, unwrapped, free_spectral_range):
+        """Re-unwrap, in place, the pixels whose order is ambiguous, with a
+        quality-guided flood fill.
+
+        Each connected set of non-noisy pixels is filled from its best quality
+        pixel. A pixel reached from an already unwrapped neighbour keeps its
+        direct unwrapping if both are less than half a FSR apart; otherwise its
+        order is ambiguous, and it is unwrapped to the value closest to that
+        neighbour. Finally, each set is shifted by the whole number of FSRs
+        that most of its pixels were shifted, so that the result agrees with
+        the order map wherever the order map is consistent.
+
+        Parameters:
+
+        * unwrapped : numpy.ndarray
+            The directly unwrapped phase map, which is modified in place.
+
+        * free_spectral_range : float
+            The length, in channels, of the FSR.
+        """
+        if free_spectral_range <= 0:
+            return
+
+        direct = numpy.copy(unwrapped)
+        done = numpy.zeros(shape = unwrapped.shape, dtype = bool)
+        if self.noise is not None:
+            done = self.noise == 1
+        quality = self.get_quality(free_spectral_range)
+        max_col, max_row = unwrapped.shape
+        offsets = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+        ambiguous = 0
+        counter = 0
+        for seed in numpy.argsort(- quality, axis = None, kind = "stable"):
+            seed_col, seed_row = divmod(int(seed), max_row)
+            if done[seed_col, seed_row]:
+                continue
+            done[seed_col, seed_row] = True
+            component = [(seed_col, seed_row)]
+            heap = []
+            col, row = seed_col, seed_row
+            while True:
+                for d_col, d_row in offsets:
+                    neighbour_col = col + d_col
+                    neighbour_row = row + d_row
+                    if (0 <= neighbour_col < max_col and
+                        0 <= neighbour_row < max_row and
+                        not done[neighbour_col, neighbour_row]):
+                        heapq.heappush(heap, (- quality[neighbour_col,
+                                                        neighbour_row],
+                                              counter, neighbour_col,
+                                              neighbour_row, col, row))
+                        counter += 1
+                while heap and done[heap[0][2], heap[0][3]]:
+                    heapq.heappop(heap)
+                if not heap:
+                    break
+                col, row, reference_col, reference_row = heapq.heappop(
+                    heap)[2 :]
+                reference = unwrapped[reference_col, reference_row]
+                if (abs(direct[col, row] - reference) >
+                    free_spectral_range / 2):
+                    wrapped = self.wrapped[col, row]
+                    unwrapped[col, row] = wrapped + free_spectral_range \
+                                          * numpy.round((reference - wrapped)
+                                                        / free_spectral_range)
+                    ambiguous += 1
+                done[col, row] = True
+                component.append((col, row))
+
+            component = tuple(numpy.array(component).T)
+            shifts = numpy.round((unwrapped[component] - direct[component])
+                                 / free_spectral_range).astype(numpy.int64)
+            values, counts = numpy.unique(shifts, return_counts = True)
+            unwrapped[component] -= free_spectral_range \
+                                    * values[numpy.argmax(counts)]
+
+        self.log.info("%d pixels had an ambiguous order." % ambiguous)
+        # The majority shift restores the direct values bit for bit only if
+        #they were not re-unwrapped.
+        consistent = numpy.abs(unwrapped - direct) < free_spectral_range / 2
+        unwrapped[consistent] = direct[consistent]
+
+def unwrap_phase_map(wrapped: tuna.io.Can,
+                     order: tuna.io.Can,
+                     noise: tuna.io.Can = None) -> tuna.io.Can:
+    """Conveniently return the unwrapped phase map, computed directly from the
+    input order map.
+
+    Parameters:
+
+    * wrapped : :ref:`tuna_io_can_label`
+        Containing the wrapped phase map.
+
+    * order : :ref:`tuna_io_can_label`
+        Containing the order map.
+
+    * noise : :ref:`tuna_io_can_label` : None
+        Not used by this method; necessary to obey the signature of the "Phase
+        unwrapper" plugin.
+
+    Returns:
+
+    * tuna.io.Can
+        Containing the unwrapped phase map.
+    """
+    unwrapper = PhaseUnwrapper(wrapped = wrapped, order = order, noise = noise)
+    unwrapper.join()
+    return unwrapper.unwrapped
+
+def unwrap_phase_map_quality_guided(wrapped: tuna.io.Can,
+                                    order: tuna.io.Can,
+                                    noise: tuna.io.Can = None) -> tuna.io.Can:
+    """Conveniently return the unwrapped phase map, where the pixels with an
+    ambiguous order are unwrapped by a quality-guided flood fill. It can be
+    registered as the "Phase unwrapper" plugin::
+
+        >>> tuna.plugins.registry("Phase unwrapper",
+        ...     tuna.tools.phase_map.unwrap_phase_map_quality_guided)
+
+    Parameters:
+
+    * wrapped : :ref:`tuna_io_can_label`
+        Containing the wrapped phase map.
+
+    * order : :ref:`tuna_io_can_label`
+        Containing the order map.
+
+    * noise : :ref:`tuna_io_can_label` : None
+        Containing the noise map; noisy pixels are not used as references.
+
+    Returns:
+
+    * tuna.io.Can
+        Containing the unwrapped phase map.
+    """
+    unwrapper = PhaseUnwrapper(wrapped = wrapped, order = order, noise = noise,
+                               quality_guided = True)
+    unwrapper.join()
+    return unwrapper.unwrapped
@@ -6,8 +6,10 @@ Example::
     raw = tuna.io.read("tuna/test/unit/unit_io/adhoc.ad3")
     tuna.tools.plot(raw)
 """
-__version__ = "0.1.2"
+__version__ = "0.1.3"
 __changelog = {
+    "0.1.3": {"Tuna": "0.17.0", "Change": "plot_spectral_rings plots the " \
+              "'gradient' of the rings finder."},
     "0.1.2": {"Tuna": "0.16.5", "Change": "PEP8 and PEP257 compliance."},
     "0.1.1": {"Tuna": "0.16.0", "Change": "Added parameter for colormap in " \
               "plot."},
@@ -150,9 +152,7 @@ def plot_spectral_rings(spectral_rings):
     for counter in range(len(spectral_rings["ring_pixel_sets"])):
         plot(spectral_rings["ring_pixel_sets"][counter][0],
              title = "Ring pixel set {}".format(counter), ipython = ipython)
-    for counter in range(len(spectral_rings["gradients"])):
-        plot(spectral_rings["gradients"][counter],
-             title = "Gradients", ipython = ipython)
+    plot(spectral_rings["gradient"], title = "Gradient", ipython = ipython)
     plot(spectral_rings["upper_percentile_regions"],
          title = "lower_percentile_regions", ipython = ipython)
     plot(spectral_rings["lower_percentile_regions"],
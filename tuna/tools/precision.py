@@ -0,0 +1,121 @@
+"""This module's scope is the floating point precision policy, which defines the
+dtype of the cubes and intermediary products allocated by Tuna's tools, models
+and pipelines.
+
+The policy is double precision (numpy.float64) by default. In single precision
+(numpy.float32), the products take half the memory and bandwidth, while
+accumulations (such as sums of masses and moments) and the internals of the
+fitters are still computed in double precision, and only their results are
+stored in single precision.
+
+The precision can also be set for a single thread, such as a pipeline, which
+overrides the default one for the products allocated in that thread. The tools
+that run as threads read the precision when they are created, so they follow
+the precision of the thread that created them.
+
+Example::
+
+    >>> import tuna
+    >>> tuna.tools.get_precision()
+    dtype('float64')
+    >>> tuna.tools.set_precision("single")
+    dtype('float64')
+    >>> tuna.tools.get_precision()
+    dtype('float32')
+    >>> with tuna.tools.working_precision("double"):
+    ...     tuna.tools.get_precision()
+    dtype('float64')
+"""
+__version__ = "0.1.0"
+__changelog = {
+    "0.1.0": {"Tuna": "0.17.0", "Change": "Initial version."}
+}
+
+import contextlib
+import numpy
+import threading
+
+__precisions = {"single": numpy.dtype(numpy.float32),
+                "double": numpy.dtype(numpy.float64)}
+__default = numpy.dtype(numpy.float64)
+# The precisions set for a single thread, which override the default.
+__local = threading.local()
+
+def get_dtype(precision):
+    """Return the dtype that corresponds to the input precision.
+
+    Parameters:
+
+    * precision : string or dtype
+        Either "single" or "double", or a dtype equivalent to numpy.float32 or
+        numpy.float64.
+
+    Returns:
+
+    * numpy.dtype
+    """
+    if isinstance(precision, str) and precision in __precisions.keys():
+        return __precisions[precision]
+    try:
+        dtype = numpy.dtype(precision)
+    except TypeError:
+        dtype = None
+    if precision is None or dtype not in __precisions.values():
+        raise ValueError("Precision must be \"single\", \"double\", " \
+                         "numpy.float32 or numpy.float64, not {}.".format(
+                             precision))
+    return dtype
+
+def get_precision():
+    """Return the dtype in which cubes and intermediary products should be
+    allocated: the one set for the current thread, if any, or the default one.
+
+    Returns:
+
+    * numpy.dtype
+    """
+    return getattr(__local, "dtype", None) or __default
+
+def set_precision(precision, thread = False):
+    """Set the precision policy.
+
+    Parameters:
+
+    * precision : string or dtype
+        Either "single" or "double", or a dtype equivalent to numpy.float32 or
+        numpy.float64.
+
+    * thread : boolean : False
+        If True, the precision is set only for the current thread (and for the
+        tools that it creates); otherwise, the default precision is set.
+
+    Returns:
+
+    * numpy.dtype
+        The precision that was in effect before this call.
+    """
+    global __default
+    dtype = get_dtype(precision)
+    previous = get_precision()
+    if thread:
+        __local.dtype = dtype
+    else:
+        __default = dtype
+    return previous
+
+@contextlib.contextmanager
+def working_precision(precision):
+    """Set the precision for the current thread, within a with statement.
+
+    Parameters:
+
+    * precision : string or dtype
+        Either "single" or "double", or a dtype equivalent to numpy.float32 or
+        numpy.float64.
+    """
+    previous = getattr(__local, "dtype", None)
+    set_precision(precision, thread = True)
+    try:
+        yield get_precision()
+    finally:
+        __local.dtype = previous
@@ -8,12 +8,49 @@ Example::
     >>> raw = tuna.io.read("tuna/test/unit/unit_io/adhoc.ad3")
     >>> rings = tuna.plugins.run("Ring center finder")(data = raw)
     >>> sorted(list(rings.keys()))
-    ['concentric_rings', 'construction', 'gradient', 'gradients', 'lower_percentile_regions', 'ridge', 'ring_fit', 'ring_fit_parameters', 'ring_pixel_sets', 'rings', 'upper_percentile_regions']
+    ['concentric_rings', 'construction', 'gradient', 'lower_percentile_regions', 'ridge', 'ring_fit', 'ring_fit_parameters', 'ring_pixel_sets', 'rings', 'upper_percentile_regions']
     >>> rings['rings']
     [(218.56306556317449, 256.97877557329144, 231.82699113784105, [0]), (219.14654183804043, 254.87497666726719, 110.1292761603854, [1]), (190.48575616356123, 248.81898301262672, 338.64377512691351, [2, 3])]
 """
+__version__ = "0.8.4"
+__changelog = {
+    "0.8.4": {"Tuna": "0.17.0", "Change": "PlaneSearch evaluates the planes " \
+              "in the calling process when shared memory is not available " \
+              "(Python < 3.8)."},
+    "0.8.3": {"Tuna": "0.17.0", "Change": "Corrected the comment on the " \
+              "points at the center in radial_jacobian."},
+    "0.8.2": {"Tuna": "0.17.0", "Change": "fit_circle_ransac keeps the " \
+              "candidate with the least median residual, and selects the " \
+              "inliers again around each refitted circle, with a robust " \
+              "threshold, until they no longer change."},
+    "0.8.1": {"Tuna": "0.17.0", "Change": "segment obtains only the " \
+              "gradient along the planes; the result no longer has the " \
+              "'gradients' key."},
+    "0.8.0": {"Tuna": "0.17.0", "Change": "remove_lumped_pixel_sets uses " \
+              "ring_statistics on the label image; the fits and rings are " \
+              "aggregated with distance matrices."},
+    "0.7.0": {"Tuna": "0.17.0", "Change": "The gradient of each plane is " \
+              "obtained from tuna.tools.get_gradient, instead of computing " \
+              "the gradients of the whole cube."},
+    "0.6.0": {"Tuna": "0.17.0", "Change": "find_rings searches the planes " \
+              "with PlaneSearch, which computes the gradient once, ranks the " \
+              "planes by ridge coverage and evaluates them in parallel."},
+    "0.5.0": {"Tuna": "0.17.0", "Change": "fit_circle fits the radial " \
+              "distances of the ring pixels, with an analytic Jacobian, by " \
+              "default; circle is vectorized."},
+    "0.4.0": {"Tuna": "0.17.0", "Change": "find_max_pair searches the " \
+              "convex hull of all pixels, instead of all pairs of a random " \
+              "sample."},
+    "0.3.0": {"Tuna": "0.17.0", "Change": "The initial center and radius for " \
+              "fit_circle are estimated by an algebraic circle fit; the " \
+              "geometric construction is kept as a debug mode."},
+    "0.2.0": {"Tuna": "0.17.0", "Change": "separate_rings uses " \
+              "label_connected_components."},
+    "0.1.0": {"Tuna": "0.17.0", "Change": "The ridge is found with box sums " \
+              "of the percentile regions, instead of calling ridgeness for " \
+              "each pixel."}
+}
 
-import copy
 import IPython
 import logging
 import math
@@ -21,8 +58,14 @@ try:
     import mpyfit
 except ImportError:
     print ( "Could not import mpyfit. Please install this library before running Tuna." )
+import multiprocessing
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8; PlaneSearch then evaluates the planes in this process.
+    shared_memory = None
 import numpy
-import random
+import scipy.optimize
 import sympy
 import time
 import tuna
@@ -45,8 +88,16 @@ class RingsFinder(object):
     * plot_log : boolean
         If set to True, will spawn plots of intermediary products, as they are
         produced.
+
+    * construction_method : string : "algebraic"
+        How the center and radius used to initialize each circle fit are
+        estimated. Either "algebraic", for fit_circle_algebraic ( ); "ransac",
+        for fit_circle_ransac ( ), which tolerates outliers in arcs; or
+        "geometric", for the (much slower) geometric construction of
+        construct_ring_center ( ), which is meant for debugging.
     """
-    def __init__(self, array, plane, ipython, plot_log):
+    def __init__(self, array, plane, ipython, plot_log,
+                 construction_method = "algebraic"):
         self.log = logging.getLogger(__name__)
         self.log.setLevel(logging.DEBUG)
         self.plot_log = plot_log
@@ -58,6 +109,7 @@ class RingsFinder(object):
 
         self.chosen_plane = plane
         self.ridge_threshold = 6
+        self.construction_method = construction_method
             
         self.array = array
         
@@ -100,9 +152,11 @@ class RingsFinder(object):
     def segment(self):
         """Segment the image in ring and non-ring regions.
 
-        This is accomplished applying the numpy.gradient method on the input
-        array; and then obtaining the lower percentile region (the regions in the
-        data where the gradient is minimal) and the higher percentile region.
+        This is accomplished obtaining the gradient along the planes, on the
+        chosen plane of the input array, from tuna.tools.get_gradient ( ); and
+        then obtaining the lower percentile region (the regions in the data
+        where the gradient is minimal) and the higher percentile region. The
+        gradient is stored in self.result['gradient'], as a 2D array.
 
         The very "middle" of each ring will consist of the pixels where the
         gradient is in the process of changing sign; and therefore, finding these
@@ -110,15 +164,14 @@ class RingsFinder(object):
         """
         if len(self.array.shape) != 3:
             self.log.info("This procedure expects a 3D numpy ndarray as input.")
-        
-        gradients = numpy.gradient(self.array)
+
+        # Only the gradient along the planes is used.
+        gradient = tuna.tools.get_gradient(self.array, axis = 0,
+                                           plane = self.chosen_plane)
         if self.plot_log:
-            tuna.tools.plot(gradients[0][self.chosen_plane],
-                            "gradients[0][{}]".format(
+            tuna.tools.plot(gradient,
+                            "gradient[{}]".format(
                                 self.chosen_plane), self.ipython)
-        self.result['gradients'] = gradients
-            
-        gradient = gradients[0][self.chosen_plane]
         self.result['gradient'] = gradient
 
         self.upper_percentile = self.find_upper_percentile(gradient)
@@ -141,12 +194,14 @@ class RingsFinder(object):
                                 lower_percentile), self.ipython)
         self.result['lower_percentile_regions'] = lower_percentile_regions
 
-        ridge = numpy.zeros(shape = gradient.shape)
-        for col in range(ridge.shape[0]):
-            for row in range(ridge.shape[1]):
-                ridge[col][row] = self.ridgeness(
-                    upper_dep_gradient, lower_percentile_regions,
-                    col, row, threshold = self.ridge_threshold)
+        # Same as calling self.ridgeness for every pixel.
+        upper_neighbours = tuna.tools.count_pixel_neighbours(
+            upper_dep_gradient, distance_threshold = 2)
+        lower_neighbours = tuna.tools.count_pixel_neighbours(
+            lower_percentile_regions, distance_threshold = 2)
+        ridge = numpy.where((upper_neighbours >= self.ridge_threshold) &
+                            (lower_neighbours >= self.ridge_threshold),
+                            1.0, 0.0)
         if self.plot_log:
             tuna.tools.plot(ridge, "ridge ", self.ipython)
         
@@ -206,8 +261,8 @@ class RingsFinder(object):
             self.log.debug("attempting to fit set {}".format(count))
 
             start = time.time()
-            minimal_point, minimal_radius = self.construct_ring_center(pixel_set)
-            self.log.debug("constructing_center took {:.1f}s".format(
+            minimal_point, minimal_radius = self.estimate_ring_center(pixel_set)
+            self.log.debug("estimating center took {:.1f}s".format(
                 time.time() - start))
             if minimal_point == None or minimal_radius == None:
                 self.log.error("Could not find center or radius.")
@@ -256,48 +311,38 @@ class RingsFinder(object):
         """
         if 'ring_fit' not in list(self.result.keys()):
             return
+        parameters = numpy.array(
+            [fit_parameters[: 3]
+             for fit_parameters in self.result['ring_fit_parameters']],
+            dtype = numpy.float64)
+        distance_threshold = min(self.result['ridge'].shape) * 0.1
+
+        # A fit matches another when both their centers and radii are closer
+        #than the threshold.
+        center_distances = numpy.hypot(
+            parameters[:, 0, None] - parameters[None, :, 0],
+            parameters[:, 1, None] - parameters[None, :, 1])
+        radius_distances = numpy.abs(parameters[:, 2, None] -
+                                     parameters[None, :, 2])
+        matches = (center_distances < distance_threshold) & \
+                  (radius_distances < distance_threshold)
+        founders = find_founders(matches)
+
+        # Each fit is aggregated to every founder it matches.
         known_centers = []
-        for pixel_set_index in range(len(self.result['ring_fit'])):
-            distance_threshold = min(
-                self.result['ring_fit'][pixel_set_index].shape[0],
-                self.result['ring_fit'][pixel_set_index].shape[1]) * 0.1
-            center_is_unknown = True
-            for structure in known_centers:
-                center = (structure[0], structure[1])
-                center_fit_index = structure[2][0]
-                distance = tuna.tools.calculate_distance(
-                    (self.result['ring_fit_parameters'][pixel_set_index][0],
-                     self.result['ring_fit_parameters'][pixel_set_index][1]),
-                    center)
-                if distance < distance_threshold:
-                    self.log.debug("ring_fit {} center close to ring_fit {} " \
-                                   "center".format (
-                                       pixel_set_index, center_fit_index))
-                    if abs(self.result['ring_fit_parameters'][pixel_set_index][2] - self.result['ring_fit_parameters'][center_fit_index][2]) < distance_threshold:
-                        self.log.debug("ring_fit {} radius similar to ring_fit "\
-                                       "{} radius".format(
-                                           pixel_set_index, center_fit_index))
-                        center_is_unknown = False
-                        structure[2].append(pixel_set_index)
-            if center_is_unknown:
-                known_centers.append(
-                    [self.result['ring_fit_parameters'][pixel_set_index][0],
-                     self.result['ring_fit_parameters'][pixel_set_index][1],
-                     [pixel_set_index]])
+        for founder in numpy.nonzero(founders)[0]:
+            members = [int(founder)] + [
+                int(index) for index in numpy.nonzero(
+                    matches[founder + 1 :, founder])[0] + founder + 1]
+            known_centers.append([float(parameters[founder][0]),
+                                  float(parameters[founder][1]),
+                                  members])
         self.log.debug("known_centers = {}".format(known_centers))
 
         rings = []
         for structure in known_centers:
-            center_col = 0
-            center_row = 0
-            radius = 0
-            for entry in structure[2]:
-                center_col += self.result['ring_fit_parameters'][entry][0]
-                center_row += self.result['ring_fit_parameters'][entry][1]
-                radius += self.result['ring_fit_parameters'][entry][2]
-            center_col /= len(structure[2])
-            center_row /= len(structure[2])
-            radius /= len(structure[2])
+            center_col, center_row, radius = numpy.mean(
+                parameters[structure[2]], axis = 0).tolist()
         
             try:
                 self.result['rings'].append(
@@ -323,68 +368,102 @@ class RingsFinder(object):
             return
         
         self.log.debug("self.result['rings'] = {}".format(self.result['rings']))
-        distance_threshold = min(self.result['ring_fit'][0].shape[0],
-                                 self.result['ring_fit'][0].shape[1]) * 0.01
-
+        distance_threshold = min(self.result['ridge'].shape) * 0.01
+
+        centers = numpy.array([(structure[0], structure[1])
+                               for structure in self.result['rings']],
+                              dtype = numpy.float64)
+        matches = numpy.hypot(centers[:, 0, None] - centers[None, :, 0],
+                              centers[:, 1, None] - centers[None, :, 1]) \
+                  < distance_threshold
+        founders = find_founders(matches)
+        founder_indices = numpy.nonzero(founders)[0]
+
+        # Each ring is aggregated to the first founder it matches.
         concentric_rings = []
-        for structure in self.result['rings']:
-            struct_center = (structure[0], structure[1])
-            struct_fits = structure[3]
-            struct_radius = structure[2]
-
-            center_is_unknown = True
-            for another in concentric_rings:
-                another_fits = another[3]
-                if another_fits[0] == struct_fits[0]:
-                    continue
-                another_center = (another[0], another[1])
-                another_radius = another[2]
-                distance = tuna.tools.calculate_distance(
-                    struct_center, another_center)
-                if distance < distance_threshold:
-                    center_is_unknown = False
-                    another[3].append(struct_fits[0])
-                    break
-                    
-            if center_is_unknown:
-                concentric_rings.append(
-                    (struct_center[0], struct_center[1],
-                     [struct_radius], [struct_fits[0]]))
+        for founder in founder_indices:
+            structure = self.result['rings'][founder]
+            concentric_rings.append((structure[0], structure[1],
+                                     [structure[2]], [structure[3][0]]))
+        for index in numpy.nonzero(~ founders)[0]:
+            first_match = numpy.argmax(matches[index, founder_indices])
+            concentric_rings[first_match][3].append(
+                self.result['rings'][index][3][0])
         self.log.debug("concentric_rings = {}".format(concentric_rings))
 
         # select best structure (with the most rings, with the most pixels )
-        max_num = 0
-        max_structure = None
-        for structure in concentric_rings:
-            num_fits = len(structure[3])
-            if num_fits > max_num:
-                max_num = num_fits
-                max_structure = structure
+        max_structure = concentric_rings[numpy.argmax(
+            [len(structure[3]) for structure in concentric_rings])]
         self.log.debug("max_structure = {}".format(max_structure))
 
         # generate averaged result
-        averaged_col = 0
-        averaged_row = 0
-        averaged_num = 0
-        radii = []
-        sets = []
-        for index in max_structure[3]:
-            averaged_col += self.result['ring_fit_parameters'][index][0]
-            averaged_row += self.result['ring_fit_parameters'][index][1]
-            averaged_num += 1
-            radii.append(self.result['ring_fit_parameters'][index][2])
-            sets.append(index)
-        averaged_col /= averaged_num
-        averaged_row /= averaged_num
+        parameters = numpy.array(
+            [self.result['ring_fit_parameters'][index][: 3]
+             for index in max_structure[3]], dtype = numpy.float64)
+        averaged_col, averaged_row = numpy.mean(parameters[:, : 2],
+                                                axis = 0).tolist()
+        radii = parameters[:, 2].tolist()
+        sets = list(max_structure[3])
         averaged_concentric_rings = ((averaged_col, averaged_row), radii, sets)
         
         self.log.debug("averaged_concentric_rings = {}".format(
             averaged_concentric_rings))
         self.result['concentric_rings'] = averaged_concentric_rings
  
+    def estimate_ring_center(self, pixel_set):
+        """Estimate the center and radius of the circle that best fits the curve
+        contained in the pixel_set, using the current construction_method.
+
+        Except for the "geometric" method, the construction stored in
+        self.result['construction'] is a copy of the pixel_set where the
+        neighbours of the estimated center are marked.
+
+        Parameters:
+
+        * pixel_set : numpy.ndarray
+            Bidimensional array, where each pixel has either a 0 or a 1 as value.
+
+        Returns:
+
+        * center : tuple of 2 floats
+            Containing the column and row "coordinates" for the center.
+
+        * radius : float 
+            The radius of this center.
+        """
+        if self.construction_method == "geometric":
+            return self.construct_ring_center(pixel_set)
+
+        cols, rows = numpy.nonzero(pixel_set == 1)
+        if self.construction_method == "ransac":
+            center_col, center_row, radius = fit_circle_ransac(cols, rows)
+        else:
+            center_col, center_row, radius = fit_circle_algebraic(cols, rows)
+        if radius == None:
+            self.log.error("Could not fit a circle to the pixel set.")
+            return None, None
+        center = (center_col, center_row)
+
+        construction = numpy.copy(pixel_set)
+        color = 2
+        center_pixel = (int(round(center_col)), int(round(center_row)))
+        if (0 <= center_pixel[0] < pixel_set.shape[0] and
+            0 <= center_pixel[1] < pixel_set.shape[1]):
+            for neighbour in tuna.tools.get_pixel_neighbours(center_pixel,
+                                                             construction):
+                construction[neighbour[0]][neighbour[1]] = color
+        try:
+            self.result['construction'].append(construction)
+        except KeyError:
+            self.result['construction'] = [construction]
+
+        return center, radius
+
     def construct_ring_center(self, pixel_set):
         """Estimate the center and radius of a circle that is osculatory to the
-        curve contained in the pixel_set.
+        curve contained in the pixel_set, through a geometric construction with
+        chords. This is slow, and is used only when the construction_method is
+        "geometric", to debug the estimation.
         
         Parameters:
 
@@ -570,7 +649,7 @@ class RingsFinder(object):
     
     def find_max_pair(self, pixel_set):
         """Find the two pixels in the input set that are maximally distant to
-        each other.
+        each other, with tuna.tools.find_farthest_pair ( ).
 
         Parameters:
 
@@ -583,31 +662,15 @@ class RingsFinder(object):
         * max_pair : tuple of 2 tuples, of 2 integers each
             Contains the coordinates of the two points maximally distant.
         """
-        pixels = []
-        for col in range(pixel_set.shape[0]):
-            for row in range(pixel_set.shape[1]):
-                if pixel_set[col][row] == 1:
-                    pixels.append((col, row))
-        self.log.debug("pixels list populated with {} pixels".format(len(pixels)))
-
-        if len(pixels) > 5000:
-            old_pixels = copy.copy(pixels)
-            pixels = []
-            for count in range(5000):
-                index = random.randint(0, len(old_pixels) - 1)
-                pixels.append(old_pixels[index])
-            self.log.debug("pixels list downgraded to {} pixels.".format(
-                len(pixels)))
-        
-        max_distance = 0
-        max_pair = None
-        for pixel in pixels:
-            for other in pixels:
-                distance = tuna.tools.calculate_distance(pixel, other)
-                if distance >= max_distance:
-                    max_distance = distance
-                    max_pair = (pixel, other)
-        return max_pair
+        cols, rows = numpy.nonzero(pixel_set == 1)
+        self.log.debug("pixels list populated with {} pixels".format(cols.size))
+
+        farthest_pair = tuna.tools.find_farthest_pair(cols, rows)
+        if farthest_pair == None:
+            return None
+        first, second = farthest_pair
+        return ((int(cols[first]), int(rows[first])),
+                (int(cols[second]), int(rows[second])))
         
     def find_upper_percentile(self, gradient):
         """Tries to find the maximum percentile that contains at least 10 % of
@@ -667,54 +730,28 @@ class RingsFinder(object):
         current self.result [ 'ridge' ] array.
         """
         array = self.result['ridge']
-        visited = numpy.zeros(shape = array.shape)
-        connected_pixels_sets = []
-        for col in range(array.shape[0]):
-            for row in range(array.shape[1]):
-                if visited[col][row] == 1:
-                    continue
-                if array[col][row] == 1:
-                    to_visit = [(col, row)]
-                    region = []
-                    while (len(to_visit) > 0):
-                        here = to_visit.pop()
-                        visited[here[0]][here[1]] = 1
-                        region.append(here)
-                        neighbours = tuna.tools.get_pixel_neighbours(here, array)
-                        for neighbour in neighbours:
-                            if visited[neighbour[0]][neighbour[1]] == 1:
-                                continue
-                            if array[neighbour[0]][neighbour[1]] == 0:
-                                continue
-                            to_visit.append(neighbour)
-                    connected_pixels_sets.append(region)
-
-        self.log.debug("len connected_pixels_sets = {}".format(
-            len(connected_pixels_sets)))
+        labels, counts, bounding_boxes = tuna.tools.label_connected_components(
+            array)
+        number_of_sets = len(counts) - 1
+
+        self.log.debug("len connected_pixels_sets = {}".format(number_of_sets))
 
         shape_len = array.shape[0] * array.shape[1]
         min_len = math.ceil(array.shape[0] * array.shape[1] * 0.1)
         min_threshold = math.ceil(array.shape[0] * array.shape[1] * 0.001)
-        ring_pixel_sets = []
-        old_len = 0
-        while (len(ring_pixel_sets) < len(connected_pixels_sets)):
+        selected_labels = []
+        while (len(selected_labels) < number_of_sets):
             min_len *= 0.9
             self.log.debug("min_len for a pixel set = {:.0f}".format(min_len))
             if min_len < min_threshold:
                 self.log.debug("min_len below min_threshold")
                 break
-            ring_pixel_sets = []
-            for pixels_set in connected_pixels_sets:
-                if len(pixels_set) < min_len:
-                    continue
-                set_array = numpy.zeros(shape = array.shape)
-                for pixel in pixels_set:
-                    set_array[pixel[0]][pixel[1]] = 1
-                ring_pixel_sets.append(set_array)
-            if len(ring_pixel_sets) == len(connected_pixels_sets):
+            selected_labels = list(numpy.nonzero(counts >= min_len)[0])
+            if len(selected_labels) == number_of_sets:
                 break
 
-        ring_pixel_sets = self.remove_lumped_pixel_sets(ring_pixel_sets)
+        ring_pixel_sets = self.remove_lumped_pixel_sets(labels,
+                                                        selected_labels)
             
         self.result['ring_pixel_sets'] = ring_pixel_sets
         self.log.debug("{} rings found.".format(
@@ -726,52 +763,395 @@ class RingsFinder(object):
                                 "pixel_set {}".format(count), self.ipython)
                 count += 1
 
-    def remove_lumped_pixel_sets(self, pixel_sets):
+    def remove_lumped_pixel_sets(self, labels, selected_labels):
         """For some cubes, in some planes, the central region has many pixels
         that do not belong to a ring, but are identified as part of the ridge.
         This is possibly due to a "nascent" ring in that plane.
         This function identifies such regions and removes them from the returned
         set.
 
+        A ring or arc should have, in each column, either one * thickness or two
+        * thickness pixels; the ratio of good columns and the thickness of every
+        set are obtained at once from ring_statistics ( ).
+
         Parameters:
 
-        * pixel_sets : list of numpy.ndarrays
-            Containing disjoint pixel sets.
+        * labels : numpy.ndarray
+            The label image of the disjoint pixel sets, as produced by
+            tuna.tools.label_connected_components ( ).
+
+        * selected_labels : list of integers
+            The labels of the sets to be tested.
+
+        Returns:
+
+        * list of tuples
+            Each containing a pixel set (with value 1 in the pixels of the set,
+            and 0 elsewhere) and its average thickness.
         """
+        statistics = ring_statistics(labels)
 
         result = [ ]
-        for pixel_set in pixel_sets:
-            # test: each column and row should have either none, one * thickness
-            #or two * thickness pixels in the set.
-            num_good_cols = 0
-            num_cols = 0
-            latest_thickness = 0
-            average_thickness = 0
-            for col in range(pixel_set.shape[0]):
-                per_col_pixels = (numpy.sum(pixel_set[col]))
-                if per_col_pixels == 0:
-                    continue
-                num_cols += 1
-                if latest_thickness == 0:
-                    num_good_cols += 1
-                    latest_thickness = per_col_pixels
-                    continue
-                ratio = round(latest_thickness / per_col_pixels)
-                latest_thickness = per_col_pixels
-                average_thickness += latest_thickness
-                if ratio == 0.5 or ratio == 1 or ratio == 2:
-                    num_good_cols +=1
-                    continue
-            good_cols_ratio = num_good_cols / num_cols
-            average_thickness /= num_good_cols * 4
+        for label in selected_labels:
+            good_cols_ratio = statistics['good_cols_ratio'][label]
+            average_thickness = statistics['thickness'][label]
             self.log.debug("good_cols_ratio = {:.2f}".format(good_cols_ratio))
             self.log.debug("average_thickness = {:.2f}".format(average_thickness))
+            self.log.debug("centroid = ({:.1f}, {:.1f})".format(
+                *statistics['centroids'][label]))
             if good_cols_ratio > 0.9:
                 self.log.debug("pixel set probably contains a circle or arc.")
-                result.append((pixel_set, average_thickness))
-                continue              
+                result.append((numpy.where(labels == label, 1.0, 0.0),
+                               average_thickness))
         return result
             
+class PlaneSearch(object):
+    """This class' responsibility is to find the plane of a data cube that best
+    displays its rings, and the rings in that plane.
+
+    The planes are first scored by the fraction of their pixels that are in the
+    ridge found by RingsFinder.segment ( ), which is cheap, and then fully
+    evaluated by RingsFinder.execute ( ), from the best scored plane onwards.
+    The evaluations are done by a pool of worker processes, which read the
+    cube from shared memory; the results are considered in the order of
+    the scores, and the search stops at the first plane that is accepted.
+
+    A plane is accepted when it has at least min_rings concentric rings, and
+    its ring pixel sets cover more than 10% of the array. When no plane is
+    accepted, the result is the best one found, according to better_than ( ).
+
+    Its constructor expects the following parameters:
+
+    * array : numpy.ndarray
+        Containing the data where ring structures are to be found.
+
+    * min_rings : integer
+        The minimal number of rings for a plane to be accepted.
+
+    * planes : list of integers
+        The indices of the planes to be searched.
+
+    * ipython : object
+        A reference to a ipython object, so plots produced by this module won't
+        suppress previous plots.
+
+    * plot_log : boolean
+        If set to True, will spawn plots of intermediary products, as they are
+        produced. The planes are then evaluated in this process.
+
+    * workers : integer : None
+        The number of worker processes. If None, one per CPU is used; if 1, the
+        planes are evaluated in this process, which is also the case when
+        shared memory is not available (Python < 3.8).
+    """
+    def __init__(self, array, min_rings, planes, ipython, plot_log,
+                 workers = None):
+        self.log = logging.getLogger(__name__)
+        self.log.setLevel(logging.INFO)
+
+        self.array = array
+        self.min_rings = min_rings
+        self.planes = list(planes)
+        self.ipython = ipython
+        self.plot_log = plot_log
+        self.workers = workers
+        if self.workers == None:
+            self.workers = multiprocessing.cpu_count()
+        if self.plot_log or shared_memory is None:
+            self.workers = 1
+
+        self.scores = {}
+        self.accepted = False
+        self.result = None
+
+    def execute(self):
+        """Score the planes, then evaluate them until one is accepted.
+        """
+        start = time.time()
+        if self.planes == []:
+            return
+
+        if self.workers == 1 or len(self.planes) == 1:
+            for plane in self.planes:
+                finder = RingsFinder(self.array, plane, None, False)
+                finder.segment()
+                self.scores[plane] = numpy.mean(finder.result['ridge'])
+            for plane in self.ranked_planes():
+                finder = RingsFinder(self.array, plane, self.ipython,
+                                     self.plot_log)
+                finder.execute()
+                if self.consider(plane, finder.result):
+                    break
+        else:
+            self.search_in_workers()
+
+        self.log.debug("Plane search took {:.1f}s.".format(time.time() - start))
+
+    def search_in_workers(self):
+        """Copy the cube into shared memory, and score and evaluate the planes
+        in a process pool. Leaving the pool terminates the evaluations that are
+        still running after a plane is accepted.
+        """
+        cube_memory = shared_memory.SharedMemory(create = True,
+                                                 size = self.array.nbytes)
+        try:
+            cube = numpy.ndarray(shape = self.array.shape,
+                                 dtype = self.array.dtype,
+                                 buffer = cube_memory.buf)
+            cube[:] = self.array
+            del(cube)
+            with multiprocessing.Pool(
+                    processes = min(self.workers, len(self.planes)),
+                    initializer = attach_shared_cube,
+                    initargs = (cube_memory.name, self.array.shape,
+                                self.array.dtype.str)) as pool:
+                self.scores = dict(zip(self.planes,
+                                       pool.map(score_plane, self.planes)))
+                for plane, result in pool.imap(evaluate_plane,
+                                               self.ranked_planes()):
+                    if self.consider(plane, result):
+                        break
+        finally:
+            cube_memory.close()
+            cube_memory.unlink()
+
+    def ranked_planes(self):
+        """Return the planes sorted by decreasing score; planes with the same
+        score keep their original order.
+
+        Returns:
+
+        * list of integers
+        """
+        for plane in self.planes:
+            self.log.debug("Plane {} has a ridge coverage of {:.3f}.".format(
+                plane, self.scores[plane]))
+        return sorted(self.planes, key = lambda plane: - self.scores[plane])
+
+    def consider(self, plane, result):
+        """Keep the input result if it is accepted, or if it is better than the
+        best result so far.
+
+        Parameters:
+
+        * plane : integer
+            The index of the plane that originated the result.
+
+        * result : dictionary
+            The result of RingsFinder.execute ( ) for that plane.
+
+        Returns:
+
+        * boolean
+            True if the result is accepted, and the search should stop.
+        """
+        self.log.info("Searching for concentric rings in plane {}.".format(
+            plane))
+        if 'concentric_rings' not in list(result.keys()):
+            self.log.warning("No concentric rings on plane {}.".format(plane))
+            return False
+        self.log.debug("concentric_rings[1] = {}".format(
+            result['concentric_rings'][1]))
+        if len(result['concentric_rings'][1]) >= self.min_rings:
+            # check if pixel_sets are large
+            percentage_pixels_in_ring = 0
+            for pixel_set in result["ring_pixel_sets"]:
+                percentage_pixels_in_ring += numpy.sum(pixel_set[0])
+            percentage_pixels_in_ring /= (self.array.shape[0] *
+                                          self.array.shape[1])
+            percentage_pixels_in_ring *= 100
+            self.log.info("Ring structure obtained from plane where borders " \
+                          "occupy {}% of the array.".format(
+                              int(percentage_pixels_in_ring)))
+            if percentage_pixels_in_ring > 10:
+                self.accepted = True
+                self.result = result
+                return True
+        if self.result == None or self.better_than(result, self.result):
+            self.result = result
+            self.log.info("Ring structure in plane {} is the best so far ({} " \
+                          "rings).".format(
+                              plane, len(result["concentric_rings"][1])))
+        return False
+
+    def better_than(self, result, best_so_far):
+        """Compare two results: the one with more rings is better; with the same
+        number of rings (at least 2), the one whose first two centers are
+        closer is better.
+
+        Parameters:
+
+        * result : dictionary
+
+        * best_so_far : dictionary
+
+        Returns:
+
+        * boolean
+            True if result is better than best_so_far.
+        """
+        if len(result['concentric_rings'][1]) > len(
+                best_so_far['concentric_rings'][1]):
+            return True
+        if len(result["concentric_rings"][1]) > 1 and \
+           len(best_so_far["concentric_rings"][1]) > 1:
+            best_distance = tuna.tools.calculate_distance(
+                best_so_far["concentric_rings"][0],
+                best_so_far["concentric_rings"][1])
+            this_distance = tuna.tools.calculate_distance(
+                result["concentric_rings"][0],
+                result["concentric_rings"][1])
+            self.log.info("Distance between first 2 centers: {}.".format(
+                this_distance))
+            return this_distance < best_distance
+        return False
+
+# Shared memory block and cube attached by each PlaneSearch worker.
+plane_search_arrays = {}
+
+def attach_shared_cube(cube_name, cube_shape, cube_dtype):
+    """Attach the current worker process to the shared memory block created by
+    PlaneSearch, and store a view of the cube in plane_search_arrays.
+
+    Parameters:
+
+    * cube_name : string
+        The name of the shared memory block containing the cube.
+
+    * cube_shape : tuple of 3 integers
+
+    * cube_dtype : string
+        The numpy dtype string of the cube.
+    """
+    plane_search_arrays['cube_memory'] = shared_memory.SharedMemory(
+        name = cube_name)
+    plane_search_arrays['cube'] = numpy.ndarray(
+        shape = cube_shape, dtype = numpy.dtype(cube_dtype),
+        buffer = plane_search_arrays['cube_memory'].buf)
+
+def score_plane(plane):
+    """Compute the fraction of the pixels of a plane of the shared cube that
+    are in its ridge.
+
+    Parameters:
+
+    * plane : integer
+
+    Returns:
+
+    * float
+    """
+    finder = RingsFinder(plane_search_arrays['cube'], plane, None, False)
+    finder.segment()
+    return numpy.mean(finder.result['ridge'])
+
+def evaluate_plane(plane):
+    """Find the rings of a plane of the shared cube.
+
+    Parameters:
+
+    * plane : integer
+
+    Returns:
+
+    * plane : integer
+
+    * result : dictionary
+        The result of RingsFinder.execute ( ).
+    """
+    finder = RingsFinder(plane_search_arrays['cube'], plane, None, False)
+    finder.execute()
+    return plane, finder.result
+
+def find_founders(matches):
+    """Find the founders of the clusters of a set of items, where items are
+    clustered in order: each item that does not match an earlier founder is
+    itself a founder.
+
+    Parameters:
+
+    * matches : numpy.ndarray
+        A square matrix of booleans, where matches[i][j] indicates whether item
+        i matches item j.
+
+    Returns:
+
+    * numpy.ndarray
+        Of booleans, True for the founders.
+    """
+    founders = numpy.zeros(shape = matches.shape[0], dtype = bool)
+    for index in range(matches.shape[0]):
+        founders[index] = not numpy.any(matches[index, : index] &
+                                        founders[: index])
+    return founders
+
+def ring_statistics(labels):
+    """Compute statistics of all the pixel sets of a label image in one pass,
+    with numpy.bincount.
+
+    Scanning each set column by column, a column is good if it is the first
+    one with pixels of that set, or if the number of pixels in the previous
+    column with pixels, divided by its own, rounds to 1 or 2.
+
+    Parameters:
+
+    * labels : numpy.ndarray
+        The label image, as produced by tuna.tools.label_connected_components,
+        where 0 is the background.
+
+    Returns:
+
+    * dict
+        With the following keys, each indexed by label:
+
+        * 'column_counts' : 2D numpy.ndarray with the number of pixels of each
+            set in each column.
+        * 'good_cols_ratio' : numpy.ndarray with the fraction of the columns
+            with pixels of each set that are good.
+        * 'thickness' : numpy.ndarray with the sum of the pixels of each set in
+            its columns except the first, divided by 4 times its good columns.
+        * 'centroids' : numpy.ndarray with the mean column and row of each set.
+    """
+    number_of_labels = int(numpy.amax(labels)) + 1 if labels.size else 1
+    cols, rows = numpy.indices(labels.shape)
+    flat_labels = labels.ravel()
+
+    counts = numpy.bincount(flat_labels, minlength = number_of_labels)
+    column_counts = numpy.bincount(
+        flat_labels * labels.shape[0] + cols.ravel(),
+        minlength = number_of_labels * labels.shape[0]).reshape(
+            (number_of_labels, labels.shape[0]))
+    column_counts[0] = 0
+
+    # The occupied columns of each set, in order.
+    set_labels, set_cols = numpy.nonzero(column_counts)
+    per_col_pixels = column_counts[set_labels, set_cols].astype(numpy.float64)
+    first = numpy.ones(shape = set_labels.shape, dtype = bool)
+    first[1 :] = set_labels[1 :] != set_labels[: -1]
+    ratios = numpy.ones(shape = per_col_pixels.shape)
+    ratios[1 :] = numpy.round(per_col_pixels[: -1] / per_col_pixels[1 :])
+    good = first | (ratios == 1) | (ratios == 2)
+
+    num_cols = numpy.bincount(set_labels, minlength = number_of_labels)
+    num_good_cols = numpy.bincount(set_labels, weights = good,
+                                   minlength = number_of_labels)
+    thickness = numpy.bincount(set_labels,
+                               weights = numpy.where(first, 0, per_col_pixels),
+                               minlength = number_of_labels)
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        good_cols_ratio = num_good_cols / num_cols
+        thickness /= num_good_cols * 4
+        centroids = numpy.column_stack((
+            numpy.bincount(flat_labels, weights = cols.ravel(),
+                           minlength = number_of_labels) / counts,
+            numpy.bincount(flat_labels, weights = rows.ravel(),
+                           minlength = number_of_labels) / counts))
+
+    return {'column_counts': column_counts,
+            'good_cols_ratio': good_cols_ratio,
+            'thickness': thickness,
+            'centroids': centroids}
+
 def circle(center, radius, thickness, shape):
     """Generate an array with the value 1 for every pixel that is "thickness"
     distant to a circle with the input radius and center.
@@ -794,16 +1174,71 @@ def circle(center, radius, thickness, shape):
     log = logging.getLogger(__name__)
     log.debug("center = ({:.5f}, {:.5f}), radius = {:.5f}".format (
         center[0], center[1], radius, shape))
-    
+
+    cols, rows = numpy.ogrid[0 : shape[0], 0 : shape[1]]
+    center_distances = numpy.sqrt((center[0] - cols)**2 + (center[1] - rows)**2)
     distances = numpy.zeros(shape = shape)
-    for col in range(shape[0]):
-        for row in range(shape[1]):
-            center_distance = tuna.tools.calculate_distance(center, (col, row))
-            if abs(center_distance - radius) <= thickness:
-                distances[col][row] = 1
+    distances[numpy.abs(center_distances - radius) <= thickness] = 1
 
     return distances
 
+def radial_residuals(p, cols, rows):
+    """Compute the signed distances of a set of points to a circle, which are
+    the residuals minimized by fit_circle ( ) in its "radial" method.
+
+    Parameters:
+
+    * p : tuple of 3 floats
+        The column and row coordinates of the center, and the radius.
+
+    * cols : numpy.ndarray
+        The column coordinates of the points.
+
+    * rows : numpy.ndarray
+        The row coordinates of the points.
+
+    Returns:
+
+    * numpy.ndarray
+        With the distance of each point to the center, minus the radius.
+    """
+    center_col, center_row, radius = p
+    return numpy.hypot(cols - center_col, rows - center_row) - radius
+
+def radial_jacobian(p, cols, rows):
+    """Compute the analytic Jacobian of radial_residuals ( ), with respect to
+    the parameters of the circle.
+
+    Parameters:
+
+    * p : tuple of 3 floats
+        The column and row coordinates of the center, and the radius.
+
+    * cols : numpy.ndarray
+        The column coordinates of the points.
+
+    * rows : numpy.ndarray
+        The row coordinates of the points.
+
+    Returns:
+
+    * numpy.ndarray
+        With one line per point, and one column per parameter.
+    """
+    center_col, center_row, radius = p
+    col_distances = cols - center_col
+    row_distances = rows - center_row
+    distances = numpy.hypot(col_distances, row_distances)
+    # The derivative with respect to the center is undefined for a point at the
+    #center; with an infinite distance, that point contributes no derivative
+    #with respect to the center, only with respect to the radius.
+    distances[distances == 0] = numpy.inf
+    jacobian = numpy.empty(shape = (cols.size, 3))
+    jacobian[:, 0] = - col_distances / distances
+    jacobian[:, 1] = - row_distances / distances
+    jacobian[:, 2] = -1
+    return jacobian
+
 def least_circle(p, args):
     """Wrap around a call to the function circle, so that it is called according
     to mpyfit's API.
@@ -842,10 +1277,198 @@ def least_circle(p, args):
     log.debug("residue = %f" % numpy.sum(numpy.abs(residue)))
     return (residue.flatten())
 
+def fit_circle_algebraic(cols, rows, method = "taubin"):
+    """Fit a circle to a set of points in a single linear solve, minimizing an
+    algebraic distance instead of the geometric one.
+
+    The coordinates are centered on their mean before the solve. The "taubin"
+    method obtains the circle from the singular value decomposition of the
+    normalized moments of the points, and has a negligible bias even for short
+    arcs; the "kasa" method solves the linear least squares problem
+
+        (x - a)² + (y - b)² = r²  <=>  2ax + 2by + c = x² + y²
+
+    and tends to underestimate the radius of short arcs.
+
+    Parameters:
+
+    * cols : numpy.ndarray
+        The column coordinates of the points.
+
+    * rows : numpy.ndarray
+        The row coordinates of the points.
+
+    * method : string : "taubin"
+        Either "taubin" or "kasa".
+
+    Returns:
+
+    * center_col : float
+
+    * center_row : float
+
+    * radius : float
+        All three are None when there are less than 3 points, or if they are
+        collinear.
+    """
+    cols = numpy.asarray(cols, dtype = numpy.float64).ravel()
+    rows = numpy.asarray(rows, dtype = numpy.float64).ravel()
+    if cols.size < 3:
+        return None, None, None
+
+    mean_col = numpy.mean(cols)
+    mean_row = numpy.mean(rows)
+    x = cols - mean_col
+    y = rows - mean_row
+    z = x * x + y * y
+
+    if method == "kasa":
+        design = numpy.column_stack((2 * x, 2 * y, numpy.ones(x.size)))
+        solution, residues, rank, singular = numpy.linalg.lstsq(
+            design, z, rcond = None)
+        if rank < 3:
+            return None, None, None
+        a, b, c = solution
+        return (float(mean_col + a), float(mean_row + b),
+                math.sqrt(max(c + a * a + b * b, 0)))
+
+    z_mean = numpy.mean(z)
+    if z_mean <= 0:
+        return None, None, None
+    z_scale = 2 * math.sqrt(z_mean)
+    moments = numpy.column_stack(((z - z_mean) / z_scale, x, y))
+    singular_vectors = numpy.linalg.svd(moments, full_matrices = False)[2]
+    a0, a1, a2 = singular_vectors[-1]
+    a0 /= z_scale
+    # Lines (collinear points) are the circles with a0 == 0.
+    if abs(a0) < 1e-12 * math.sqrt(a1 * a1 + a2 * a2):
+        return None, None, None
+    a3 = - z_mean * a0
+    return (float(mean_col - a1 / (2 * a0)),
+            float(mean_row - a2 / (2 * a0)),
+            math.sqrt(a1 * a1 + a2 * a2 - 4 * a0 * a3) / (2 * abs(a0)))
+
+def fit_circle_ransac(cols, rows, iterations = 200, tolerance = 2,
+                      seed = 0, max_refits = 10):
+    """Fit a circle to a set of points that may contain outliers, such as an
+    arc with spurious pixels.
+
+    A candidate circle is built through each of "iterations" random triplets of
+    points, and the candidate with the least median distance to the points is
+    kept, as in the least median of squares method; therefore, more than half
+    of the points must be on the circle. The circle is then refitted with
+    fit_circle_algebraic ( ) using only the points within 3 robust standard
+    deviations (obtained from the median distance) of it, and at most
+    "tolerance"; the inliers are selected again around each refitted circle,
+    until they no longer change. The random triplets are drawn from a generator
+    with a fixed seed, so that the result is reproducible.
+
+    Parameters:
+
+    * cols : numpy.ndarray
+        The column coordinates of the points.
+
+    * rows : numpy.ndarray
+        The row coordinates of the points.
+
+    * iterations : integer : 200
+        The number of random triplets to be tried.
+
+    * tolerance : float : 2
+        The maximal distance, in pixels, between a point and the circle for that
+        point to be used in the refit.
+
+    * seed : integer : 0
+        The seed for the random triplets.
+
+    * max_refits : integer : 10
+        The maximal number of times the inliers are selected and refitted.
+
+    Returns:
+
+    * center_col : float
+
+    * center_row : float
+
+    * radius : float
+        All three are None when no circle could be fitted.
+    """
+    cols = numpy.asarray(cols, dtype = numpy.float64).ravel()
+    rows = numpy.asarray(rows, dtype = numpy.float64).ravel()
+    if cols.size < 3:
+        return None, None, None
+
+    generator = numpy.random.RandomState(seed)
+    triplets = generator.randint(0, cols.size, size = (iterations, 3))
+
+    # Circumcircles of all triplets at once; triplets with repeated or collinear
+    #points have no circumcircle, and are discarded.
+    x = cols[triplets]
+    y = rows[triplets]
+    x1, x2 = x[:, 1] - x[:, 0], x[:, 2] - x[:, 0]
+    y1, y2 = y[:, 1] - y[:, 0], y[:, 2] - y[:, 0]
+    determinant = 2 * (x1 * y2 - x2 * y1)
+    valid = numpy.abs(determinant) > 1e-9
+    if not numpy.any(valid):
+        return fit_circle_algebraic(cols, rows)
+    x1, x2, y1, y2 = x1[valid], x2[valid], y1[valid], y2[valid]
+    determinant = determinant[valid]
+    squares_1 = x1 * x1 + y1 * y1
+    squares_2 = x2 * x2 + y2 * y2
+    center_cols = x[valid, 0] + (y2 * squares_1 - y1 * squares_2) / determinant
+    center_rows = y[valid, 0] + (x1 * squares_2 - x2 * squares_1) / determinant
+    radii = numpy.hypot(center_cols - x[valid, 0], center_rows - y[valid, 0])
+
+    # Along a short arc, circles that are slightly off it still have most of
+    #its points within tolerance, and may gather more outliers than the right
+    #one. So, instead of counting the inliers, each candidate is scored by the
+    #median of its residuals, which is only small for a circle that fits the
+    #majority of the points.
+    medians = numpy.zeros(shape = center_cols.shape)
+    for candidate in range(center_cols.size):
+        distances = numpy.hypot(cols - center_cols[candidate],
+                                rows - center_rows[candidate])
+        medians[candidate] = numpy.median(numpy.abs(distances
+                                                    - radii[candidate]))
+    best = numpy.argmin(medians)
+
+    # Outliers near the best candidate would pull the refit away from the arc,
+    #so the inliers are selected within 3 robust standard deviations of the
+    #residuals (but never beyond tolerance), again around each refitted circle,
+    #until they no longer change.
+    center_col, center_row, radius = center_cols[best], center_rows[best], \
+                                     radii[best]
+    threshold = min(tolerance, 3 * 1.4826 * medians[best])
+    inliers = None
+    for refit in range(max_refits):
+        residuals = numpy.abs(numpy.hypot(cols - center_col,
+                                          rows - center_row) - radius)
+        selection = residuals <= threshold
+        if numpy.count_nonzero(selection) < 3:
+            break
+        if inliers is not None and numpy.array_equal(selection, inliers):
+            break
+        inliers = selection
+        fit = fit_circle_algebraic(cols[inliers], rows[inliers])
+        if fit[0] is None:
+            break
+        center_col, center_row, radius = fit
+        residuals = numpy.abs(numpy.hypot(cols[inliers] - center_col,
+                                          rows[inliers] - center_row) - radius)
+        threshold = min(tolerance, 3 * 1.4826 * numpy.median(residuals))
+    return center_col, center_row, radius
+
 def fit_circle(center_col, center_row, radius, data, function,
-               ridge_thickness = 1):
+               ridge_thickness = 1, method = "radial"):
     """Fit a circle to the input data.
 
+    In the "radial" method, the residuals are the distances of the pixels of
+    the ring (the pixels of data with value 1) to the candidate circle, and
+    scipy.optimize.least_squares is given their analytic Jacobian; the ridge
+    thickness is not fitted. In the "image" method, mpyfit minimizes the
+    difference between data and the ring rendered by function, for every pixel
+    of the image, which is much slower.
+
     Parameters:
 
     * center_col : float 
@@ -863,6 +1486,18 @@ def fit_circle(center_col, center_row, radius, data, function,
 
     * ridge_thickness : float : 1
         The thickness of the ring to be fitted to the data.
+
+    * method : string : "radial"
+        Either "radial" or "image".
+
+    Returns:
+
+    * fit_parameters : list of 4 floats
+        The column and row coordinates of the center, the radius, and the ridge
+        thickness.
+
+    * numpy.ndarray
+        The ring rendered by function, using the fitted parameters.
     """
     log = logging.getLogger(__name__)
 
@@ -870,6 +1505,26 @@ def fit_circle(center_col, center_row, radius, data, function,
                   float(center_row),
                   float(radius),
                   float(ridge_thickness))
+
+    if method == "radial":
+        cols, rows = numpy.nonzero(data == 1)
+        fit_parameters = list(parameters)
+        if cols.size >= 3:
+            log.debug("fit_circle input parameters = {}".format(parameters))
+            fit_result = scipy.optimize.least_squares(
+                radial_residuals,
+                parameters[: 3],
+                jac = radial_jacobian,
+                args = (cols.astype(numpy.float64),
+                        rows.astype(numpy.float64)),
+                method = "lm")
+            log.debug("fit_circle result = {}".format(fit_result.message))
+            fit_parameters[: 3] = [float(value) for value in fit_result.x]
+        else:
+            log.warning("Not enough pixels to fit a circle.")
+        return fit_parameters, function(
+            (fit_parameters[0], fit_parameters[1]), fit_parameters[2],
+            ridge_thickness, data.shape)
     
     # Constraints on parameters
     parinfo = []
@@ -925,8 +1580,9 @@ def find_rings(data: numpy.ndarray,
 
     * plane : integer : None
         This is the index in the cube for the spectrograph whose rings the user
-        wants. If no plane is specified, all planes will be search (from 0
-        onwards) until at least two rings are found in a plane.
+        wants. If no plane is specified, all planes will be searched (from the
+        one with the largest ridge, onwards) until at least min_rings rings are
+        found in a plane.
 
     * ipython : object : None
         Contains a reference to the ipython object, in case it exists.
@@ -974,61 +1630,13 @@ def find_rings(data: numpy.ndarray,
     else:
         # no plane was specified
         list_of_planes = range(effective_array.shape[0])
-    
-    best_so_far = None
-    for effective_plane in list_of_planes:
-        log.info("Searching for concentric rings in plane {}.".format(
-            effective_plane))
-        finder = rings_finder(
-            effective_array, effective_plane, ipython, plot_log)
-        finder.execute()
-        if 'concentric_rings' not in list(finder.result.keys()):
-            log.warning("No concentric rings on plane {}.".format(
-                effective_plane))
-            continue
-        log.debug("concentric_rings[1] = {}".format(
-            finder.result['concentric_rings'][1]))
-        if len(finder.result['concentric_rings'][1]) >= min_rings:
-            # check if pixel_sets are large
-            percentage_pixels_in_ring = 0
-            for pixel_set in finder.result["ring_pixel_sets"]:
-                percentage_pixels_in_ring += numpy.sum(pixel_set[0])
-            percentage_pixels_in_ring /= (data.shape[0] * data.shape[1])
-            percentage_pixels_in_ring *= 100
-            log.info("Ring structure obtained from plane where borders occupy " \
-                     "{}% of the array.".format(int(percentage_pixels_in_ring)))
-            if percentage_pixels_in_ring > 10:
-                return finder.result
-        if best_so_far == None:
-            best_so_far = finder.result
-            log.info("Ring structure in plane {} is the best so far ({} rings)."\
-                     .format(effective_plane,
-                             len(finder.result["concentric_rings"][1])))
-        else:
-            if len(finder.result['concentric_rings'][1]) > len(
-                    best_so_far['concentric_rings'][1]):
-                best_so_far = finder.result
-                log.info("Ring structure in plane {} is the best so far ({} " \
-                         "rings).".format(
-                             effective_plane,
-                             len(finder.result["concentric_rings"][1])))
-            else:
-                if len(finder.result["concentric_rings"][1]) > 1 and \
-                   len(best_so_far["concentric_rings"][1]) > 1:
-                    best_distance = tuna.tools.calculate_distance(
-                        best_so_far["concentric_rings"][0],
-                        best_so_far["concentric_rings"][1])
-                    this_distance = tuna.tools.calculate_distance(
-                        finder.result["concentric_rings"][0],
-                        finder.result["concentric_rings"][1])
-                    log.info("Distance between first 2 centers: {}.".format(
-                        this_distance))
-                    if this_distance < best_distance:
-                        best_so_far = finder.result
-                        log.info("Ring structure in plane {} is the best so far"\
-                                 " ({} rings).".format(
-                                     effective_plane,
-                                     len(finder.result["concentric_rings"][1])))
+
+    search = PlaneSearch(effective_array, min_rings, list_of_planes, ipython,
+                         plot_log)
+    search.execute()
+    if search.accepted:
+        return search.result
+    best_so_far = search.result
 
     log.warning("Could not find a plane with two rings on the cube!")
 